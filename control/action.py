@@ -4,6 +4,7 @@ str_about = '''
 
     This module is the contact "surface" between dypi and a CUBE
     instance. Control/manipulation of the ChRIS instance is effected
+    either directly through a (shared) python-chrisclient Client, or
     by a set of CLI scripts that this module creates and then executes.
 
     NOTE: This module is "fragily" dependent on python-chrisclient and
@@ -12,27 +13,116 @@ str_about = '''
 '''
 
 from    .                       import  jobber
+from    .                       import  poller
 from    state                   import  data
+from    state                   import  metadata
 import  os
 os.environ['XDG_CONFIG_HOME'] = '/tmp'
 import  re
+import  fcntl
 import  pudb
 import  json
 from    argparse                import ArgumentParser, Namespace
 from    chrisclient             import client
+from    chrisclient.request     import Request
 import  time
+import  threading
 from    pathlib                 import Path
-from    typing                  import Any
+from    typing                  import Any, Callable
+from    concurrent.futures      import Future
 from    io                      import TextIOWrapper
 import  yaml
 from    rich.console            import Console
 console = Console()
 
+# A single client per CUBE (url, user) is shared across all threads in
+# this process. The chrisclient Client is stateless apart from its cached
+# resource urls, so sharing is safe and avoids re-resolving the API root
+# for every child.
+d_CUBEclient    : dict              = {}
+CUBEclientLock  : threading.Lock    = threading.Lock()
+
+def CUBEclient_get(env : data.env) -> client.Client:
+    """
+    Return the process-wide client for the CUBE described in <env>,
+    creating it on first use.
+
+    Args:
+        env (data.env): the environment containing the CUBE details
+
+    Returns:
+        client.Client: a shared client to the CUBE instance
+    """
+    key : tuple = (env.CUBE('url'), env.CUBE('username'))
+    with CUBEclientLock:
+        if key not in d_CUBEclient:
+            d_CUBEclient[key]   = client.Client(
+                                    env.CUBE('url'),
+                                    env.CUBE('username'),
+                                    env.CUBE('password')
+                                )
+        return d_CUBEclient[key]
+
+# The pl-shexec command that populates a child with one input file, per
+# copy strategy. Each is a single command, not relying on --exec being run
+# through a shell. A reflink falls back to a real copy (silently, inside
+# the child) where cloning fails; a hardlink does not fall back, so the
+# child fails instead (e.g. across devices).
+str_copySrc     : str               = '%inputWorkingDir/%inputWorkingFile'
+str_copyDst     : str               = '%outputWorkingDir/%inputWorkingFile'
+d_copyExec      : dict              = {
+    'hardlink'  : 'cp --link %s %s' % (str_copySrc, str_copyDst),
+    'reflink'   : 'cp --reflink=auto %s %s' % (str_copySrc, str_copyDst),
+    'copy'      : 'cp %s %s' % (str_copySrc, str_copyDst)
+}
+FICLONE         : int               = 0x40049409
+
+def copyStrategy_probe(str_file : str, outputdir : Path) -> str:
+    """
+    Find the cheapest safe way to populate <outputdir> with the input file
+    <str_file>: a reflink (FICLONE, a copy-on-write clone sharing the data
+    blocks), else a plain copy. The children read from and write to the
+    same storage as this controller, so what works here works there.
+
+    A hardlink is never chosen: it shares the inode of the parent's file,
+    so a plugin that modifies its input in place would modify the
+    parent's data too. It must be asked for explicitly.
+
+    Args:
+        str_file (str): an input file
+        outputdir (Path): the (writable) output directory
+
+    Returns:
+        str: 'reflink' or 'copy'
+    """
+    str_probe   : str   = os.path.join(str(outputdir), '.copyprobe-%d' % os.getpid())
+    try:
+        with open(str_file, 'rb') as src, open(str_probe, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return 'reflink'
+    except OSError:
+        return 'copy'
+    finally:
+        if os.path.lexists(str_probe): os.unlink(str_probe)
+
 class PluginRun:
     '''
-    A class wrapper about the CLI tool "chrispl-run" that POSTs a pl-shexec
-    to CUBE.
+    A class that POSTs a pl-shexec to CUBE. By default this is done
+    "natively" through a shared python-chrisclient Client; the CLI tool
+    "chrispl-run" is kept as a fallback.
     '''
+
+    # Map of CLI flag to CUBE parameter name, per (CUBE url, plugin name).
+    # CUBE requires that plugin args are POSTed with the parameter name,
+    # not the CLI flag, and this lookup is identical for every child.
+    d_pluginMeta    : dict              = {}
+    pluginMetaLock  : threading.Lock    = threading.Lock()
+    l_directArg     : list              = [
+                                            'previous_id',
+                                            'title',
+                                            'compute_resource_name'
+                                        ]
+
     def __init__(self, *args, **kwargs):
         self.env:data.env       = data.env()
         self.shell              : jobber.Jobber     = jobber.Jobber({
@@ -41,18 +131,22 @@ class PluginRun:
                                                         })
         self.attachToPluginID   : str               = ''
         self.options            : Namespace         = Namespace()
+        self.pluginName         : str               = 'pl-shexec'
         for k, v in kwargs.items():
             if k == 'attachToPluginID'  : self.attachToPluginID     = v
             if k == 'env'               : self.env                  = v
             if k == 'options'           : self.options              = v
+            if k == 'pluginName'        : self.pluginName           = v
 
         self.l_runCMDresp       : list  = []
         self.l_branchInstanceID : list  = []
 
-    def PLpfdorun_args(self, str_input : str) -> dict:
+    def PLpfdorun_args(self, str_input : str, str_fileFilter : str = '') -> dict:
         '''
         Return the argument string pertinent to the pl-pfdorun plugin
-        in a single member dictionary.
+        in a single member dictionary. In file mode, an explicit
+        <str_fileFilter> (a comma separated list, for a chunk of files)
+        replaces the default filter on <str_input> alone.
         '''
         # pudb.set_trace()
         str_filter  : str   = ""
@@ -60,20 +154,21 @@ class PluginRun:
         # transform a string of '**/*dcm" to just 'dcm', suitable for pl-shexec
         str_ff      : str   = re.subn(r'[*/]', '', self.options.pattern)[0]
         if not self.options.inNode:
-            str_filter  = "--fileFilter=%s" % str_input
+            str_filter  = "--fileFilter=%s" % (str_fileFilter or str_input)
         else:
             str_filter  = "--dirFilter=%s" % str_input
             if len(str_ff): str_filter += ";--fileFilter=%s" % str_ff
 
         str_args    : str = """
             %s;
-            --exec=cp %%inputWorkingDir/%%inputWorkingFile %%outputWorkingDir/%%inputWorkingFile;
+            --exec=%s;
             --noJobLogging;
             --verbose=5;
             --pftelDB=%s;
             --title=%s;
             --previous_id=%s
-        """ % (str_filter, self.options.pftelDB, str_input, self.env.CUBE.parentPluginInstanceID)
+        """ % (str_filter, d_copyExec.get(getattr(self.options, 'copy', 'copy'), d_copyExec['copy']),
+               self.options.pftelDB, str_input, self.env.CUBE.parentPluginInstanceID)
 
         str_args = re.sub(r';\n.*--', ';--', str_args)
         str_args = str_args.strip()
@@ -89,12 +184,12 @@ class PluginRun:
             'onCUBE':  json.dumps(self.env.CUBE.onCUBE())
         }
 
-    def chrispl_run_cmd(self, str_inputData : str) -> dict:
+    def chrispl_run_cmd(self, str_inputData : str, str_fileFilter : str = '') -> dict:
         '''
         Return the CLI for the chrispl_run in a single member dictionary
         '''
         str_cmd = """chrispl-run --plugin name=pl-shexec --args="%s" --onCUBE %s""" % (
-                self.PLpfdorun_args(str_inputData)['args'],
+                self.PLpfdorun_args(str_inputData, str_fileFilter)['args'],
                 json.dumps(self.chrispl_onCUBEargs()['onCUBE'], indent = 4)
             )
         str_cmd = str_cmd.strip().replace('\n', '')
@@ -102,23 +197,94 @@ class PluginRun:
             'cmd' : str_cmd
         }
 
-    def __call__(self, str_input : str, **kwargs) ->dict:
+    def PLpfdorun_argsDict(self, str_args : str) -> dict:
         '''
-        Copy the <str_input> to the output using pl-pfdorun. If the in-node
-        self.options.inNode is true, perform a bulk copy of all files in the
-        passed directory that conform to the filter.
+        Parse a ';' separated CLI <str_args> string (as built by
+        PLpfdorun_args) into a dictionary of flag/value pairs, following
+        the same conventions as "chrispl-run": a flag without a value is
+        a boolean True.
         '''
-        # Remove the '/incoming/' from the str_input
-        str_inputTarget     : str   = str_input.split('/')[-1]
-        d_PLCmd             : dict  = self.chrispl_run_cmd(str_inputTarget)
+        d_args      : dict  = {}
+        for str_keyval in str_args.split(';'):
+            l_keyval        = str_keyval.split('=', 1)
+            key     : str   = "".join(l_keyval[0].split()).strip('"-=')
+            if not len(key): continue
+            if len(l_keyval) == 1:
+                d_args[key] = True
+            else:
+                d_args[key] = l_keyval[1].rstrip('"')
+        return d_args
+
+    def pluginMeta_get(self, cl : client.Client) -> dict:
+        '''
+        Return the (cached) plugin id and flag->name map for the plugin
+        to run. The lookup against CUBE is only done once per process.
+        '''
+        key         : tuple = (cl.url, self.pluginName)
+        with PluginRun.pluginMetaLock:
+            if key in PluginRun.d_pluginMeta:
+                return PluginRun.d_pluginMeta[key]
+            d_plugins   : dict  = cl.get_plugins({'name': self.pluginName})
+            l_hit       : list  = [d for d in d_plugins.get('data', [])
+                                    if d['name'] == self.pluginName]
+            if not l_hit:
+                raise ValueError('plugin %s not found in CUBE' % self.pluginName)
+            pluginID    : int   = l_hit[0]['id']
+            d_params    : dict  = cl.get_plugin_parameters(pluginID, {'limit': 1000})
+            d_flagToName: dict  = {}
+            for d_param in d_params.get('data', []):
+                d_flagToName[d_param['flag'].strip('-')]    = d_param['name']
+            PluginRun.d_pluginMeta[key] = {
+                'id'        : pluginID,
+                'flags'     : d_flagToName
+            }
+            return PluginRun.d_pluginMeta[key]
+
+    def pluginRun_native(self, str_inputTarget : str, str_fileFilter : str = '') -> dict:
+        '''
+        Create the plugin instance directly through the shared client.
+
+        Returns a structure that mirrors that of the CLI run, with the
+        created plugin instance in 'plinst'. Errors looking up the plugin
+        (before anything is created) are raised; an error from the create
+        request itself is returned as a failed run, since the instance
+        may exist in CUBE regardless.
+        '''
+        cl          : client.Client = CUBEclient_get(self.env)
+        d_meta      : dict  = self.pluginMeta_get(cl)
+        d_CLIargs   : dict  = self.PLpfdorun_argsDict(
+                                self.PLpfdorun_args(str_inputTarget, str_fileFilter)['args']
+                            )
+        d_data      : dict  = {}
+        for k, v in d_CLIargs.items():
+            if k in self.l_directArg:
+                d_data[k]                   = v
+            elif k in d_meta['flags']:
+                d_data[d_meta['flags'][k]]  = v
+        d_plinst    : dict  = {}
+        str_error   : str   = ''
+        try:
+            d_plinst        = cl.create_plugin_instance(d_meta['id'], d_data)
+        except Exception as e:
+            str_error       = '%s: %s' % (type(e).__name__, e)
+        return {
+            'mode'          : 'native',
+            'cmd'           : d_data,
+            'stdout'        : '',
+            'stderr'        : str_error,
+            'returncode'    : 1 if str_error else 0,
+            'plinst'        : d_plinst
+        }
+
+    def pluginRun_CLI(self, str_inputTarget : str, str_append : str = "",
+                      str_fileFilter : str = '') -> dict:
+        '''
+        Create the plugin instance by writing and executing a "chrispl-run"
+        script.
+        '''
+        d_PLCmd             : dict  = self.chrispl_run_cmd(str_inputTarget, str_fileFilter)
         str_PLCmd           : str   = d_PLCmd['cmd']
         str_PLCmdfile       : str   = '/tmp/%s.sh' % str_inputTarget
-        branchID            : int   = -1
-        b_status            : bool  = False
-
-        str_append          : str   = ""
-        for k,v in kwargs.items():
-            if k == 'append'    : str_append = v
 
         str_PLCmd   += " " + str_append
         if self.options:
@@ -131,10 +297,52 @@ class PluginRun:
             f.write(str_PLCmd)
         os.chmod(str_PLCmdfile, 0o755)
         d_runCMDresp        : dict  = self.shell.job_run(str_PLCmdfile)
+        d_runCMDresp['mode']        = 'cli'
+        return d_runCMDresp
+
+    def __call__(self, str_input : str, **kwargs) ->dict:
+        '''
+        Copy the <str_input> to the output using pl-pfdorun. If the in-node
+        self.options.inNode is true, perform a bulk copy of all files in the
+        passed directory that conform to the filter. A 'fileFilter' in
+        <kwargs> copies that (comma separated) list of files instead.
+
+        If self.options.childMode is 'native' (the default), the plugin
+        instance is created directly in CUBE. If the native path fails
+        before the instance is requested (CUBE unreachable, the plugin not
+        found), or if an explicit 'append' CLI string is passed, the
+        "chrispl-run" CLI path is used instead. A failed create request is
+        not retried through the CLI, which could create a second instance.
+        '''
+        # Remove the '/incoming/' from the str_input
+        str_inputTarget     : str   = str_input.split('/')[-1]
+        branchID            : int   = -1
+        b_status            : bool  = False
+        d_runCMDresp        : dict  = {}
+
+        str_append          : str   = ""
+        str_fileFilter      : str   = ""
+        for k,v in kwargs.items():
+            if k == 'append'    : str_append        = v
+            if k == 'fileFilter': str_fileFilter    = v
+
+        if getattr(self.options, 'childMode', 'native') == 'native' and \
+           not len(str_append):
+            try:
+                d_runCMDresp    = self.pluginRun_native(str_inputTarget, str_fileFilter)
+            except Exception as e:
+                console.print('native plugin lookup failed (%s), falling back to CLI' % e)
+                d_runCMDresp    = {}
+        if not d_runCMDresp:
+            d_runCMDresp        = self.pluginRun_CLI(str_inputTarget, str_append, str_fileFilter)
+
         if not d_runCMDresp['returncode']:
             b_status                = True
             self.l_runCMDresp.append(d_runCMDresp)
-            branchID        : int   = d_runCMDresp['stdout'].split()[2]
+            if d_runCMDresp['mode'] == 'native':
+                branchID    : int   = d_runCMDresp['plinst']['id']
+            else:
+                branchID    : int   = d_runCMDresp['stdout'].split()[2]
             self.l_branchInstanceID.append(branchID)
         else:
             b_status                = False
@@ -159,13 +367,7 @@ class Workflow:
             if k == 'env'               : self.env                  = v
             if k == 'options'           : self.options              = v
 
-        self.cl                 : client.Client = client.Client(
-                                            self.env.CUBE('url'),
-                                            self.env.CUBE('username'),
-                                            self.env.CUBE('password')
-                                        )
-        self.d_pipelines        : dict  = self.cl.get_pipelines()
-        self.pltopo             : dict  = self.cl.get_plugins({'name': 'pl-topologicalcopy'})
+        self.cl                 : client.Client = CUBEclient_get(self.env)
         self.newTreeID          : int   = -1
         self.ld_workflowhist    : list  = []
         self.ld_topologicalNode : dict  = {'data': []}
@@ -173,6 +375,47 @@ class Workflow:
         self.pluginParameters:PluginParameters  = PluginParameters(options = self.options)
         self.pluginParameters_override:bool     = self.pluginParameters.process()
 
+    @property
+    def pltopo(self) -> dict:
+        '''
+        The (cached) pl-topologicalcopy plugin lookup
+        '''
+        return metadata.cache.get(
+            (self.cl.url, 'plugin', 'pl-topologicalcopy'),
+            lambda: self.cl.get_plugins({'name': 'pl-topologicalcopy'})
+        )
+
+    def pipelineWithName_getDefaults(self, str_pipelineName : str) -> dict:
+        """
+        Return the (cached) id and default parameters of the pipeline with
+        name <str_pipelineName>. CUBE is only queried for this once per
+        run (or once per TTL period).
+
+        Args:
+            str_pipelineName (str):         the name of the pipeline to find
+
+        Returns:
+            dict: the pipeline 'id' (-1 if not found) and its 'defaults'
+        """
+        def fetch() -> dict:
+            id_pipeline     : int   = -1
+            l_defaults      : list  = []
+            d_pipeline      : dict  = self.cl.get_pipelines({'name': str_pipelineName})
+            if d_pipeline.get('data'):
+                id_pipeline         = d_pipeline['data'][0]['id']
+                d_response  : dict  = self.cl.get_pipeline_default_parameters(
+                                        id_pipeline, {'limit': 1000}
+                                    )
+                l_defaults          = d_response.get('data', [])
+            return {
+                'id'        : id_pipeline,
+                'defaults'  : l_defaults
+            }
+
+        return metadata.cache.get(
+            (self.cl.url, 'pipeline', str_pipelineName), fetch
+        )
+
     def pluginInstanceID_findWithTitle(self,
             d_workflowDetail    : dict,
             node_title          : str
@@ -232,7 +475,9 @@ class Workflow:
             node_title (str):        the title of the node to find
 
         kwargs:
-                waitPoll        = the polling interval in seconds
+                waitPoll        = the maximum polling interval in seconds;
+                                  polls start immediately and back off
+                                  from self.options.pollMin to this value
                 totalPolls      = total number of polling before abandoning;
                                   if this is 0, then poll forever.
 
@@ -255,24 +500,135 @@ class Workflow:
             if k == 'waitPoll':     waitPoll    = v
             if k == 'totalPolls':   totalPolls  = v
 
-        if waitOnPluginID >= 0:
-            while 'finished' not in str_pluginStatus.lower() and \
-                pollCount <= totalPolls :
+        if waitOnPluginID >= 0 and \
+           getattr(self.options, 'poller', 'single') == 'batch':
+            d_ret : dict = self.waitForNodeInWorkflow_batched(
+                            d_workflowDetail, waitOnPluginID, node_title,
+                            waitPoll * totalPolls
+                        )
+            str_pluginStatus, d_plinfo, pollCount = \
+                d_ret['status'], d_ret['plinst'], d_ret['polls']
+        elif waitOnPluginID >= 0:
+            schedule : poller.PollSchedule = poller.PollSchedule(
+                            expected = poller.history.expected(node_title),
+                            **self.pollSchedule_args(waitPoll)
+                        )
+            while pollCount <= totalPolls :
                 d_plinfo         = self.cl.get_plugin_instance_by_id(waitOnPluginID)
                 str_pluginStatus = d_plinfo['status']
-                time.sleep(waitPoll)
+                if poller.status_isFinal(str_pluginStatus):
+                    poller.history.record(node_title, schedule.elapsed())
+                    break
+                time.sleep(schedule.next())
                 if totalPolls:  pollCount += 1
-            if 'finished' in d_plinfo['status']:
-                b_finished  = d_plinfo['status'] == 'finishedSuccessfully'
+        return self.waitResult_build(
+                    d_workflowDetail, d_plinfo, pollCount, waitOnPluginID
+                )
+
+    def waitResult_build(self,
+            d_workflowDetail    : dict,
+            d_plinfo            : dict,
+            pollCount           : int,
+            waitOnPluginID      : int
+        ) -> dict:
+        '''
+        Build the structure returned by a wait on <waitOnPluginID>
+        '''
         return {
-            'finished'  : b_finished,
-            'status'    : str_pluginStatus,
+            'finished'  : d_plinfo.get('status', '') == 'finishedSuccessfully',
+            'status'    : d_plinfo.get('status', 'unknown'),
             'workflow'  : d_workflowDetail,
             'plinst'    : d_plinfo,
             'polls'     : pollCount,
             'plid'      : waitOnPluginID
         }
 
+    def pollSchedule_args(self, waitPoll : float) -> dict:
+        '''
+        The PollSchedule bounds: from the --pollMin option up to <waitPoll>
+        '''
+        return {
+            'minInterval'   : float(getattr(self.options, 'pollMin', waitPoll)),
+            'maxInterval'   : float(waitPoll)
+        }
+
+    def statusPoller_get(self) -> poller.StatusPoller:
+        '''
+        The process-wide batched status poller for this CUBE
+        '''
+        return poller.poller_get(
+                    self.cl,
+                    schedule = self.pollSchedule_args(
+                        getattr(self.options, 'pollInterval', 5)
+                    )
+                )
+
+    def nodeWatch_start(self,
+            d_workflowDetail    : dict,
+            waitOnPluginID      : int,
+            node_title          : str
+        ) -> Future:
+        """
+        Register <waitOnPluginID> with the batched status poller, using the
+        feed recorded in <d_workflowDetail> to batch the status queries.
+
+        Returns:
+            Future: resolves to the final plugin instance data
+        """
+        return self.statusPoller_get().watch(
+                    waitOnPluginID,
+                    self.node_feedID(d_workflowDetail, waitOnPluginID),
+                    node_title
+                )
+
+    def node_feedID(self, d_workflowDetail : dict, pluginInstanceID : int) -> int | None:
+        '''
+        The feed id of <pluginInstanceID> as recorded in <d_workflowDetail>
+        (or None if not found)
+        '''
+        feedID          : int | None    = None
+        l_plinst        : list          = d_workflowDetail.get('data', [d_workflowDetail])
+        for d_plinst in l_plinst:
+            if d_plinst.get('id') == pluginInstanceID:
+                feedID  = d_plinst.get('feed_id')
+        return feedID
+
+    def waitForNodeInWorkflow_batched(self,
+            d_workflowDetail    : dict,
+            waitOnPluginID      : int,
+            node_title          : str,
+            timeout             : float
+        ) -> dict:
+        """
+        Wait for <waitOnPluginID> through the shared, batched status poller
+        instead of polling it from this thread.
+
+        Args:
+            d_workflowDetail (dict):    the workflow in which the node exists
+            waitOnPluginID (int):       the plugin instance to wait on
+            node_title (str):           the title of the node
+            timeout (float):            seconds to wait; 0 means forever
+
+        Returns:
+            dict: the 'status', final 'plinst' data and poller 'polls' used
+        """
+        statusPoller    : poller.StatusPoller   = self.statusPoller_get()
+        cycleStart      : int           = statusPoller.cycles
+        future          : Future        = self.nodeWatch_start(
+                                            d_workflowDetail, waitOnPluginID, node_title
+                                        )
+        d_plinfo        : dict          = {}
+        try:
+            d_plinfo    = future.result(timeout = timeout if timeout else None)
+        except poller.FutureTimeout:
+            d_plinfo    = statusPoller.lastSeen(waitOnPluginID)
+            statusPoller.unwatch(waitOnPluginID, future)
+        return {
+            'status'    : d_plinfo.get('status', 'unknown'),
+            'plinst'    : d_plinfo,
+            'polls'     : statusPoller.cycles - cycleStart
+        }
+
     def pluginParameters_setInNodes(self,
             l_pipes             : list,
             d_pluginParameters  : dict
@@ -322,27 +678,52 @@ class Workflow:
                   and id of the pipeline
         """
         # pudb.set_trace()
-        id_pipeline     : int   = -1
         ld_node         : list  = []
-        d_pipeline      : dict  = self.cl.get_pipelines({'name': str_pipelineName})
-        if 'data' in d_pipeline:
-            id_pipeline : int   = d_pipeline['data'][0]['id']
-            d_response  : dict  = self.cl.get_pipeline_default_parameters(
-                                        id_pipeline, {'limit': 1000}
-                                )
-            if 'data' in d_response:
-                ld_node         = self.pluginParameters_setInNodes(
-                                    self.cl.compute_workflow_nodes_info(d_response['data'], True),
-                                    d_pluginParameters
-                                )
-                for piping in ld_node:
-                    if piping.get('compute_resource_name'):
-                        del piping['compute_resource_name']
+        d_pipeline      : dict  = self.pipelineWithName_getDefaults(str_pipelineName)
+        id_pipeline     : int   = d_pipeline['id']
+        if id_pipeline >= 0:
+            ld_node         = self.pluginParameters_setInNodes(
+                                self.cl.compute_workflow_nodes_info(d_pipeline['defaults'], True),
+                                d_pluginParameters
+                            )
+            for piping in ld_node:
+                if piping.get('compute_resource_name'):
+                    del piping['compute_resource_name']
         return {
             'nodes'         : ld_node,
             'id'            : id_pipeline
         }
 
+    def workflowTemplate_get(self,
+            str_pipelineName    : str,
+            d_pluginParameters  : dict  = {}
+        ) -> 'WorkflowTemplate':
+        """
+        Return the (cached) compiled template for <str_pipelineName> with
+        the <d_pluginParameters> overrides applied. The template is the
+        same for every child, so it is compiled only once per run.
+
+        Args:
+            str_pipelineName (str):     substring of workflow name to connect
+            d_pluginParameters (dict):  optional structure of default parameter
+                                        overrides
+
+        Returns:
+            WorkflowTemplate: the compiled template
+        """
+        str_parameters  : str   = json.dumps(d_pluginParameters, sort_keys = True,
+                                             default = str)
+        return metadata.cache.get(
+            (self.cl.url, 'template', str_pipelineName, str_parameters),
+            lambda: WorkflowTemplate(
+                        self.cl,
+                        str_pipelineName,
+                        self.pipelineWithName_getNodes(
+                            str_pipelineName, d_pluginParameters
+                        )
+                    )
+        )
+
     def workflow_schedule(self,
             inputDataNodeID     : str,
             str_pipelineName    : str,
@@ -361,20 +742,17 @@ class Workflow:
         Returns:
             dict: result from calling the client `get_workflow_plugin_instances`
         """
-        d_pipeline      : dict  = self.pipelineWithName_getNodes(
+        template        : WorkflowTemplate  = self.workflowTemplate_get(
                                     str_pipelineName, d_pluginParameters
                                 )
-        d_workflow      : dict  = self.cl.create_workflow(
-                d_pipeline['id'],
-                {
-                    'previous_plugin_inst_id'   : inputDataNodeID,
-                    'nodes_info'                : json.dumps(d_pipeline['nodes'])
-                })
+        d_pipeline      : dict  = template.pipeline
+        d_workflow      : dict  = template.create(self.cl, inputDataNodeID)
         d_workflowInst  : dict  = self.cl.get_workflow_plugin_instances(
                     d_workflow['id'], {'limit': 1000}
         )
         self.ld_workflowhist.append({
             'name'                      : str_pipelineName,
+            'workflow_id'               : d_workflow['id'],
             'pipeline'                  : d_pipeline,
             'previous_plugin_inst_id'   : inputDataNodeID,
             'pipeline_plugins'          : d_workflowInst
@@ -635,12 +1013,159 @@ class Workflow:
             attachToNodeID          = self.newTreeID,
             workflowTitle           = self.options.pipeline,
             waitForNodeWithTitle    = self.pluginParameters.blockOnNode,
+            waitPoll                = float(getattr(self.options, 'pollInterval', 5)),
             totalPolls              = totalPolls,
             pluginParameters        = self.pluginParameters.parameterTree_flatten()
         )
 
         return d_ret
 
+    def computeFlow_timeout(self) -> float:
+        '''
+        Seconds to wait on the blocking node; 0 means wait forever
+        '''
+        totalPolls:int      = 100 if not self.options.notimeout else 0
+        return float(getattr(self.options, 'pollInterval', 5)) * totalPolls
+
+    def computeFlow_schedule(self, filteredCopyInstanceID : int) -> dict:
+        """
+        Only schedule the compute flow off <filteredCopyInstanceID>, without
+        waiting on any node. Pair with computeFlow_watch to wait.
+
+        Args:
+            filteredCopyInstanceID (int): the plugin instance ID in the feed tree
+                                          from which to grow the compute flow
+
+        Returns:
+            dict: the workflow plugin instances
+        """
+        self.newTreeID:int           = int(filteredCopyInstanceID)
+        return self.workflow_schedule(
+                    str(self.newTreeID),
+                    self.options.pipeline,
+                    self.pluginParameters.parameterTree_flatten()
+                )
+
+    def computeFlow_resume(self, filteredCopyInstanceID : int, workflowID : int) -> dict:
+        """
+        Pick up a compute flow that was already scheduled (by an earlier,
+        interrupted run) as workflow <workflowID> off <filteredCopyInstanceID>.
+        Pair with computeFlow_watch to wait, as after computeFlow_schedule.
+
+        Args:
+            filteredCopyInstanceID (int): the plugin instance ID the compute
+                                          flow was grown from
+            workflowID (int):             the existing workflow
+
+        Returns:
+            dict: the workflow plugin instances
+        """
+        self.newTreeID:int           = int(filteredCopyInstanceID)
+        d_workflowInst  : dict  = self.cl.get_workflow_plugin_instances(
+                    int(workflowID), {'limit': 1000}
+        )
+        self.ld_workflowhist.append({
+            'name'                      : self.options.pipeline,
+            'workflow_id'               : int(workflowID),
+            'pipeline'                  : {},
+            'previous_plugin_inst_id'   : str(self.newTreeID),
+            'pipeline_plugins'          : d_workflowInst
+        })
+        return d_workflowInst
+
+    def computeFlow_wait(self, d_workflowInst : dict) -> dict:
+        """
+        Block (in this thread) on the blocking node of a scheduled compute
+        flow.
+
+        Args:
+            d_workflowInst (dict): the result of computeFlow_schedule
+
+        Returns:
+            dict: the waitForNodeInWorkflow structure
+        """
+        d_ret : dict = self.waitForNodeInWorkflow(
+                    d_workflowInst,
+                    self.pluginParameters.blockOnNode,
+                    waitPoll    = float(getattr(self.options, 'pollInterval', 5)),
+                    totalPolls  = 100 if not self.options.notimeout else 0
+                )
+        d_ret['prior']  = None
+        return d_ret
+
+    def computeFlow_detach(self, d_workflowInst : dict) -> dict:
+        """
+        Do not wait at all on a scheduled compute flow: simply return the
+        wait structure with the blocking node identified but 'scheduled'.
+
+        Args:
+            d_workflowInst (dict): the result of computeFlow_schedule
+
+        Returns:
+            dict: the (unfinished) waitForNodeInWorkflow structure
+        """
+        plid    : int   = self.pluginInstanceID_findWithTitle(
+                            d_workflowInst, self.pluginParameters.blockOnNode
+                        )
+        d_ret   : dict  = self.waitResult_build(
+                            d_workflowInst, {'status': 'scheduled'}, 0, plid
+                        )
+        d_ret['prior']  = None
+        return d_ret
+
+    def computeFlow_watch(self, d_workflowInst : dict) -> Future:
+        """
+        Watch the blocking node of a scheduled compute flow through the
+        batched status poller, without blocking the caller.
+
+        Args:
+            d_workflowInst (dict): the result of computeFlow_schedule
+
+        Returns:
+            Future: resolves to the same structure as waitForNodeInWorkflow
+        """
+        str_title       : str       = self.pluginParameters.blockOnNode
+        plid            : int       = self.pluginInstanceID_findWithTitle(
+                                        d_workflowInst, str_title
+                                    )
+        future          : Future    = Future()
+        self.d_watch    : dict      = {
+            'plid'      : plid,
+            'workflow'  : d_workflowInst,
+            'future'    : None
+        }
+        def done(watch : Future) -> None:
+            if watch.exception() is not None:
+                future.set_exception(watch.exception())
+                return
+            d_ret : dict    = self.waitResult_build(d_workflowInst, watch.result(), 0, plid)
+            d_ret['prior']  = None
+            future.set_result(d_ret)
+
+        if plid < 0:
+            d_ret : dict    = self.waitResult_build(d_workflowInst, {}, 0, plid)
+            d_ret['prior']  = None
+            future.set_result(d_ret)
+            return future
+        self.d_watch['future']      = self.nodeWatch_start(d_workflowInst, plid, str_title)
+        self.d_watch['future'].add_done_callback(done)
+        return future
+
+    def computeFlow_abandon(self) -> dict:
+        '''
+        Stop watching the blocking node (typically on timeout) and return
+        the wait structure built from the last polled state.
+        '''
+        statusPoller    : poller.StatusPoller   = self.statusPoller_get()
+        d_plinfo        : dict                  = statusPoller.lastSeen(self.d_watch['plid'])
+        if self.d_watch['future']:
+            statusPoller.unwatch(self.d_watch['plid'], self.d_watch['future'])
+        d_ret           : dict                  = self.waitResult_build(
+                            self.d_watch['workflow'], d_plinfo, 0, self.d_watch['plid']
+                        )
+        d_ret['prior']  = None
+        return d_ret
+
     def __call__(self, filteredCopyInstanceID  : int) -> dict:
         """        Execute/manage the LLD compute flow
 
@@ -656,6 +1181,102 @@ class Workflow:
         d_computeFlow:dict           = self.computeFlow_build()
         return d_computeFlow
 
+class WorkflowTemplate:
+    '''
+    A "compiled" pipeline: the pipeline id, the pre-serialized nodes_info
+    payload (with all parameter overrides applied) and the url to which
+    workflows are POSTed. Scheduling a workflow off a child is then a
+    single POST in which only the 'previous_plugin_inst_id' changes.
+
+    The client has no public call for either the workflows url or a POST
+    to it, so both go through python-chrisclient internals (the private
+    Client._fetch_resource and the Request class) -- see chrisclient_internal.
+    '''
+
+    # the python-chrisclient (as pinned in requirements.txt) whose
+    # internals are used
+    chrisclientVersion  : str   = '2.9.1'
+
+    def __init__(self, cl : client.Client, str_pipelineName : str, d_pipeline : dict):
+        self.name           : str   = str_pipelineName
+        self.pipeline       : dict  = d_pipeline
+        self.pipelineID     : int   = d_pipeline['id']
+        self.nodes_info     : str   = json.dumps(d_pipeline['nodes'])
+        self.workflowsURL   : str   = ''
+        if self.pipelineID >= 0:
+            if not cl.pipelines_url: cl.set_urls()
+            self.workflowsURL       = self.chrisclient_internal(
+                                        'the workflows url lookup',
+                                        lambda: self.workflowsURL_fetch(cl)
+                                    )
+
+    @classmethod
+    def chrisclient_internal(cls, str_what : str, call : Callable[[], Any]) -> Any:
+        """
+        Run <call>, which uses python-chrisclient internals. Those are not
+        part of its API, so a client upgrade that changes them would
+        otherwise surface as an obscure AttributeError or TypeError.
+
+        Args:
+            str_what (str):     what <call> does, for the error message
+            call (Callable):    a no-argument callable
+
+        Raises:
+            RuntimeError: if the internals are not what <call> expects
+
+        Returns:
+            Any: the result of <call>
+        """
+        try:
+            return call()
+        except (AttributeError, TypeError) as e:
+            raise RuntimeError(
+                "%s needs the internals of python-chrisclient==%s, which this "
+                "version does not have (%s: %s)" % (
+                    str_what, cls.chrisclientVersion, type(e).__name__, e
+                )) from e
+
+    def workflowsURL_fetch(self, cl : client.Client) -> str:
+        '''
+        The url of the workflows of this pipeline (empty if not found)
+        '''
+        coll                        = cl._fetch_resource(
+                                        cl.pipelines_url, {'id': self.pipelineID}
+                                    )
+        if not len(coll.items):
+            return ''
+        l_url       : list          = Request.get_link_relation_urls(
+                                        coll.items[0], 'workflows'
+                                    )
+        return l_url[0] if l_url else ''
+
+    def workflow_post(self, cl : client.Client, d_data : dict) -> dict:
+        req         : Request       = Request(cl.username, cl.password, cl.content_type)
+        coll                        = req.post(self.workflowsURL, d_data, None, cl.timeout)
+        return req.get_data_from_collection(coll)['data'][0]
+
+    def create(self, cl : client.Client, inputDataNodeID : str) -> dict:
+        """
+        Create a workflow from this template off <inputDataNodeID>.
+
+        Args:
+            cl (client.Client):     the client to use for the POST
+            inputDataNodeID (str):  id of parent node
+
+        Returns:
+            dict: the created workflow
+        """
+        d_data  : dict  = {
+            'previous_plugin_inst_id'   : inputDataNodeID,
+            'nodes_info'                : self.nodes_info
+        }
+        if not self.workflowsURL:
+            return cl.create_workflow(self.pipelineID, d_data)
+        return self.chrisclient_internal(
+                    'the workflow POST',
+                    lambda: self.workflow_post(cl, d_data)
+                )
+
 class PluginParameters:
 
     def __init__(self, *args, **kwargs) -> None:
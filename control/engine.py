@@ -0,0 +1,311 @@
+str_about = '''
+    This module provides the fan-out "engines" that drive each mapped
+    input of the parent node through the life cycle of a child:
+
+        create      filter/copy the input into a new child node
+        schedule    attach (schedule) the workflow to the child
+        watch       wait for the blocking node of the workflow
+        complete    record the result
+
+    The per-child work is almost entirely waiting on CUBE, so rather than
+    tying one thread to each child for its whole life, the AsyncEngine
+    runs every child as a coroutine. Blocking CUBE calls run in a small
+    thread pool, while waits on workflow nodes are futures resolved by
+    the batched status poller and hold no thread at all.
+
+    The StagedEngine instead connects the stages with bounded queues,
+    each stage with its own pool of workers, so that child creation keeps
+    streaming while earlier children are still computing.
+'''
+
+import  abc
+import  asyncio
+import  queue
+import  threading
+from    concurrent.futures      import ThreadPoolExecutor, Future
+from    concurrent.futures      import TimeoutError as FutureTimeout
+from    pathlib                 import Path
+from    typing                  import Any, Iterable
+
+class Stages(abc.ABC):
+    '''
+    The per-child stage callbacks driven by an engine. Subclasses
+    implement the actual work; each method runs in a worker thread and
+    may block.
+    '''
+
+    @abc.abstractmethod
+    def create(self, input : Path, output : Path) -> tuple[bool, dict]:
+        '''
+        Create the child for <input>. Returns (<ok>, <d_ret>) where <d_ret>
+        is the result structure for this child.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def schedule(self, d_ret : dict) -> Any:
+        '''
+        Schedule the workflow on the child. Returns an opaque handle
+        passed to watch/abandon/complete, or None on failure.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def watch(self, handle : Any) -> Future | dict:
+        '''
+        Start waiting on the workflow. Returns either a Future that will
+        resolve to the wait result, or the wait result itself.
+        '''
+        raise NotImplementedError
+
+    def timeout(self, handle : Any) -> float:
+        '''
+        Seconds to wait on the future from watch; 0 means forever.
+        '''
+        return 0.0
+
+    @abc.abstractmethod
+    def abandon(self, handle : Any) -> dict:
+        '''
+        Give up waiting (on timeout) and return the last known result.
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, d_ret : dict, handle : Any, d_wait : dict) -> dict:
+        '''
+        Record the wait result <d_wait> in <d_ret> and return it.
+        '''
+        raise NotImplementedError
+
+    def wait(self, handle : Any) -> dict:
+        '''
+        Watch <handle> and block (in this thread) for the wait result,
+        abandoning the wait on timeout.
+        '''
+        watch   : Any   = self.watch(handle)
+        if not isinstance(watch, Future):
+            return watch
+        timeout : float = self.timeout(handle)
+        try:
+            return watch.result(timeout = timeout if timeout else None)
+        except FutureTimeout:
+            return self.abandon(handle)
+
+    def run(self, input : Path, output : Path) -> dict:
+        """
+        Drive one <input> through all stages in this thread.
+
+        Returns:
+            dict: the result structure of this child
+        """
+        b_ok, d_ret     = self.create(input, output)
+        if not b_ok:
+            return d_ret
+        handle  : Any   = self.schedule(d_ret)
+        if handle is None:
+            return d_ret
+        return self.complete(d_ret, handle, self.wait(handle))
+
+class AsyncEngine:
+    '''
+    An asyncio based fan-out engine. At most <concurrency> children are
+    in flight at any time; blocking calls share <ioWorkers> threads, so
+    the stages' watch should return a Future rather than block for the
+    whole wait.
+    '''
+
+    def __init__(self, stages : Stages, *args, **kwargs):
+        self.stages         : Stages    = stages
+        self.concurrency    : int       = 256
+        self.ioWorkers      : int       = 16
+        for k, v in kwargs.items():
+            if k == 'concurrency'   : self.concurrency  = int(v)
+            if k == 'ioWorkers'     : self.ioWorkers    = int(v)
+
+        self.executor       : ThreadPoolExecutor | None = None
+        self.ld_result      : list                      = []
+
+    async def blocking(self, fn, *args) -> Any:
+        '''
+        Run the blocking <fn>(*<args>) in the engine thread pool
+        '''
+        return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, fn, *args
+                )
+
+    async def child_run(self, input : Path, output : Path) -> dict:
+        """
+        Drive one <input> through all stages.
+
+        Returns:
+            dict: the result structure of this child
+        """
+        b_ok, d_ret     = await self.blocking(self.stages.create, input, output)
+        if not b_ok:
+            return d_ret
+        handle  : Any   = await self.blocking(self.stages.schedule, d_ret)
+        if handle is None:
+            return d_ret
+        watch   : Any   = await self.blocking(self.stages.watch, handle)
+        d_wait  : dict  = {}
+        if isinstance(watch, Future):
+            timeout : float = self.stages.timeout(handle)
+            try:
+                d_wait      = await asyncio.wait_for(
+                                asyncio.wrap_future(watch),
+                                timeout if timeout else None
+                            )
+            except asyncio.TimeoutError:
+                d_wait      = await self.blocking(self.stages.abandon, handle)
+        else:
+            d_wait          = watch
+        return await self.blocking(self.stages.complete, d_ret, handle, d_wait)
+
+    async def run(self, mapper : Iterable) -> list:
+        """
+        Fan out over all (<input>, <output>) pairs in <mapper>. The mapper
+        is consumed lazily (in the thread pool, since discovery touches the
+        filesystem) so that children start as soon as inputs are found.
+
+        Returns:
+            list: the result structures of all children
+        """
+        semaphore   : asyncio.Semaphore = asyncio.Semaphore(self.concurrency)
+        l_task      : list              = []
+        it                              = iter(mapper)
+
+        async def bounded(input : Path, output : Path) -> None:
+            try:
+                self.ld_result.append(await self.child_run(input, output))
+            finally:
+                semaphore.release()
+
+        self.executor   = ThreadPoolExecutor(max_workers = self.ioWorkers)
+        try:
+            while True:
+                await semaphore.acquire()
+                item    = await self.blocking(next, it, None)
+                if item is None:
+                    semaphore.release()
+                    break
+                l_task.append(asyncio.create_task(bounded(*item)))
+            # raise any Exceptions which happened in children
+            await asyncio.gather(*l_task)
+        finally:
+            self.executor.shutdown(wait = True)
+        return self.ld_result
+
+    def __call__(self, mapper : Iterable) -> list:
+        return asyncio.run(self.run(mapper))
+
+class StagedEngine:
+    '''
+    A pipelined fan-out engine: "create" -> "schedule" -> "await" stages
+    connected by bounded queues, each stage with its own number of
+    workers. A slow downstream stage only back-pressures the stage before
+    it once the queue between them is full.
+    '''
+
+    def __init__(self, stages : Stages, *args, **kwargs):
+        self.stages         : Stages    = stages
+        self.d_workers      : dict      = {
+            'create'    : 4,
+            'schedule'  : 4,
+            'await'     : 64
+        }
+        self.queueSize      : int       = 16
+        for k, v in kwargs.items():
+            if k == 'workers'   : self.d_workers.update(v)
+            if k == 'queueSize' : self.queueSize    = int(v)
+
+        self.ld_result      : list              = []
+        self.l_error        : list              = []
+        self.lock           : threading.Lock    = threading.Lock()
+        self.stop           : object            = object()
+
+    def result_add(self, d_ret : dict) -> None:
+        with self.lock:
+            self.ld_result.append(d_ret)
+
+    def stage_create(self, item : tuple, q_next : queue.Queue) -> None:
+        b_ok, d_ret     = self.stages.create(*item)
+        if b_ok:
+            q_next.put(d_ret)
+        else:
+            self.result_add(d_ret)
+
+    def stage_schedule(self, d_ret : dict, q_next : queue.Queue) -> None:
+        handle  : Any   = self.stages.schedule(d_ret)
+        if handle is None:
+            self.result_add(d_ret)
+        else:
+            q_next.put((d_ret, handle))
+
+    def stage_await(self, item : tuple, q_next : queue.Queue | None) -> None:
+        d_ret, handle   = item
+        self.result_add(self.stages.complete(d_ret, handle, self.stages.wait(handle)))
+
+    def worker(self, fn, q_in : queue.Queue, q_next : queue.Queue | None) -> None:
+        '''
+        A stage worker: apply <fn> to items from <q_in> until the stop
+        sentinel is seen. Errors are recorded rather than killing the
+        worker, and re-raised once the pipeline has drained.
+        '''
+        while True:
+            item    = q_in.get()
+            if item is self.stop:
+                return
+            try:
+                fn(item, q_next)
+            except Exception as e:
+                with self.lock:
+                    self.l_error.append(e)
+
+    def stage_start(self, str_name : str, fn, q_in : queue.Queue,
+                    q_next : queue.Queue | None) -> list:
+        l_thread    : list  = [
+            threading.Thread(
+                target  = self.worker,
+                args    = (fn, q_in, q_next),
+                name    = '%s-%d' % (str_name, i),
+                daemon  = True
+            ) for i in range(int(self.d_workers[str_name]))
+        ]
+        for thread in l_thread: thread.start()
+        return l_thread
+
+    def stage_drain(self, l_thread : list, q_in : queue.Queue) -> None:
+        '''
+        Signal all workers of a stage to stop once <q_in> is drained, and
+        wait for them.
+        '''
+        for _ in l_thread: q_in.put(self.stop)
+        for thread in l_thread: thread.join()
+
+    def __call__(self, mapper : Iterable) -> list:
+        """
+        Fan out over all (<input>, <output>) pairs in <mapper>, streaming
+        them into the pipeline as they are discovered.
+
+        Returns:
+            list: the result structures of all children
+        """
+        q_create    : queue.Queue   = queue.Queue(maxsize = self.queueSize)
+        q_schedule  : queue.Queue   = queue.Queue(maxsize = self.queueSize)
+        q_await     : queue.Queue   = queue.Queue(maxsize = self.queueSize)
+
+        l_create    : list  = self.stage_start('create',   self.stage_create,   q_create,   q_schedule)
+        l_schedule  : list  = self.stage_start('schedule', self.stage_schedule, q_schedule, q_await)
+        l_await     : list  = self.stage_start('await',    self.stage_await,    q_await,    None)
+
+        for item in mapper:
+            q_create.put(tuple(item))
+        self.stage_drain(l_create,   q_create)
+        self.stage_drain(l_schedule, q_schedule)
+        self.stage_drain(l_await,    q_await)
+
+        # raise any Exceptions which happened in stages
+        if self.l_error:
+            raise self.l_error[0]
+        return self.ld_result
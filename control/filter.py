@@ -3,14 +3,83 @@ str_about = '''
     directory for files conforming to some pattern. The primary purpose
     of this class is to provide an alternative to the built-in chris_plugin
     'PathMapper' object.
+
+    Discovery is a single, streaming os.scandir() traversal: any number of
+    include and exclude patterns are matched in the same pass, excluded
+    directories are pruned without being entered, and (<input>, <output>)
+    pairs are yielded as they are found, so that a consumer (the fan-out
+    engine) can start on the first input while the walk continues.
+
+    On network filesystems, where every readdir is a round trip, the
+    directory listings can be read ahead concurrently by a pool of
+    <workers> threads. The pairs are still yielded in the same,
+    deterministic order as the serial walk.
+
+    Given a persistent InputIndex from an earlier run, directories whose
+    mtime has not changed are not listed again at all; the traversal also
+    builds a fresh index (see state.index) for the next run.
+
+    In file mode, the discovered files can finally be packed into chunks
+    (see Chunker) so that one child copies many small inputs at once.
+
+    With several controllers sharing one parent, a Shard passes on only
+    the inputs that hash into this controller's slice.
 '''
 
 
 from    argparse                import ArgumentParser, Namespace
 from    pathlib                 import Path
+from    typing                  import Iterator
+from    concurrent.futures      import ThreadPoolExecutor
 import  pfmisc
-import  glob
+from    state.index             import InputIndex
+import  re
 import  os
+import  hashlib
+
+def glob_compile(str_glob : str) -> re.Pattern:
+    """
+    Compile a path glob (relative to the input directory) into a regex
+    over '/'-separated relative paths. '**' matches any number of whole
+    path components (including none), '*' and '?' do not cross a '/', and
+    '[...]' is a character class.
+
+    Returns:
+        re.Pattern: the compiled pattern
+    """
+    str_regex   : str   = ''
+    i           : int   = 0
+    while i < len(str_glob):
+        if str_glob.startswith('**/', i):
+            str_regex  += '(?:.*/)?'
+            i          += 3
+        elif str_glob.startswith('**', i):
+            str_regex  += '.*'
+            i          += 2
+        elif str_glob[i] == '*':
+            str_regex  += '[^/]*'
+            i          += 1
+        elif str_glob[i] == '?':
+            str_regex  += '[^/]'
+            i          += 1
+        elif str_glob[i] == '[' and ']' in str_glob[i + 2:]:
+            end         = str_glob.index(']', i + 2)
+            str_class   = str_glob[i + 1:end]
+            if str_class.startswith('!'): str_class = '^' + str_class[1:]
+            str_regex  += '[%s]' % str_class.replace('\\', '\\\\')
+            i           = end + 1
+        else:
+            str_regex  += re.escape(str_glob[i])
+            i          += 1
+    return re.compile(str_regex + r'\Z')
+
+def patterns_split(patterns : str | list | None) -> list:
+    '''
+    Normalize <patterns> (a comma separated string, or list) to a list
+    '''
+    if not patterns: return []
+    if isinstance(patterns, str): patterns = patterns.split(',')
+    return [str_p.strip() for str_p in patterns if str_p.strip()]
 
 class   PathFilter:
     '''
@@ -22,59 +91,362 @@ class   PathFilter:
         """Main constructor
         """
 
-        self.inputdir       : Path          = inputdir
-        self.outputdir      : Path          = outputdir
+        self.inputdir       : Path          = Path(inputdir)
+        self.outputdir      : Path          = Path(outputdir)
         self.glob           : str           = '*'
+        self.l_include      : list          = []
+        self.l_exclude      : list          = []
         self.l_files        : list          = []
         self.LOG            : pfmisc.debug  = None
         self.b_filesOnly    : bool          = False
+        self.b_dirsDeep     : bool          = False
+        self.b_parents      : bool          = True
+        self.workers        : int           = 1
+        self.indexOld       : InputIndex | None = None
+        self.indexNew       : InputIndex | None = None
+        self.d_diff         : dict          = {}
+        b_indexed           : bool          = False
 
         for k,v in kwargs.items():
             if k == 'glob'          : self.glob         = v
+            if k == 'include'       : self.l_include    = patterns_split(v)
+            if k == 'exclude'       : self.l_exclude    = patterns_split(v)
             if k == 'logger'        : self.LOG          = v
             if k == 'only_files'    : self.b_filesOnly  = True
+            if k == 'dirs_deep'     : self.b_dirsDeep   = bool(v)
+            if k == 'parents'       : self.b_parents    = bool(v)
+            if k == 'workers'       : self.workers      = max(1, int(v))
+            if k == 'index'         : self.indexOld     = v
+            if k == 'indexed'       : b_indexed         = bool(v)
 
-        self.inputdir_filter(self.inputdir)
+        self.l_includeRE    : list          = [glob_compile(p) for p in
+                                                patterns_split(self.glob) + self.l_include]
+        self.l_excludeRE    : list          = [glob_compile(p) for p in self.l_exclude]
+        self.d_stats        : dict          = {
+            'dirs'      : 0,
+            'entries'   : 0,
+            'pruned'    : 0,
+            'yielded'   : 0,
+            'reused'    : 0
+        }
+        if b_indexed or self.indexOld:
+            d_indexMeta     : dict          = {
+                'inputdir'  : str(self.inputdir),
+                'include'   : patterns_split(self.glob) + self.l_include,
+                'exclude'   : self.l_exclude
+            }
+            self.indexNew   = InputIndex(meta = d_indexMeta)
+            if self.indexOld and self.indexOld.d_meta != d_indexMeta:
+                self.log("Input index was built with other settings, rescanning all")
+                self.indexOld   = None
 
-    def __iter__(self):
+    def __iter__(self) -> Iterator[tuple[Path, Path]]:
         return PathIterator(self)
 
     def log(self, message, **kwargs):
         if self.LOG: self.LOG(message)
 
-    def inputdir_filter(self, input: Path) -> list:
+    def isIncluded(self, str_rel : str) -> bool:
+        return any(r.match(str_rel) for r in self.l_includeRE)
+
+    def pattern_matched(self, str_rel : str) -> int:
         '''
-        Filter the files in Path according to the passed options.pattern --
-        mostly for debugging
+        The index of the first include pattern matching <str_rel>, or -1
         '''
+        for i, r in enumerate(self.l_includeRE):
+            if r.match(str_rel): return i
+        return -1
 
-        self.LOG("Parent directory contains at root level")
-        l_ls = [self.LOG(f) for f in os.listdir(str(input))]
-        self.LOG("Filtering files in %s containing '%s'" % (str(input), self.glob))
-        str_glob : str  = '%s/%s' % (str(self.inputdir), self.glob)
-        self.LOG("glob = %s" % str_glob)
+    def isExcluded(self, str_rel : str, b_dir : bool = False) -> bool:
+        '''
+        Is the relative path <str_rel> excluded? A directory is also tested
+        with a trailing '/', so that 'tmp/**' prunes 'tmp' itself.
+        '''
+        for r in self.l_excludeRE:
+            if r.match(str_rel) or (b_dir and r.match(str_rel + '/')):
+                return True
+        return False
 
-        self.l_files    = glob.glob(str_glob)
+    def output_for(self, str_rel : str) -> Path:
+        output  : Path  = self.outputdir / str_rel if str_rel else self.outputdir
+        if self.b_parents:
+            output.parent.mkdir(parents = True, exist_ok = True)
+        return output
 
-        l_glob = [self.LOG(f) for f in self.l_files]
+    def listing(self, str_relDir : str) -> tuple[int, list] | None:
+        """
+        List the directory <str_relDir> (relative to the inputdir), sorted
+        by name. Entry types come from the listing itself (d_type), so no
+        stat() is needed per entry on most filesystems. Symbolic links to
+        directories are left out (not followed), so that a link back up the
+        tree cannot make the traversal cycle.
+
+        When indexing, the directory itself is stat'd: if its mtime matches
+        the earlier index, the indexed listing is returned without reading
+        the directory; otherwise the files in it are stat'd for the index.
+
+        Returns:
+            tuple[int, list] | None: the directory mtime (0 if not indexing)
+                         and (<name>, <path>, <isDir>, <size>, <mtime_ns>)
+                         tuples, or None if the directory could not be read
+        """
+        str_dir     : Path  = self.inputdir / str_relDir
+        mtime       : int   = 0
+        try:
+            if self.indexNew:
+                mtime           = os.stat(str_dir).st_mtime_ns
+                if self.indexOld:
+                    l_entry     = self.indexOld.listing_get(str_relDir, mtime, self.inputdir)
+                    if l_entry is not None:
+                        return mtime, l_entry
+            with os.scandir(str_dir) as it:
+                l_entry     : list  = []
+                for e in it:
+                    if e.is_dir(follow_symlinks = False):
+                        l_entry.append((e.name, e.path, True, 0, 0))
+                    elif e.is_dir():
+                        continue
+                    elif not self.indexNew:
+                        l_entry.append((e.name, e.path, False, 0, 0))
+                    else:
+                        st      = e.stat()
+                        l_entry.append((e.name, e.path, False, st.st_size, st.st_mtime_ns))
+                return mtime, sorted(l_entry)
+        except OSError as e:
+            self.log("Skipping unreadable %s: %s" % (str_relDir, e))
+            return None
+
+    def walk(self) -> Iterator[tuple[Path, Path]]:
+        """
+        Traverse the input directory once (depth first, entries in name
+        order), yielding (<input>, <output>) pairs as they are found: the
+        files matching an include and no exclude pattern or, if
+        'dirs_deep', the (non-excluded) directories without subdirectories
+        -- the same pairs as PathMapper.file_mapper/dir_mapper_deep.
+
+        With more than one worker, the listings of the directories next in
+        line (the top of the traversal stack) are read ahead in a thread
+        pool; the order of the pairs does not change.
+        """
+        l_stack     : list  = ['']
+        d_ahead     : dict  = {}
+        pool        : ThreadPoolExecutor | None = None
+        if self.workers > 1:
+            pool            = ThreadPoolExecutor(
+                                max_workers         = self.workers,
+                                thread_name_prefix  = 'PathFilter'
+                            )
+
+        def readahead() -> None:
+            for str_rel in l_stack[-4 * self.workers:]:
+                if str_rel not in d_ahead:
+                    d_ahead[str_rel]    = pool.submit(self.listing, str_rel)
+
+        try:
+            while l_stack:
+                if pool: readahead()
+                str_relDir  : str   = l_stack.pop()
+                listing             = d_ahead.pop(str_relDir).result() if pool \
+                                        else self.listing(str_relDir)
+                if listing is None:
+                    continue
+                mtime, l_entry      = listing
+                if self.indexNew:
+                    self.indexNew.dir_record(str_relDir, mtime, l_entry, self.pattern_matched)
+                    if self.indexOld and self.indexOld.d_dir.get(str_relDir) == mtime:
+                        self.d_stats['reused'] += 1
+                self.d_stats['dirs']       += 1
+                self.d_stats['entries']    += len(l_entry)
+                l_subdir    : list  = []
+                b_hasSubdir : bool  = False
+                for str_name, str_path, b_dir, _, _ in l_entry:
+                    str_rel : str   = str_relDir + '/' + str_name if str_relDir else str_name
+                    if b_dir:
+                        b_hasSubdir     = True
+                        if self.isExcluded(str_rel, b_dir = True):
+                            self.d_stats['pruned'] += 1
+                            continue
+                        l_subdir.append(str_rel)
+                    elif not self.b_dirsDeep and self.isIncluded(str_rel) \
+                            and not self.isExcluded(str_rel):
+                        self.d_stats['yielded']    += 1
+                        yield Path(str_path), self.output_for(str_rel)
+                if self.b_dirsDeep and not b_hasSubdir:
+                    self.d_stats['yielded']        += 1
+                    yield self.inputdir / str_relDir, self.output_for(str_relDir)
+                # reversed, so that subdirectories are popped in name order
+                l_stack.extend(reversed(l_subdir))
+        finally:
+            if pool: pool.shutdown(wait = False, cancel_futures = True)
+        if self.indexNew and self.indexOld:
+            self.d_diff     = self.indexNew.diff(self.indexOld)
+            self.log("Inputs since last index: %s" % \
+                        {k: len(v) for k, v in self.d_diff.items()})
+        self.log("Discovery in %s: %s" % (str(self.inputdir), self.d_stats))
+
+    def inputdir_filter(self, input: Path | None = None) -> list:
+        '''
+        Filter the files in Path according to the passed options.pattern,
+        collecting them all into a list (mostly for debugging)
+        '''
+        self.l_files    = [str(i) for i, _ in self.walk()]
         return self.l_files
 
 class   PathIterator:
     '''
-    An iterator over the PathFilter class
+    An iterator over the PathFilter class, consuming its (streaming)
+    traversal.
     '''
 
     def __init__(self, pathfilter):
 
         self._pathfilter    = pathfilter
-        self._index         = 0
+        self._walk          = pathfilter.walk()
+
+    def __iter__(self):
+        return self
 
     def __next__(self):
         '''
-        Iterate over the PathFilter self.files list
+        Iterate over the PathFilter traversal
         '''
-        if self._index < len(self._pathfilter.l_files):
-            result      = (self._pathfilter.l_files[self._index])
-            self._index += 1
-            return (result, self._pathfilter.outputdir)
-        raise StopIteration
+        return next(self._walk)
+
+class   Chunker:
+    '''
+    Pack consecutive (<input>, <output>) file pairs into chunks of at most
+    <count> files and/or <bytes> total size, each handled by one child.
+    '''
+
+    # a chunk's combined (comma separated) fileFilter is a single plugin
+    # parameter, and CUBE stores those in a bounded field
+    filterMax       : int           = 600
+
+    def __init__(self, *args, **kwargs):
+        self.count          : int           = 0
+        self.bytes          : int           = 0
+        for k,v in kwargs.items():
+            if k == 'count'         : self.count        = max(0, int(v))
+            if k == 'bytes'         : self.bytes        = max(0, int(v))
+            if k == 'filterMax'     : self.filterMax    = int(v)
+
+        # str(chunk input) -> [str(file), ...] of chunks of more than one file
+        self.d_chunk        : dict          = {}
+        self.d_stats        : dict          = {
+            'chunks'    : 0,
+            'inputs'    : 0,
+            'largest'   : 0,
+            'bytes'     : 0
+        }
+
+    @staticmethod
+    def label(l_input : list) -> Path:
+        '''
+        The input standing for the chunk <l_input>: its first file, suffixed
+        with the number of further files (if any)
+        '''
+        if len(l_input) == 1: return Path(l_input[0])
+        return Path('%s+%d' % (l_input[0], len(l_input) - 1))
+
+    def files(self, input : Path) -> list:
+        return self.d_chunk.get(str(input), [str(input)])
+
+    def fileFilter(self, input : Path) -> str:
+        '''
+        The combined pl-shexec fileFilter of the chunk <input>
+        '''
+        return ','.join(os.path.basename(f) for f in self.files(input))
+
+    def stats(self) -> dict:
+        return dict(self.d_stats, count = self.count, maxBytes = self.bytes)
+
+    def flush(self, l_input : list, output : Path, size : int) -> tuple[Path, Path]:
+        input   : Path  = self.label(l_input)
+        if len(l_input) > 1:
+            self.d_chunk[str(input)]    = list(l_input)
+        self.d_stats['chunks']     += 1
+        self.d_stats['inputs']     += len(l_input)
+        self.d_stats['bytes']      += size
+        self.d_stats['largest']     = max(self.d_stats['largest'], len(l_input))
+        return input, output
+
+    def __call__(self, mapper) -> Iterator[tuple[Path, Path]]:
+        """
+        Yield a (<chunk input>, <output of its first file>) pair per chunk
+        of <mapper>, lazily and in order. A file larger than <bytes> forms
+        a chunk on its own.
+        """
+        l_input     : list          = []
+        output      : Path | None   = None
+        size        : int           = 0
+        filterLen   : int           = 0
+        for input, out in mapper:
+            try:
+                fsize   : int   = os.stat(input).st_size
+            except OSError:
+                fsize           = 0
+            nameLen     : int   = len(os.path.basename(str(input))) + 1
+            if l_input and (
+                    (self.count and len(l_input) >= self.count) or
+                    (self.bytes and size + fsize > self.bytes) or
+                    filterLen + nameLen > self.filterMax + 1):
+                yield self.flush(l_input, output, size)
+                l_input, size, filterLen    = [], 0, 0
+            if not l_input: output = out
+            l_input.append(str(input))
+            size       += fsize
+            filterLen  += nameLen
+        if l_input:
+            yield self.flush(l_input, output, size)
+
+def shard_parse(str_shard : str) -> tuple[int, int]:
+    """
+    Parse a '<i>/<N>' shard spec (0 <= i < N).
+
+    Returns:
+        tuple[int, int]: (i, N)
+    """
+    try:
+        i, N    = (int(x) for x in str_shard.split('/'))
+    except ValueError:
+        raise ValueError("shard '%s' is not of the form <i>/<N>" % str_shard)
+    if not 0 <= i < N:
+        raise ValueError("shard '%s' needs 0 <= i < N" % str_shard)
+    return i, N
+
+class   Shard:
+    '''
+    Pass on only the (<input>, <output>) pairs of slice <i> of <N>: those
+    whose input path, relative to <inputdir>, hashes to <i> modulo <N>.
+    The hash is stable across processes and hosts (and the inputdir mount
+    point), so that N controllers with i = 0..N-1 each see a disjoint
+    slice and together every input exactly once.
+    '''
+
+    def __init__(self, inputdir, str_shard : str, *args, **kwargs):
+        self.inputdir       : Path          = Path(inputdir)
+        self.index, self.count              = shard_parse(str_shard)
+        self.d_stats        : dict          = {
+            'shard'     : '%d/%d' % (self.index, self.count),
+            'kept'      : 0,
+            'skipped'   : 0
+        }
+
+    def slice(self, input : Path) -> int:
+        try:
+            str_rel : str   = str(Path(input).relative_to(self.inputdir))
+        except ValueError:
+            str_rel         = str(input)
+        digest  : bytes = hashlib.sha1(str_rel.encode('utf-8', 'surrogateescape')).digest()
+        return int.from_bytes(digest[:8], 'big') % self.count
+
+    def stats(self) -> dict:
+        return dict(self.d_stats)
+
+    def __call__(self, mapper) -> Iterator[tuple[Path, Path]]:
+        for input, output in mapper:
+            if self.slice(input) != self.index:
+                self.d_stats['skipped']    += 1
+                continue
+            self.d_stats['kept']           += 1
+            yield input, output
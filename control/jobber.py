@@ -4,6 +4,22 @@ str_about = '''
     and the Jobber class executes the command, returning to the caller a
     dictionary structure containing misc info such as <stdout>, <stderr>, and
     <returncode>.
+
+    Both output pipes of a job are drained concurrently (through a
+    selector) into bounded ring buffers, so that a chatty child can
+    neither deadlock on a full pipe nor make the controller copy its
+    output quadratically. Output beyond the buffer can be spilled in full
+    to files, and every job reports its wall and CPU time and can be
+    killed on a timeout.
+
+    A compact record of every job is kept in a bounded, in-memory job log
+    which a background thread flushes in batches to a JSON-lines file,
+    rather than each job writing its own files on the hot path.
+
+    Background jobs run in a JobPool: at most <cap> at a time, each
+    tracked by a handle, reaped by its worker and summarized into an
+    aggregate exit status. Only the last <keep> finished handles are
+    remembered.
 '''
 
 import  subprocess
@@ -11,6 +27,164 @@ import  os
 os.environ['XDG_CONFIG_HOME'] = '/tmp'
 import  pudb
 import  json
+import  time
+import  codecs
+import  selectors
+import  threading
+from    collections             import deque
+from    concurrent.futures      import ThreadPoolExecutor, Future
+from    concurrent.futures      import wait, FIRST_COMPLETED, ALL_COMPLETED
+from    datetime                import datetime, timezone
+from    typing                  import BinaryIO
+
+class RingBuffer:
+    '''
+    A bounded byte buffer that keeps the last <maxBytes> written to it
+    (none, if 0), optionally also spilling everything written to the file
+    <spill>.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.maxBytes   : int               = 1 << 20
+        self.spill      : str               = ''
+        for k, v in kwargs.items():
+            if k == 'maxBytes'  : self.maxBytes = max(0, int(v))
+            if k == 'spill'     : self.spill    = str(v or '')
+
+        self.dq_chunk   : deque             = deque()
+        self.size       : int               = 0
+        self.total      : int               = 0
+        self.f          : BinaryIO | None   = open(self.spill, 'wb') if self.spill else None
+
+    def write(self, chunk : bytes) -> None:
+        self.total     += len(chunk)
+        if self.f: self.f.write(chunk)
+        self.dq_chunk.append(chunk)
+        self.size      += len(chunk)
+        while self.dq_chunk and self.size - len(self.dq_chunk[0]) >= self.maxBytes:
+            self.size  -= len(self.dq_chunk.popleft())
+
+    def truncated(self) -> int:
+        '''
+        The number of (leading) bytes no longer held in the buffer
+        '''
+        return self.total - min(self.size, self.maxBytes)
+
+    def getvalue(self) -> str:
+        str_value   : bytes = b''.join(self.dq_chunk)
+        return str_value[-self.maxBytes:].decode(errors = 'replace') if self.maxBytes else ''
+
+    def close(self) -> None:
+        if self.f:
+            self.f.close()
+            self.f  = None
+
+class JobLog:
+    '''
+    A bounded in-memory history of job records, flushed in batches by a
+    background writer to a JSON-lines file (once one is opened). The
+    writer wakes when <batchSize> records are pending or every
+    <interval> seconds; close() does a final flush.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.keep       : int                   = 1000
+        self.batchSize  : int                   = 64
+        self.interval   : float                 = 2.0
+        for k, v in kwargs.items():
+            if k == 'keep'      : self.keep         = int(v)
+            if k == 'batchSize' : self.batchSize    = int(v)
+            if k == 'interval'  : self.interval     = float(v)
+
+        self.dq_history : deque                 = deque(maxlen = self.keep)
+        self.dq_pending : deque                 = deque(maxlen = 100 * self.keep)
+        self.path       : str                   = ''
+        self.dropped    : int                   = 0
+        self.written    : int                   = 0
+        self.lock       : threading.Lock        = threading.Lock()
+        self.wakeup     : threading.Condition   = threading.Condition(self.lock)
+        self.thread     : threading.Thread | None = None
+        self.b_stop     : bool                  = False
+
+    def open(self, path : str) -> None:
+        '''
+        Start flushing (appending) records to <path>
+        '''
+        with self.lock:
+            self.path       = str(path)
+            self.b_stop     = False
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                                target  = self.writer,
+                                name    = 'JobLog',
+                                daemon  = True
+                            )
+                self.thread.start()
+
+    def add(self, d_record : dict) -> dict:
+        '''
+        Add <d_record> (timestamped) to the history and the flush queue
+        '''
+        d_record    = dict(d_record, time = datetime.now(timezone.utc).astimezone().isoformat())
+        with self.lock:
+            self.dq_history.append(d_record)
+            if len(self.dq_pending) == self.dq_pending.maxlen:
+                self.dropped   += 1
+            self.dq_pending.append(d_record)
+            if self.path and len(self.dq_pending) >= self.batchSize:
+                self.wakeup.notify()
+        return d_record
+
+    def history(self) -> list:
+        with self.lock:
+            return list(self.dq_history)
+
+    def flush(self) -> int:
+        '''
+        Write all pending records to the log file. Returns the count.
+        '''
+        with self.lock:
+            if not self.path: return 0
+            l_batch : list  = list(self.dq_pending)
+            self.dq_pending.clear()
+            str_path: str   = self.path
+        if l_batch:
+            with open(str_path, 'a') as f:
+                f.write(''.join(json.dumps(d, default = str) + '\n' for d in l_batch))
+        with self.lock:
+            self.written   += len(l_batch)
+        return len(l_batch)
+
+    def writer(self) -> None:
+        while True:
+            with self.lock:
+                if not self.b_stop and len(self.dq_pending) < self.batchSize:
+                    self.wakeup.wait(self.interval)
+                b_stop  : bool  = self.b_stop
+            self.flush()
+            if b_stop: return
+
+    def close(self) -> None:
+        '''
+        Stop the writer after a final flush
+        '''
+        with self.lock:
+            self.b_stop     = True
+            self.wakeup.notify()
+            thread          = self.thread
+        if thread: thread.join()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'records'   : self.written + len(self.dq_pending),
+                'written'   : self.written,
+                'dropped'   : self.dropped
+            }
+
+# The process-wide job log, shared by all Jobbers
+joblog  : JobLog    = JobLog()
 
 class Jobber:
 
@@ -24,6 +198,9 @@ class Jobber:
         self.args   = d_args.copy()
         if not 'verbosity'      in self.args.keys(): self.args['verbosity']     = 0
         if not 'noJobLogging'   in self.args.keys(): self.args['noJobLogging']  = False
+        if not 'bufferSize'     in self.args.keys(): self.args['bufferSize']    = 1 << 20
+        if not 'spillDir'       in self.args.keys(): self.args['spillDir']      = ''
+        if not 'timeout'        in self.args.keys(): self.args['timeout']       = 0
 
     def dict2JSONcli(self, d_dict : dict) -> str:
         """Convert a dictionary into a CLI conformant JSON string.
@@ -81,7 +258,44 @@ class Jobber:
                 str_cli += '--%s %s ' % (k, v)
         return str_cli
 
-    def job_run(self, str_cmd):
+    def pipes_drain(self,
+            p           : subprocess.Popen,
+            d_buffer    : dict,
+            deadline    : float
+        ) -> bool:
+        """
+        Read both output pipes of <p> as data arrives, into the ring buffers
+        of <d_buffer> (keyed 'stdout'/'stderr'), until both are closed or
+        the <deadline> (a time.monotonic() value; 0 for none) has passed.
+        stdout is echoed as it arrives if verbose.
+
+        Returns:
+            bool: True if the deadline passed before the pipes closed
+        """
+        selector                    = selectors.DefaultSelector()
+        selector.register(p.stdout, selectors.EVENT_READ, 'stdout')
+        selector.register(p.stderr, selectors.EVENT_READ, 'stderr')
+        decoder                     = codecs.getincrementaldecoder('utf-8')(errors = 'replace')
+        b_timedOut      : bool      = False
+        while selector.get_map():
+            timeout     : float | None  = None
+            if deadline:
+                timeout                 = deadline - time.monotonic()
+                if timeout <= 0:
+                    b_timedOut          = True
+                    break
+            for key, _ in selector.select(timeout):
+                chunk   : bytes         = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                d_buffer[key.data].write(chunk)
+                if key.data == 'stdout' and int(self.args['verbosity']):
+                    print(decoder.decode(chunk), end = '')
+        selector.close()
+        return b_timedOut
+
+    def job_run(self, str_cmd, **kwargs):
         """
         Running some CLI process via python is cumbersome. The typical/easy
         path of
@@ -92,9 +306,16 @@ class Jobber:
         method is via subprocess, which has a cumbersome processing
         syntax. Still, this method runs the `str_cmd` and returns the
         stderr and stdout strings as well as a returncode.
-        Providing readtime output of both stdout and stderr seems
-        problematic. The approach here is to provide realtime
-        output on stdout and only provide stderr on process completion.
+
+        Both pipes are drained together as the process runs (stdout is
+        also echoed in realtime if verbose). Only the last 'bufferSize'
+        bytes of each are returned; with a 'spillDir' the full streams
+        are also written to files there. If a 'timeout' (seconds, also
+        settable per call via <kwargs>) is exceeded, the process is
+        killed. A 'started' callable in <kwargs> is passed the Popen
+        object once the process is running; a 'lock' in <kwargs> is held
+        while the exited process is reaped, so that whoever signals the
+        process under that lock never signals a reused pid.
         """
         d_ret       : dict = {
             'stdout':       "",
@@ -103,80 +324,274 @@ class Jobber:
             'cwd':          "",
             'returncode':   0
         }
-        str_stdoutLine  : str   = ""
-        str_stdout      : str   = ""
+        timeout     : float = float(self.args['timeout'])
+        str_spill   : str   = self.args['spillDir']
+        started             = None
+        lock                = threading.Lock()
+        for k, v in kwargs.items():
+            if k == 'timeout'   : timeout   = float(v)
+            if k == 'spillDir'  : str_spill = v
+            if k == 'started'   : started   = v
+            if k == 'lock'      : lock      = v
 
+        start       : float = time.monotonic()
         p = subprocess.Popen(
                     str_cmd.split(),
                     stdout      = subprocess.PIPE,
                     stderr      = subprocess.PIPE,
         )
+        if started: started(p)
+        d_buffer    : dict  = {
+            stream  : RingBuffer(
+                        maxBytes    = self.args['bufferSize'],
+                        spill       = '%s/%d.%s' % (str_spill, p.pid, stream) if str_spill else ''
+                    ) for stream in ['stdout', 'stderr']
+        }
+
+        b_timedOut  : bool  = self.pipes_drain(p, d_buffer, start + timeout if timeout else 0)
+        if b_timedOut:
+            with lock:
+                if p.poll() is None: p.kill()
+            # collect whatever the killed process had already written
+            self.pipes_drain(p, d_buffer, time.monotonic() + 1)
+        # wait for the exit without reaping, then reap under the lock
+        # (unless a poll() under it has already done so)
+        try:
+            os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+        cpuTime     : float = 0.0
+        with lock:
+            if p.returncode is None:
+                _, status, rusage   = os.wait4(p.pid, 0)
+                p.returncode        = os.waitstatus_to_exitcode(status)
+                cpuTime             = rusage.ru_utime + rusage.ru_stime
+        p.stdout.close()
+        p.stderr.close()
+        for buffer in d_buffer.values(): buffer.close()
 
-        # Realtime output on stdout
-        while True:
-            stdout      = p.stdout.readline()
-            if p.poll() is not None:
-                break
-            if stdout:
-                str_stdoutLine = stdout.decode()
-                if int(self.args['verbosity']):
-                    print(str_stdoutLine, end = '')
-                str_stdout      += str_stdoutLine
         d_ret['cmd']        = str_cmd
         d_ret['cwd']        = os.getcwd()
-        d_ret['stdout']     = str_stdout
-        d_ret['stderr']     = p.stderr.read().decode()
+        d_ret['stdout']     = d_buffer['stdout'].getvalue()
+        d_ret['stderr']     = d_buffer['stderr'].getvalue()
         d_ret['returncode'] = p.returncode
-        with open('/tmp/job.json', 'w') as f:
-            json.dump(d_ret, f, indent=4)
+        d_ret['timedOut']   = b_timedOut
+        d_ret['wallTime']   = round(time.monotonic() - start, 3)
+        d_ret['cpuTime']    = round(cpuTime, 3)
+        d_ret['truncated']  = {k: b.truncated() for k, b in d_buffer.items()}
+        d_ret['spill']      = {k: b.spill for k, b in d_buffer.items() if b.spill}
+        joblog.add({
+            'cmd'       : str_cmd,
+            'returncode': d_ret['returncode'],
+            'timedOut'  : b_timedOut,
+            'wallTime'  : d_ret['wallTime'],
+            'cpuTime'   : d_ret['cpuTime'],
+            'stderr'    : d_ret['stderr'][-512:]
+        })
         if int(self.args['verbosity']) and len(d_ret['stderr']):
             print('\nstderr: \n%s' % d_ret['stderr'])
         return d_ret
 
-    def job_runbg(self, str_cmd : str) -> dict:
-        """Run a job in the background
+    def job_runbg(self, str_cmd : str, **kwargs) -> dict:
+        """Run a job in the background, in the process-wide JobPool
 
         Args:
             str_cmd (str): CLI string to run
+            **kwargs: passed on to job_run (e.g. timeout)
 
         Returns:
-            dict: a dictionary of exec state
+            dict: a dictionary of exec state, including the pool 'job'
+                  handle and the 'future' that resolves to the job_run
+                  result
         """
         d_ret       : dict = {
             'uid'       : "",
             'cmd'       : "",
             'cwd'       : ""
         }
-        # str_stdoutLine  : str   = ""
-        # str_stdout      : str   = ""
-
-        p = subprocess.Popen(
-                    str_cmd.split(),
-                    stdout      = subprocess.PIPE,
-                    stderr      = subprocess.PIPE,
-        )
-
+        d_ret['job'], d_ret['future']   = jobpool.submit(self, str_cmd, **kwargs)
         d_ret['uid']        = str(os.getuid())
         d_ret['cmd']        = str_cmd
         d_ret['cwd']        = os.getcwd()
-        # d_ret['stdout']     = str_stdout
-        # d_ret['stderr']     = p.stderr.read().decode()
-        # d_ret['returncode'] = p.returncode
-        # if int(self.args['verbosity']) and len(d_ret['stderr']):
-        #     print('\nstderr: \n%s' % d_ret['stderr'])
         return d_ret
 
     def job_stdwrite(self, d_job, str_outputDir, str_prefix = ""):
         """
-        Capture the d_job entries to respective files.
+        Capture the d_job entries as one record in the job log (which is
+        flushed in batches), rather than one file per entry.
         """
         if not self.args['noJobLogging']:
-            for key in d_job.keys():
-                with open(
-                    '%s/%s%s' % (str_outputDir, str_prefix, key), "w"
-                ) as f:
-                    f.write(str(d_job[key]))
-                    f.close()
+            joblog.add({
+                'outputDir' : str(str_outputDir),
+                'prefix'    : str_prefix,
+                'job'       : {k: str(v) for k, v in d_job.items()}
+            })
         return {
             'status': True
         }
+
+class JobPool:
+    '''
+    A manager of background jobs: at most <cap> run at once (the rest
+    queue), each is tracked by an integer handle, and each is reaped by
+    the worker that ran it (so no zombies are left behind). The handles
+    of all but the last <keep> finished jobs are forgotten.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.cap        : int               = len(os.sched_getaffinity(0))
+        self.keep       : int               = 1000
+        for k, v in kwargs.items():
+            if k == 'cap'   : self.cap  = max(1, int(v))
+            if k == 'keep'  : self.keep = max(0, int(v))
+
+        self.executor   : ThreadPoolExecutor    = ThreadPoolExecutor(
+                                                    max_workers         = self.cap,
+                                                    thread_name_prefix  = 'JobPool'
+                                                )
+        # handle -> {'cmd', 'future', 'process', 'kill'}
+        self.d_job      : dict              = {}
+        # handles of finished jobs, oldest first
+        self.dq_done    : deque             = deque()
+        self.handle     : int               = 0
+        self.lock       : threading.Lock    = threading.Lock()
+
+    def submit(self, shell : Jobber, str_cmd : str, **kwargs) -> tuple[int, Future]:
+        """
+        Queue <str_cmd> to be run by <shell>.job_run(str_cmd, **kwargs).
+
+        Returns:
+            tuple[int, Future]: the job handle and a future of the result
+        """
+        with self.lock:
+            self.handle    += 1
+            handle  : int   = self.handle
+            d_job   : dict  = {'cmd': str_cmd, 'future': None, 'process': None, 'kill': False}
+            self.d_job[handle]  = d_job
+
+        def started(p : subprocess.Popen) -> None:
+            with self.lock:
+                d_job['process']    = p
+                b_kill  : bool      = d_job['kill']
+            # kill_all() came between the worker picking the job up and
+            # the process starting
+            if b_kill: p.kill()
+
+        future  : Future    = self.executor.submit(
+                                shell.job_run, str_cmd, started = started,
+                                lock = self.lock, **kwargs
+                            )
+        with self.lock:
+            d_job['future'] = future
+        future.add_done_callback(lambda f: self.finished(handle))
+        return handle, future
+
+    def finished(self, handle : int) -> None:
+        '''
+        Note that job <handle> is done, forgetting the oldest finished jobs
+        beyond <keep>
+        '''
+        with self.lock:
+            self.dq_done.append(handle)
+            while len(self.dq_done) > self.keep:
+                self.d_job.pop(self.dq_done.popleft(), None)
+
+    def futures(self, l_handle : list | None = None) -> dict:
+        with self.lock:
+            return {
+                h: d['future'] for h, d in self.d_job.items()
+                if l_handle is None or h in l_handle
+            }
+
+    def wait_any(self, l_handle : list | None = None, timeout : float | None = None) -> list:
+        """
+        Wait until at least one of the jobs <l_handle> (default: all jobs)
+        has finished.
+
+        Returns:
+            list: the handles of the finished jobs
+        """
+        d_future    : dict  = self.futures(l_handle)
+        s_done, _           = wait(d_future.values(), timeout, FIRST_COMPLETED)
+        return [h for h, f in d_future.items() if f in s_done]
+
+    def wait_all(self, l_handle : list | None = None, timeout : float | None = None) -> dict:
+        """
+        Wait until all of the jobs <l_handle> (default: all jobs) have
+        finished, or <timeout> has passed.
+
+        Returns:
+            dict: the aggregate status (see status())
+        """
+        wait(self.futures(l_handle).values(), timeout, ALL_COMPLETED)
+        return self.status(l_handle)
+
+    def status(self, l_handle : list | None = None) -> dict:
+        """
+        Aggregate the exit status of the jobs <l_handle> (default: all).
+        The aggregate 'returncode' is 0 only if every finished job
+        succeeded; otherwise it is that of the first failed job. Jobs
+        cancelled before they started are counted apart, not as failed.
+
+        Returns:
+            dict: job counts, failed handles and the aggregate returncode
+        """
+        d_status    : dict  = {
+            'jobs'      : 0,
+            'running'   : 0,
+            'succeeded' : 0,
+            'cancelled' : 0,
+            'failed'    : [],
+            'returncode': 0
+        }
+        for handle, future in sorted(self.futures(l_handle).items()):
+            d_status['jobs']       += 1
+            if future.cancelled():
+                d_status['cancelled']  += 1
+                continue
+            if not future.done():
+                d_status['running']    += 1
+                continue
+            returncode  : int   = future.result()['returncode'] if not future.exception() else -1
+            if returncode:
+                d_status['failed'].append(handle)
+                if not d_status['returncode']:
+                    d_status['returncode']  = returncode
+            else:
+                d_status['succeeded']  += 1
+        return d_status
+
+    def kill_all(self) -> int:
+        '''
+        Cancel queued jobs and kill running ones (or, if a job's process is
+        not started yet, have it killed as soon as it is); returns the
+        number killed. Processes are polled and signalled under the lock
+        that their workers reap them under, so an exited process (whose
+        pid may be reused once reaped) is never signalled.
+        '''
+        killed  : int   = 0
+        with self.lock:
+            l_job   : list  = list(self.d_job.values())
+        for d_job in l_job:
+            # (outside the lock: a cancel runs the done callback)
+            future          = d_job['future']
+            if future and (future.done() or future.cancel()):
+                continue
+            with self.lock:
+                d_job['kill']   = True
+                p               = d_job['process']
+                if p is None:
+                    killed     += 1
+                elif p.poll() is None:
+                    try:
+                        p.kill()
+                        killed += 1
+                    except OSError:
+                        pass
+        return killed
+
+    def shutdown(self, wait : bool = True) -> None:
+        self.executor.shutdown(wait = wait)
+
+# The process-wide pool of background jobs (see Jobber.job_runbg)
+jobpool : JobPool   = JobPool()
@@ -0,0 +1,102 @@
+str_about = '''
+    This module provides the "dyworkflow-merge" command, which combines
+    the manifests written by several dyworkflow controllers -- each run
+    with one --shard <i>/<N> of the same parent -- into a single manifest
+    of the whole run.
+
+    The children grown by controllers cooperating through a --queue are
+    recorded in the queue directory itself; with --queue, those records
+    are collected into the manifest instead.
+
+    The merged manifest can be tracked with "dyworkflow-watch" or given
+    to a later --incremental run like that of any single controller.
+'''
+
+import  sys
+from    argparse                import ArgumentParser, Namespace, ArgumentDefaultsHelpFormatter
+from    pathlib                 import Path
+
+from    state                   import manifest
+from    state.leases            import LeaseQueue
+
+parser: ArgumentParser      = ArgumentParser(
+    description = '''
+Merge the manifests of the shards of a sharded dyworkflow run.
+''',
+    formatter_class=ArgumentDefaultsHelpFormatter)
+
+parser.add_argument(
+            'manifests',
+            nargs   = '*',
+            help    = 'the manifest.json of each shard'
+)
+parser.add_argument(
+            '--queue',
+            default = '',
+            help    = 'collect the children completed through this --queue directory'
+)
+parser.add_argument(
+            '--output',
+            default = 'manifest.json',
+            help    = 'the merged manifest to write'
+)
+parser.add_argument(
+            '--partial',
+            help    = '''
+            write the merged manifest even if some shards are missing (or
+            the --queue is not drained)''',
+            dest    = 'partial',
+            action  = 'store_true',
+            default = False
+)
+
+def queue_collect(options : Namespace) -> int:
+    '''
+    Write the manifest of the children completed through a --queue
+    '''
+    queue       : LeaseQueue        = LeaseQueue(options.queue, owner = 'merge')
+    collected   : manifest.Manifest = manifest.Manifest(meta = {'queue': options.queue})
+    for d_record in queue.records():
+        collected.add(**d_record)
+    b_drained   : bool              = queue.isDrained()
+    collected.d_meta['drained']     = b_drained
+    if not b_drained and not options.partial:
+        print("dyworkflow-merge: queue %s is not drained (use --partial to collect anyway)" % \
+                options.queue, file = sys.stderr)
+        return 1
+    pathMerged  : Path              = collected.save(Path(options.output))
+    print("%d children collected from queue %s into %s" % (
+            len(collected.children()), options.queue, pathMerged
+        ))
+    return 0
+
+def main(argv : list | None = None) -> int:
+    options     : Namespace         = parser.parse_args(argv)
+    if options.queue:
+        return queue_collect(options)
+    if not options.manifests:
+        parser.error('no manifests to merge')
+    try:
+        merged  : manifest.Manifest = manifest.Manifest.merge(
+                                        [manifest.Manifest.load(Path(p)) for p in options.manifests]
+                                    )
+    except (OSError, ValueError) as e:
+        print("dyworkflow-merge: %s" % e, file = sys.stderr)
+        return 2
+    l_missing   : list              = merged.d_meta['missing']
+    if l_missing and not options.partial:
+        print("dyworkflow-merge: missing shards %s (use --partial to merge anyway)" % \
+                ', '.join(l_missing), file = sys.stderr)
+        return 1
+    pathMerged  : Path              = merged.save(Path(options.output))
+    print("%d children from shards %s merged into %s%s" % (
+            len(merged.children()),
+            ', '.join(merged.d_meta['shards']),
+            pathMerged,
+            ' (%d duplicate inputs dropped)' % len(merged.d_meta['duplicates']) \
+                if merged.d_meta['duplicates'] else ''
+        ))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
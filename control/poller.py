@@ -0,0 +1,410 @@
+str_about = '''
+    This module provides a central, batched status poller for plugin
+    instances in CUBE.
+
+    Rather than each worker thread polling "its" plugin instance, waiters
+    register the instance ID with a single poller and receive a future.
+    The poller periodically fetches the status of all outstanding
+    instances with bulk list queries (one paginated query per feed, or
+    one query by id for a feed with only a few outstanding instances)
+    and resolves the futures of those that have finished. The request
+    rate against CUBE therefore scales with the poll interval and the
+    number of feeds, not with the number of children.
+
+    A poll that fails (CUBE unreachable, say) is logged and retried
+    after the minimum interval; the futures of waits that keep failing
+    are failed with the error rather than left waiting forever.
+
+    Polling is adaptive: every wait is checked immediately, and then
+    with an exponential, jittered backoff bounded by a min and max
+    interval. If a node of the same title has completed before (in this
+    run or in a past run recorded in a duration history), the expected
+    duration is used to skip polls that would almost certainly be wasted.
+'''
+
+import  threading
+import  time
+import  random
+import  json
+import  statistics
+from    pathlib                 import Path
+from    concurrent.futures      import Future
+from    concurrent.futures      import TimeoutError as FutureTimeout
+from    chrisclient             import client
+from    loguru                  import logger
+
+l_finalStatus   : list  = ['finishedSuccessfully', 'finishedWithError', 'cancelled']
+
+def status_isFinal(str_status : str) -> bool:
+    '''
+    Is <str_status> a terminal plugin instance status?
+    '''
+    return str_status in l_finalStatus or 'finished' in str_status.lower()
+
+class PollSchedule:
+    '''
+    The sequence of delays between successive polls of one wait.
+
+    The first check is always immediate. Thereafter, delays grow from
+    <minInterval> by <factor> up to <maxInterval>, each randomized by
+    +/- <jitter> (a fraction) so that many waiters do not synchronize.
+    If an <expected> duration is known, the schedule sleeps (bounded by
+    <maxInterval>) until close to that point before starting to back off.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.minInterval    : float = 1.0
+        self.maxInterval    : float = 30.0
+        self.factor         : float = 1.5
+        self.jitter         : float = 0.2
+        self.expected       : float = 0.0
+        for k, v in kwargs.items():
+            if k == 'minInterval'   : self.minInterval  = float(v)
+            if k == 'maxInterval'   : self.maxInterval  = float(v)
+            if k == 'factor'        : self.factor       = float(v)
+            if k == 'jitter'        : self.jitter       = float(v)
+            if k == 'expected'      : self.expected     = float(v or 0)
+        self.maxInterval            = max(self.maxInterval, self.minInterval)
+        self.start          : float = time.monotonic()
+        self.step           : int   = 0
+
+    def clamp(self, delay : float) -> float:
+        return min(max(delay, self.minInterval), self.maxInterval)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def next(self) -> float:
+        """
+        Return the delay (in seconds) until the next poll.
+
+        Returns:
+            float: seconds to wait
+        """
+        delay       : float = 0.0
+        remaining   : float = self.expected - self.elapsed()
+        if remaining > self.minInterval:
+            delay           = remaining
+            self.step       = 0
+        else:
+            delay           = self.minInterval * (self.factor ** self.step)
+            self.step      += 1
+        delay      *= 1 + random.uniform(-self.jitter, self.jitter)
+        return self.clamp(delay)
+
+class DurationHistory:
+    '''
+    Observed wait durations, per node title, used as the expected
+    duration hint of a PollSchedule. Optionally persisted to a JSON file
+    so that later runs start with a hint.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.keep       : int               = 50
+        self.d_history  : dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+        for k, v in kwargs.items():
+            if k == 'keep'  : self.keep = int(v)
+
+    def record(self, str_title : str, duration : float) -> None:
+        if not str_title: return
+        with self.lock:
+            l_duration : list   = self.d_history.setdefault(str_title, [])
+            l_duration.append(round(duration, 3))
+            del l_duration[:-self.keep]
+
+    def expected(self, str_title : str) -> float:
+        '''
+        The expected duration for <str_title>, or 0 if unknown. The median
+        is used so that a single outlier does not skew the hint.
+        '''
+        with self.lock:
+            l_duration : list   = self.d_history.get(str_title, [])
+            return statistics.median(l_duration) if l_duration else 0.0
+
+    def load(self, str_file : str) -> bool:
+        try:
+            with open(str_file) as f:
+                d_load  : dict  = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self.lock:
+            for str_title, l_duration in d_load.items():
+                self.d_history.setdefault(str_title, []).extend(l_duration)
+        return True
+
+    def save(self, str_file : str) -> bool:
+        if not str_file: return False
+        Path(str_file).parent.mkdir(parents = True, exist_ok = True)
+        with self.lock:
+            with open(str_file, 'w') as f:
+                json.dump(self.d_history, f, indent = 4)
+        return True
+
+# Durations observed by all waits in this process
+history : DurationHistory   = DurationHistory()
+
+class StatusPoller:
+    '''
+    A background poller that multiplexes all outstanding waits on plugin
+    instances over bulk CUBE list queries.
+    '''
+
+    def __init__(self, cl : client.Client, *args, **kwargs):
+        self.cl             : client.Client     = cl
+        self.pageSize       : int               = 1000
+        self.idQueries      : int               = 8
+        self.maxErrors      : int               = 10
+        self.d_schedule     : dict              = {}
+        for k, v in kwargs.items():
+            if k == 'pageSize'      : self.pageSize     = int(v)
+            if k == 'idQueries'     : self.idQueries    = int(v)
+            if k == 'maxErrors'     : self.maxErrors    = max(1, int(v))
+            if k == 'schedule'      : self.d_schedule   = v
+
+        # plugin instance id -> {'feed', 'futures', 'plinst', 'title',
+        #                        'schedule', 'due', 'errors'}
+        self.d_watch        : dict                  = {}
+        self.lock           : threading.Lock        = threading.Lock()
+        self.wakeup         : threading.Condition   = threading.Condition(self.lock)
+        self.thread         : threading.Thread | None = None
+        self.cycles         : int                   = 0
+        self.d_stats        : dict                  = {
+            'cycles'        : 0,
+            'requests'      : 0,
+            'resolved'      : 0,
+            'errors'        : 0,
+            'failed'        : 0
+        }
+
+    def watch(self,
+            plinstID    : int,
+            feedID      : int | None    = None,
+            str_title   : str           = ''
+        ) -> Future:
+        """
+        Register interest in plugin instance <plinstID> and return a future
+        that resolves to the plugin instance data once it has finished.
+
+        Args:
+            plinstID (int):         the plugin instance to wait on
+            feedID (int, optional): the feed containing the instance. Waits
+                                    on the same feed are batched into one
+                                    query.
+            str_title (str):        the node title, used to look up and
+                                    record the expected duration
+
+        Returns:
+            Future: resolves to the final plugin instance dictionary
+        """
+        future  : Future    = Future()
+        with self.lock:
+            if int(plinstID) not in self.d_watch:
+                self.d_watch[int(plinstID)] = {
+                    'feed'      : feedID,
+                    'futures'   : [],
+                    'plinst'    : {},
+                    'title'     : str_title,
+                    'schedule'  : PollSchedule(
+                                    expected = history.expected(str_title),
+                                    **self.d_schedule
+                                ),
+                    'due'       : time.monotonic(),
+                    'errors'    : 0
+                }
+            d_entry : dict  = self.d_watch[int(plinstID)]
+            d_entry['futures'].append(future)
+            if feedID is not None: d_entry['feed'] = feedID
+            if not self.thread or not self.thread.is_alive():
+                self.thread         = threading.Thread(
+                                        target  = self.loop,
+                                        name    = 'StatusPoller',
+                                        daemon  = True
+                                    )
+                self.thread.start()
+            self.wakeup.notify()
+        return future
+
+    def lastSeen(self, plinstID : int) -> dict:
+        '''
+        Return the most recently polled data for <plinstID> (possibly {})
+        '''
+        with self.lock:
+            return self.d_watch.get(int(plinstID), {}).get('plinst', {})
+
+    def unwatch(self, plinstID : int, future : Future) -> None:
+        '''
+        Drop a <future> (typically after a timeout) from the watch list.
+        '''
+        with self.lock:
+            d_entry : dict  = self.d_watch.get(int(plinstID), {})
+            if future in d_entry.get('futures', []):
+                d_entry['futures'].remove(future)
+            if d_entry and not d_entry['futures']:
+                del self.d_watch[int(plinstID)]
+
+    def feed_fetch(self, feedID : int, s_want : set) -> dict:
+        """
+        Fetch the status of the instances <s_want> in <feedID>.
+
+        CUBE filters plugin instances by exact id, but has no id range
+        filter. Up to <idQueries> instances are therefore fetched with one
+        query by id each; more are fetched by listing the feed, paging
+        until every one has been seen or the results are exhausted. The
+        listing costs about (feed size / pageSize) requests per poll on a
+        large feed (a parent with many children, most of them already
+        finished), which is why it is kept for many outstanding instances.
+
+        Returns:
+            dict: plugin instance id -> plugin instance data
+        """
+        d_found     : dict  = {}
+        offset      : int   = 0
+        d_query     : dict  = {'feed_id': feedID, 'limit': self.pageSize}
+        if len(s_want) <= self.idQueries:
+            for plinstID in sorted(s_want):
+                d_page  : dict  = self.cl.get_plugin_instances(dict(d_query, id = plinstID))
+                self.d_stats['requests']   += 1
+                for d_plinst in d_page.get('data', []):
+                    if d_plinst['id'] == plinstID:
+                        d_found[plinstID]   = d_plinst
+            return d_found
+        while True:
+            d_page  : dict  = self.cl.get_plugin_instances(dict(d_query, offset = offset))
+            self.d_stats['requests']   += 1
+            for d_plinst in d_page.get('data', []):
+                if d_plinst['id'] in s_want:
+                    d_found[d_plinst['id']] = d_plinst
+            offset += self.pageSize
+            if len(d_found) == len(s_want) or not d_page.get('hasNextPage'):
+                break
+        return d_found
+
+    def poll(self) -> dict:
+        """
+        Perform one polling cycle over all outstanding instances in feeds
+        that have at least one wait that is due. Instances in the same feed
+        that are not yet due come along "for free".
+
+        Returns:
+            dict: plugin instance id -> freshly polled data ({} if the
+                  instance was queried but not found)
+        """
+        now             : float = time.monotonic()
+        with self.lock:
+            d_byFeed    : dict  = {}
+            s_dueFeed   : set   = set()
+            for plinstID, d_entry in self.d_watch.items():
+                d_byFeed.setdefault(d_entry['feed'], set()).add(plinstID)
+                if d_entry['due'] <= now:
+                    s_dueFeed.add(d_entry['feed'])
+        d_polled        : dict  = {}
+        for feedID, s_want in d_byFeed.items():
+            if feedID not in s_dueFeed:
+                continue
+            d_polled.update({plinstID: {} for plinstID in s_want})
+            if feedID is not None:
+                d_polled.update(self.feed_fetch(feedID, s_want))
+            else:
+                for plinstID in s_want:
+                    d_polled[plinstID]  = self.cl.get_plugin_instance_by_id(plinstID)
+                    self.d_stats['requests']   += 1
+        return d_polled
+
+    def resolve(self, d_polled : dict) -> int:
+        '''
+        Record the <d_polled> data, resolve the futures of all finished
+        instances and reschedule the rest. Since a whole feed is polled at
+        once, all of its waits are rescheduled together, which keeps them
+        in phase so that later cycles again cover them in one query.
+        Returns the number of instances resolved.
+        '''
+        l_done  : list  = []
+        now     : float = time.monotonic()
+        with self.lock:
+            for plinstID, d_plinst in d_polled.items():
+                if plinstID not in self.d_watch: continue
+                d_entry : dict  = self.d_watch[plinstID]
+                d_entry['errors']   = 0
+                if d_plinst: d_entry['plinst'] = d_plinst
+                if status_isFinal(d_plinst.get('status', '')):
+                    history.record(d_entry['title'], d_entry['schedule'].elapsed())
+                    l_done.append((d_plinst, self.d_watch.pop(plinstID)['futures']))
+                else:
+                    d_entry['due']  = now + d_entry['schedule'].next()
+            self.d_stats['resolved']   += len(l_done)
+        for d_plinst, l_future in l_done:
+            for future in l_future:
+                if not future.done(): future.set_result(d_plinst)
+        return len(l_done)
+
+    def loop(self) -> None:
+        '''
+        The poller thread: sleep until the earliest wait is due, poll,
+        resolve; idle while nothing is being watched.
+        '''
+        while True:
+            with self.lock:
+                while True:
+                    if not self.d_watch:
+                        self.wakeup.wait()
+                        continue
+                    delay : float = min(d['due'] for d in self.d_watch.values()) \
+                                    - time.monotonic()
+                    if delay <= 0: break
+                    self.wakeup.wait(delay)
+            try:
+                self.resolve(self.poll())
+            except Exception as e:
+                self.fail(e)
+            self.cycles                += 1
+            self.d_stats['cycles']      = self.cycles
+
+    def fail(self, e : Exception) -> int:
+        '''
+        Handle the error <e> of a poll: transient CUBE errors should not
+        kill the poller, so the due waits are pushed back by their minimum
+        interval and retried -- until a wait has failed <maxErrors> polls
+        in a row, when its futures are failed with <e>. Returns the number
+        of waits failed.
+        '''
+        l_failed    : list  = []
+        now         : float = time.monotonic()
+        with self.lock:
+            self.d_stats['errors'] += 1
+            for plinstID, d_entry in list(self.d_watch.items()):
+                if d_entry['due'] > now: continue
+                d_entry['errors'] += 1
+                if d_entry['errors'] >= self.maxErrors:
+                    l_failed.append(self.d_watch.pop(plinstID)['futures'])
+                    continue
+                d_entry['due']      = now + d_entry['schedule'].minInterval
+            self.d_stats['failed'] += len(l_failed)
+        logger.warning("Status poll failed (%s: %s)%s" % (
+                        type(e).__name__, e,
+                        ', %d waits given up' % len(l_failed) if l_failed else ', retrying'))
+        for l_future in l_failed:
+            for future in l_future:
+                if not future.done(): future.set_exception(e)
+        return len(l_failed)
+
+    def stats(self) -> dict:
+        '''
+        Return a copy of the poller counters
+        '''
+        with self.lock:
+            return dict(self.d_stats, outstanding = len(self.d_watch))
+
+# One poller per CUBE client, shared by all workers in this process
+d_poller    : dict              = {}
+pollerLock  : threading.Lock    = threading.Lock()
+
+def poller_get(cl : client.Client, **kwargs) -> StatusPoller:
+    """
+    Return the process-wide poller for client <cl>, creating it on first
+    use with the passed <kwargs>.
+    """
+    with pollerLock:
+        if id(cl) not in d_poller:
+            d_poller[id(cl)]    = StatusPoller(cl, **kwargs)
+        return d_poller[id(cl)]
@@ -0,0 +1,236 @@
+str_about = '''
+    This module orders the inputs of a run for dispatch to the fan-out
+    engines: longest (most expensive) first, so that one large study that
+    happens to be discovered last cannot stretch the whole run.
+
+    The cost of an input is estimated from its file count and bytes. Given
+    the journals of earlier runs, a model of runtime in seconds is fit on
+    that cost (and inputs that ran before simply cost what they took), so
+    that the makespan of the run can be estimated -- by simulating the
+    dispatch order on the engine's workers -- and compared with the actual
+    one. A priority file can override the cost order for chosen inputs.
+'''
+
+import  os
+import  json
+import  heapq
+import  time
+from    datetime                import datetime
+from    pathlib                 import Path
+from    typing                  import Callable, Iterable, Iterator
+
+from    control.filter          import glob_compile
+
+class CostModel:
+    '''
+    Estimate the cost of an input from its files: a weighted sum of bytes
+    and file count and, when calibrated on the runtimes recorded in past
+    journals, a runtime in seconds.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        # the bytes that one file "costs" in fixed overhead
+        self.fileBytes  : int               = 1 << 20
+        self.fn_files   : Callable          = lambda str_input: [str_input]
+        for k, v in kwargs.items():
+            if k == 'fileBytes' : self.fileBytes    = int(v)
+            if k == 'files'     : self.fn_files     = v
+
+        # relative input -> runtime (seconds) in past runs
+        self.d_runtime  : dict              = {}
+        # runtime = intercept + slope * cost, once calibrated
+        self.intercept  : float             = 0.0
+        self.slope      : float             = 0.0
+        self.b_calibrated : bool            = False
+
+    def cost(self, str_input : str) -> float:
+        '''
+        The (unitless) cost of <str_input>: its bytes plus fileBytes per file
+        '''
+        nbytes  : int   = 0
+        l_file  : list  = self.fn_files(str_input)
+        for str_file in l_file:
+            try:
+                nbytes += os.stat(str_file).st_size
+            except OSError:
+                pass
+        return float(nbytes + self.fileBytes * len(l_file))
+
+    def journal_load(self, pathJournal : Path) -> int:
+        """
+        Add the runtimes -- from the "created" record of an input to its
+        "finished" record -- of the children in the journal <pathJournal>.
+        A child resumed by a rerun (its "finished" record is marked
+        'resumed') did not run from one to the other in one run, and an
+        input created more than once is ambiguous; neither is measured.
+        Inputs are keyed relative to the inputdir of the manifest next to
+        the journal, if there is one.
+
+        Returns:
+            int: the number of runtimes read
+        """
+        pathJournal                 = Path(pathJournal)
+        str_inputdir    : str       = ''
+        try:
+            with open(pathJournal.with_name('manifest.json')) as f:
+                str_inputdir        = json.load(f).get('meta', {}).get('inputdir', '')
+        except (OSError, ValueError):
+            pass
+        d_created       : dict      = {}
+        d_runtime       : dict      = {}
+        try:
+            with open(pathJournal) as f:
+                for str_line in f:
+                    try:
+                        d_record    = json.loads(str_line)
+                        t           = datetime.fromisoformat(d_record['time']).timestamp()
+                    except (ValueError, KeyError):
+                        continue
+                    str_input       = self.key(d_record['input'], str_inputdir)
+                    if d_record.get('stage') == 'created':
+                        d_created.setdefault(str_input, []).append(t)
+                    if d_record.get('stage') == 'finished' and not d_record.get('resumed') \
+                       and len(d_created.get(str_input, [])) == 1:
+                        d_runtime[str_input]    = t - d_created[str_input][0]
+        except OSError:
+            return 0
+        # an input created again after its "finished" record is dropped too
+        d_runtime                   = {k: v for k, v in d_runtime.items()
+                                        if len(d_created[k]) == 1}
+        self.d_runtime.update(d_runtime)
+        return len(d_runtime)
+
+    @staticmethod
+    def key(str_input : str, str_inputdir : str) -> str:
+        if str_inputdir and str_input.startswith(str_inputdir.rstrip('/') + '/'):
+            return str_input[len(str_inputdir.rstrip('/')) + 1:]
+        return str_input
+
+    def calibrate(self, inputdir : Path) -> bool:
+        """
+        Fit runtime = intercept + slope * cost by least squares over the past
+        inputs (of <inputdir>) that still exist.
+
+        Returns:
+            bool: is the model calibrated?
+        """
+        l_point     : list  = []
+        for str_input, runtime in self.d_runtime.items():
+            str_path    : str   = str(Path(inputdir) / str_input)
+            if os.path.exists(str_path):
+                l_point.append((self.cost(str_path), runtime))
+        if not l_point:
+            return False
+        n           : int   = len(l_point)
+        meanX       : float = sum(x for x, _ in l_point) / n
+        meanY       : float = sum(y for _, y in l_point) / n
+        varX        : float = sum((x - meanX) ** 2 for x, _ in l_point)
+        self.slope          = max(0.0, sum((x - meanX) * (y - meanY) for x, y in l_point) / varX) \
+                                if varX else 0.0
+        if not self.slope and meanX:
+            self.slope      = meanY / meanX
+            self.intercept  = 0.0
+        else:
+            self.intercept  = max(0.0, meanY - self.slope * meanX)
+        self.b_calibrated   = True
+        return True
+
+    def seconds(self, str_rel : str, cost : float) -> float | None:
+        '''
+        The estimated runtime (seconds) of the input <str_rel> of <cost>
+        '''
+        if str_rel in self.d_runtime:
+            return self.d_runtime[str_rel]
+        if not self.b_calibrated:
+            return None
+        return self.intercept + self.slope * cost
+
+def makespan(l_duration : list, workers : int) -> float:
+    """
+    The makespan of dispatching jobs of <l_duration>, in that order, each
+    to the first of <workers> that is free.
+
+    Returns:
+        float: the time at which the last job finishes
+    """
+    l_free  : list  = [0.0] * max(1, workers)
+    for duration in l_duration:
+        heapq.heappush(l_free, heapq.heappop(l_free) + duration)
+    return max(l_free)
+
+class LongestFirst:
+    '''
+    Reorder (<input>, <output>) pairs by descending priority, then
+    descending estimated runtime (or, without one, descending cost).
+    '''
+
+    def __init__(self, inputdir : Path, model : CostModel, *args, **kwargs):
+        self.workers    : int               = 1
+        self.l_priority : list              = []
+        for k, v in kwargs.items():
+            if k == 'workers'   : self.workers      = max(1, int(v))
+            if k == 'priorities': self.l_priority   = self.priorities_load(v) if v else []
+
+        self.inputdir   : Path              = Path(inputdir)
+        self.model      : CostModel         = model
+        self.d_report   : dict              = {}
+        # monotonic time of the first dispatch
+        self.started    : float | None      = None
+
+    @staticmethod
+    def priorities_load(str_file : str) -> list:
+        """
+        Read a priority override file: a JSON object of input globs
+        (relative to the inputdir) to integer priorities, e.g.
+
+            {"**/urgent*": 10, "study-0042/**": 5}
+
+        Returns:
+            list: (<compiled glob>, <priority>) in file order
+        """
+        with open(str_file) as f:
+            d_priority  : dict  = json.load(f)
+        return [(glob_compile(k), int(v)) for k, v in d_priority.items()]
+
+    def priority(self, str_rel : str) -> int:
+        for regex, priority in self.l_priority:
+            if regex.match(str_rel): return priority
+        return 0
+
+    def __call__(self, mapper : Iterable) -> Iterator[tuple]:
+        """
+        Collect all pairs of <mapper> (dispatch cannot start before the
+        largest input is known), then yield them in schedule order.
+        """
+        l_job   : list  = []
+        for order, (input, output) in enumerate(mapper):
+            str_rel     : str   = CostModel.key(str(input), str(self.inputdir))
+            cost        : float = self.model.cost(str(input))
+            l_job.append({
+                'pair'      : (input, output),
+                'order'     : order,
+                'priority'  : self.priority(str_rel),
+                'cost'      : cost,
+                'seconds'   : self.model.seconds(str_rel, cost)
+            })
+        # order on the estimated runtimes when every input has one (the
+        # model is calibrated, or each ran before), else on the raw cost
+        b_timed     : bool  = all(d['seconds'] is not None for d in l_job)
+        str_key     : str   = 'seconds' if b_timed else 'cost'
+        l_scheduled : list  = sorted(l_job, key = lambda d: (-d['priority'], -d[str_key], d['order']))
+        self.d_report       = {
+            'inputs'        : len(l_job),
+            'workers'       : self.workers,
+            'calibrated'    : self.model.b_calibrated,
+            'history'       : len(self.model.d_runtime),
+            'orderedBy'     : str_key,
+            'prioritized'   : sum(1 for d in l_job if d['priority']),
+            'estimatedMakespan'     : round(makespan([d['seconds'] for d in l_scheduled],
+                                                     self.workers), 3) if b_timed else None,
+            'estimatedMakespanFIFO' : round(makespan([d['seconds'] for d in l_job],
+                                                     self.workers), 3) if b_timed else None,
+            'first'         : [str(d['pair'][0]) for d in l_scheduled[:5]]
+        }
+        self.started        = time.monotonic()
+        for d_job in l_scheduled:
+            yield d_job['pair']
@@ -0,0 +1,206 @@
+str_about = '''
+    This module provides a single, pooled HTTP session for all requests
+    made to CUBE through python-chrisclient.
+
+    python-chrisclient calls the module level "requests.get/post/..."
+    functions, so every call opens (and discards) its own connection and
+    re-sends basic auth credentials. Here, those calls are routed through
+    one requests.Session instead: connections are kept alive in a pool
+    sized to the number of concurrent workers, and basic auth is swapped
+    for a CUBE auth token that is fetched once per (url, user) and shared
+    by all threads. session_uninstall() undoes the routing, so that the
+    chrisclient module is left as it was found.
+'''
+
+import  threading
+import  requests
+from    requests.adapters       import HTTPAdapter
+from    urllib.parse            import urlsplit
+from    chrisclient             import request as chrisrequest
+
+class PooledRequests:
+    '''
+    A drop-in for the parts of the "requests" module that chrisclient
+    uses, backed by one shared Session with a sized connection pool and
+    a cache of auth tokens.
+    '''
+
+    exceptions  = requests.exceptions
+
+    def __init__(self, *args, **kwargs):
+        self.poolSize   : int               = 10
+        self.useToken   : bool              = True
+        for k, v in kwargs.items():
+            if k == 'poolSize'  : self.poolSize = max(1, int(v))
+            if k == 'useToken'  : self.useToken = bool(v)
+
+        self.session    : requests.Session  = requests.Session()
+        self.adapter    : HTTPAdapter       = HTTPAdapter(
+                                                pool_connections    = self.poolSize,
+                                                pool_maxsize        = self.poolSize
+                                            )
+        self.session.mount('http://',  self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        # (api root, username, password) -> token (or None if unavailable)
+        self.d_token    : dict              = {}
+        self.d_tokenLock: dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+        self.d_stats    : dict              = {
+            'requests'      : 0,
+            'tokenHits'     : 0,
+            'tokenMisses'   : 0,
+            'tokenFailures' : 0
+        }
+
+    @staticmethod
+    def apiRoot_get(str_url : str) -> str:
+        '''
+        The CUBE API root (".../api/v1/") of any resource <str_url>
+        '''
+        parts       = urlsplit(str_url)
+        str_path    : str   = parts.path
+        if '/api/v1/' in str_path:
+            str_path        = str_path[:str_path.index('/api/v1/') + len('/api/v1/')]
+        return '%s://%s%s' % (parts.scheme, parts.netloc, str_path)
+
+    def token_fetch(self, str_root : str, str_user : str, str_password : str) -> str | None:
+        try:
+            r = self.session.post(
+                    str_root + 'auth-token/',
+                    json    = {'username': str_user, 'password': str_password},
+                    headers = {'Accept': 'application/json'},
+                    timeout = 30
+                )
+            if r.status_code == 200:
+                return r.json().get('token')
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        return None
+
+    def token_get(self, str_url : str, auth : tuple) -> str | None:
+        """
+        Return the cached auth token for the credentials in <auth> against
+        the CUBE serving <str_url>, fetching it on first use. Only one
+        thread fetches a given token; a failed fetch is remembered and the
+        caller falls back to basic auth.
+
+        Returns:
+            str | None: the token, or None if not available
+        """
+        key     : tuple = (self.apiRoot_get(str_url),) + tuple(auth)
+        with self.lock:
+            if key in self.d_token:
+                self.d_stats['tokenHits']  += 1
+                return self.d_token[key]
+            keyLock : threading.Lock    = self.d_tokenLock.setdefault(key, threading.Lock())
+        with keyLock:
+            with self.lock:
+                if key in self.d_token:
+                    self.d_stats['tokenHits']  += 1
+                    return self.d_token[key]
+                self.d_stats['tokenMisses']    += 1
+            str_token   : str | None    = self.token_fetch(*key)
+            with self.lock:
+                self.d_token[key]   = str_token
+                if not str_token: self.d_stats['tokenFailures'] += 1
+        return str_token
+
+    def token_invalidate(self, str_url : str, auth : tuple) -> None:
+        with self.lock:
+            self.d_token.pop((self.apiRoot_get(str_url),) + tuple(auth), None)
+
+    def request(self, str_method : str, str_url : str, **kwargs) -> requests.Response:
+        """
+        Perform a request through the pooled session, replacing basic
+        <auth> by a token header where possible. A token that CUBE no
+        longer accepts is dropped and the request is retried once with
+        basic auth.
+        """
+        with self.lock:
+            self.d_stats['requests']   += 1
+        auth        : tuple | None  = kwargs.pop('auth', None)
+        str_token   : str | None    = None
+        if auth and self.useToken:
+            str_token               = self.token_get(str_url, auth)
+        if str_token:
+            headers : dict          = dict(kwargs.pop('headers', None) or {})
+            headers['Authorization']    = 'Token %s' % str_token
+            r       = self.session.request(str_method, str_url, headers = headers, **kwargs)
+            if r.status_code != 401:
+                return r
+            self.token_invalidate(str_url, auth)
+            del headers['Authorization']
+            kwargs['headers']       = headers
+        return self.session.request(str_method, str_url, auth = auth, **kwargs)
+
+    def get(self, url, **kwargs)    -> requests.Response: return self.request('GET',    url, **kwargs)
+    def post(self, url, **kwargs)   -> requests.Response: return self.request('POST',   url, **kwargs)
+    def put(self, url, **kwargs)    -> requests.Response: return self.request('PUT',    url, **kwargs)
+    def delete(self, url, **kwargs) -> requests.Response: return self.request('DELETE', url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Return the request and token counters together with connection
+        reuse counters summed over all urllib3 pools: "connections" is the
+        number of connections opened, "reused" the requests that did not
+        need a new one.
+
+        Returns:
+            dict: the session counters
+        """
+        connections : int   = 0
+        poolRequests: int   = 0
+        pools               = self.adapter.poolmanager.pools
+        for poolKey in list(pools.keys()):
+            pool            = pools.get(poolKey)
+            if pool is None: continue
+            connections    += pool.num_connections
+            poolRequests   += pool.num_requests
+        with self.lock:
+            return dict(
+                self.d_stats,
+                poolSize    = self.poolSize,
+                connections = connections,
+                reused      = max(0, poolRequests - connections)
+            )
+
+# The process-wide session, installed into chrisclient by session_install()
+pooled      : PooledRequests | None = None
+sessionLock : threading.Lock        = threading.Lock()
+# what chrisclient used before session_install() (normally "requests")
+replaced                            = None
+
+def session_install(**kwargs) -> PooledRequests:
+    """
+    Create the process-wide pooled session (with <kwargs>, e.g. poolSize)
+    on first call and route all python-chrisclient requests through it.
+
+    Returns:
+        PooledRequests: the shared session
+    """
+    global pooled, replaced
+    with sessionLock:
+        if pooled is None:
+            pooled                  = PooledRequests(**kwargs)
+            replaced                = chrisrequest.requests
+            chrisrequest.requests   = pooled
+        return pooled
+
+def session_uninstall() -> None:
+    '''
+    Give python-chrisclient back the module it used before
+    session_install() and close the pooled session
+    '''
+    global pooled, replaced
+    with sessionLock:
+        if pooled is None: return
+        chrisrequest.requests       = replaced
+        pooled.session.close()
+        pooled, replaced            = None, None
+
+def stats() -> dict:
+    '''
+    The counters of the installed session ({} if none is installed)
+    '''
+    return pooled.stats() if pooled else {}
@@ -0,0 +1,195 @@
+str_about = '''
+    This module provides the "dyworkflow-watch" command, the companion of
+    a --noblock run of dyworkflow.
+
+    A --noblock run only creates the children and schedules their
+    workflows, and then exits leaving a manifest.json in its outputdir.
+    This command reads that manifest and tracks the blocking node of
+    every child with the batched status poller, finally reporting the
+    final status of each child. The statuses seen are written back into
+    the manifest, so that a later --incremental run against it retries
+    only the children that failed.
+'''
+
+import  sys
+import  json
+import  time
+from    argparse                import ArgumentParser, Namespace, ArgumentDefaultsHelpFormatter
+from    concurrent.futures      import Future, wait
+from    pathlib                 import Path
+
+from    control                 import action, poller, session
+from    state                   import data, manifest
+
+parser: ArgumentParser      = ArgumentParser(
+    description = '''
+Track the completion of the children scheduled by a --noblock
+run of dyworkflow, as recorded in its manifest.
+''',
+    formatter_class=ArgumentDefaultsHelpFormatter)
+
+parser.add_argument(
+            'manifest',
+            help    = 'the manifest.json written by a dyworkflow run'
+)
+parser.add_argument(
+            '--CUBEurl',
+            default = '',
+            help    = 'CUBE URL (by default, the one recorded in the manifest)'
+)
+parser.add_argument(
+            '--CUBEuser',
+            default = 'chris',
+            help    = 'CUBE/ChRIS username'
+)
+parser.add_argument(
+            '--CUBEpassword',
+            default = 'chris1234',
+            help    = 'CUBE/ChRIS password'
+)
+parser.add_argument(
+            '--pollMin',
+            default = '1',
+            help    = 'minimum interval (seconds) between status polls of CUBE'
+)
+parser.add_argument(
+            '--pollInterval',
+            default = '30',
+            help    = 'maximum interval (seconds) between status polls of CUBE'
+)
+parser.add_argument(
+            '--timeout',
+            default = '0',
+            help    = 'seconds to wait for all children to finish; 0 waits forever'
+)
+parser.add_argument(
+            '--report',
+            default = '',
+            help    = 'file to write the JSON report to (default: next to the manifest)'
+)
+
+def env_fromManifest(options : Namespace, runManifest : manifest.Manifest) -> data.env:
+    """
+    Build the environment for the CUBE that the manifest's run targeted.
+
+    Returns:
+        data.env: an environment with the CUBE details set
+    """
+    env : data.env  = data.env()
+    env.CUBE.set(url        = options.CUBEurl or runManifest.d_meta.get('CUBEurl', ''))
+    env.CUBE.set(username   = options.CUBEuser)
+    env.CUBE.set(password   = options.CUBEpassword)
+    return env
+
+def children_watch(statusPoller : poller.StatusPoller, l_child : list) -> list:
+    """
+    Register a wait on the blocking node of every child in <l_child>.
+    Children without a blocking node (they failed to be scheduled) are
+    passed through with no future.
+
+    Returns:
+        list: (<d_child>, <Future> | None) pairs
+    """
+    l_watch : list  = []
+    for d_child in l_child:
+        future  : Future | None = None
+        if int(d_child.get('blockNodeID') or -1) >= 0:
+            future              = statusPoller.watch(
+                                    d_child['blockNodeID'],
+                                    d_child.get('feedID'),
+                                    d_child.get('blockNodeTitle', '')
+                                )
+        l_watch.append((d_child, future))
+    return l_watch
+
+def manifest_update(statusPoller : poller.StatusPoller, l_watch : list) -> int:
+    """
+    Record the final (or, for a child still running, the last seen)
+    status and blocking node of every watched child in its manifest
+    record.
+
+    Returns:
+        int: the number of records updated
+    """
+    updated     : int   = 0
+    for d_child, future in l_watch:
+        if future is None or (future.done() and future.exception()): continue
+        d_plinst    : dict  = future.result() if future.done() else \
+                                statusPoller.lastSeen(d_child['blockNodeID'])
+        if not d_plinst.get('status'): continue
+        d_child['status']       = d_plinst['status']
+        d_child['blockNodeID']  = int(d_plinst.get('id') or d_child['blockNodeID'])
+        updated    += 1
+    return updated
+
+def report_build(statusPoller : poller.StatusPoller, l_watch : list,
+                 elapsed : float) -> dict:
+    """
+    Collect the final (or last seen) status of every watched child.
+
+    Returns:
+        dict: the report, with per-status counts and per-child records
+    """
+    l_child     : list  = []
+    d_count     : dict  = {}
+    for d_child, future in l_watch:
+        str_status  : str   = d_child.get('status', 'unscheduled')
+        if future is not None:
+            if future.done() and future.exception():
+                str_status  = 'unknown (%s)' % type(future.exception()).__name__
+            elif future.done():
+                str_status  = future.result().get('status', '')
+            else:
+                str_status  = statusPoller.lastSeen(d_child['blockNodeID']).get(
+                                'status', 'unknown'
+                              ) + ' (timeout)'
+                statusPoller.unwatch(d_child['blockNodeID'], future)
+        d_count[str_status]     = d_count.get(str_status, 0) + 1
+        l_child.append(dict(d_child, status = str_status))
+    return {
+        'elapsed'   : round(elapsed, 3),
+        'counts'    : d_count,
+        'poller'    : statusPoller.stats(),
+        'children'  : l_child
+    }
+
+def main(argv : list | None = None) -> int:
+    options     : Namespace         = parser.parse_args(argv)
+    pathManifest: Path              = Path(options.manifest)
+    runManifest : manifest.Manifest = manifest.Manifest.load(pathManifest)
+    env         : data.env          = env_fromManifest(options, runManifest)
+    session.session_install(poolSize = 2)
+    statusPoller: poller.StatusPoller = poller.poller_get(
+                                        action.CUBEclient_get(env),
+                                        schedule = {
+                                            'minInterval'   : float(options.pollMin),
+                                            'maxInterval'   : float(options.pollInterval)
+                                        }
+                                    )
+
+    start       : float = time.monotonic()
+    l_watch     : list  = children_watch(statusPoller, runManifest.children())
+    l_future    : list  = [future for _, future in l_watch if future is not None]
+    wait(l_future, timeout = float(options.timeout) or None)
+
+    if manifest_update(statusPoller, l_watch):
+        runManifest.save(pathManifest)
+    d_report    : dict  = report_build(statusPoller, l_watch, time.monotonic() - start)
+    pathReport  : Path  = Path(options.report) if options.report else \
+                            pathManifest.with_name('watch-report.json')
+    with open(pathReport, 'w') as f:
+        json.dump(d_report, f, indent = 4, default = str)
+    session.session_uninstall()
+
+    print("%d children, %s in %.1fs (report: %s)" % (
+            len(l_watch),
+            ', '.join('%d %s' % (n, s) for s, n in sorted(d_report['counts'].items())),
+            d_report['elapsed'],
+            pathReport
+        ))
+    b_allOK     : bool  = all(c['status'] == 'finishedSuccessfully'
+                                for c in d_report['children'])
+    return 0 if b_allOK else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
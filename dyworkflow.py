@@ -10,18 +10,33 @@ os.environ['XDG_CONFIG_HOME'] = '/tmp'
 import  pudb
 from    pudb.remote             import set_trace
 from    loguru                  import logger
-from    concurrent.futures      import ThreadPoolExecutor, ProcessPoolExecutor
-from    threading               import current_thread, get_native_id
+from    concurrent.futures      import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from    concurrent.futures      import wait, FIRST_COMPLETED
+from    threading               import current_thread, get_native_id, Lock, Thread, local
+import  time
 
 from    typing                  import Callable, Any, Iterable, Iterator
 from    io                      import TextIOWrapper
 
 from    datetime                import datetime, timezone
 import  json
+import  hashlib
 from    state                   import data
+from    state                   import metadata
+from    state                   import manifest
+from    state                   import journal
+from    state.index             import InputIndex
+from    state                   import fingerprint
+from    state.predcache         import PredicateCache
+from    state.leases            import LeaseQueue
 from    logic                   import behavior
 from    control                 import action
-from    control.filter          import PathFilter
+from    control                 import poller
+from    control                 import engine
+from    control                 import session
+from    control                 import jobber
+from    control.filter          import PathFilter, Chunker, Shard
+from    control.schedule        import CostModel, LongestFirst
 from    pftag                   import pftag
 from    pflog                   import pflog
 
@@ -42,6 +57,26 @@ timenow:Callable[[], str]       = lambda:\
         datetime.now(timezone.utc).astimezone().isoformat()
 
 ld_forestResult:list            = []
+runManifest:manifest.Manifest   = manifest.Manifest()
+runJournal:journal.Journal      = journal.Journal()
+# the per-child fields recorded in the manifest (and the "finished" journal)
+l_manifestField:list            = ['input', 'branchInstanceID', 'workflowID',
+                                   'blockNodeID', 'blockNodeTitle', 'feedID', 'status',
+                                   'fingerprint', 'copy', 'bytesAvoidedEstimate']
+# set with --shard / --select / --incremental / --dedup
+shard:Shard | None                          = None
+selection:behavior.Filter | None            = None
+incremental:fingerprint.Incremental | None  = None
+dedup:fingerprint.Dedup | None              = None
+# set with --chunkFiles / --chunkBytes
+chunker:Chunker | None                      = None
+# set with --schedule longest
+scheduler:LongestFirst | None               = None
+# set with --queue; the lease that a worker thread is growing a child for
+workQueue:LeaseQueue | None                 = None
+leaseLocal:local                            = local()
+# the --copy 'auto' probe is done once, by the first child
+copyLock:Lock                               = Lock()
 
 __version__ = '1.1.6'
 
@@ -73,6 +108,198 @@ parser.add_argument(
             pattern for file names to include (you should quote this!)
             (this flag triggers the PathMapper on the inputdir).'''
 )
+parser.add_argument(
+            '--discovery',
+            default = 'mapper',
+            choices = ['mapper', 'stream', 'parallel'],
+            help    = '''
+            how inputs are discovered: 'mapper' uses the chris_plugin
+            PathMapper, 'stream' a single-pass scandir traversal that feeds
+            children as inputs are found (--pattern may then be a comma
+            separated list), 'parallel' the same traversal with directory
+            listings read ahead by --discoveryWorkers threads (for network
+            filesystems)'''
+)
+parser.add_argument(
+            '--discoveryWorkers',
+            default = '16',
+            help    = "threads reading directories ahead with '--discovery parallel'"
+)
+parser.add_argument(
+            '--inputIndex',
+            default = '',
+            help    = '''
+            optional file holding an index of the input tree. If it exists,
+            only directories changed since it was written are re-listed
+            and the inputs added/removed/changed are reported; it is then
+            updated (implies at least '--discovery stream')'''
+)
+parser.add_argument(
+            '--queue',
+            default = '',
+            help    = '''
+            a shared directory through which cooperating controllers (on
+            any nodes mounting it, with the same parent as inputdir) pull
+            the inputs as leases, rather than each growing a fixed set of
+            children. See --queueRole. The leases are worked on by a pool
+            of --queueWorkers threads: --engine (and --thread) do not apply
+            and are ignored.'''
+)
+parser.add_argument(
+            '--queueRole',
+            default = 'both',
+            choices = ['both', 'publish', 'work'],
+            help    = '''
+            with --queue: 'publish' discovers the inputs and publishes them
+            to the queue, 'work' only claims and grows children from queued
+            inputs, 'both' does both at once'''
+)
+parser.add_argument(
+            '--queueTTL',
+            default = '300',
+            help    = '''
+            with --queue, seconds after its last heartbeat that a lease
+            expires, so that the input is reclaimed by another controller'''
+)
+parser.add_argument(
+            '--queueAttempts',
+            default = '3',
+            help    = '''
+            with --queue, the number of times an input is claimed (and its
+            growth fails, or its controller dies) before it is recorded as
+            failed rather than queued again'''
+)
+parser.add_argument(
+            '--queueWorkers',
+            default = '0',
+            help    = 'with --queue, the number of leases worked on concurrently (0: one per CPU)'
+)
+parser.add_argument(
+            '--schedule',
+            default = 'fifo',
+            choices = ['fifo', 'longest'],
+            help    = '''
+            the order in which inputs are dispatched to the fan-out: 'fifo'
+            as discovered, or 'longest' first by estimated cost (file count
+            and bytes, or a runtime model fit on --costHistory). 'longest'
+            completes discovery before the first dispatch.'''
+)
+parser.add_argument(
+            '--costHistory',
+            default = '',
+            help    = '''
+            comma separated journal.jsonl files of earlier runs, whose child
+            runtimes calibrate the cost model of '--schedule longest' (and
+            so the estimated makespan in the run summary)'''
+)
+parser.add_argument(
+            '--priority',
+            default = '',
+            help    = '''
+            optional JSON file of {<input glob>: <priority>} overrides for
+            '--schedule longest'; higher priorities are dispatched first,
+            whatever their cost'''
+)
+parser.add_argument(
+            '--shard',
+            default = '',
+            help    = '''
+            '<i>/<N>' (0 <= i < N): process only slice i of N of the inputs,
+            chosen by a stable hash of their path relative to the inputdir,
+            so that N controllers on the same parent together process every
+            input once. Combine their manifests with 'dyworkflow-merge'.
+            --dedup only collapses duplicates within a shard.'''
+)
+parser.add_argument(
+            '--select',
+            default = '',
+            help    = '''
+            only grow children from inputs whose DICOM headers pass all of
+            these ';' separated conditions, e.g.
+            'Modality=CR,DX;BodyPartExamined=LEG,LOWER LIMB;Rows>=1024'
+            (operators '=', '!=', '~' regex, '>=', '<=', '>', '<'). With
+            --inNode, a directory passes if any of its files does. The
+            headers are read before fan-out, in a process pool'''
+)
+parser.add_argument(
+            '--selectCache',
+            default = '',
+            help    = '''
+            optional sqlite file in which --select results are kept across
+            runs, keyed by each input's path, size and mtime and by the
+            conditions; inputs that have not changed are not read again'''
+)
+parser.add_argument(
+            '--selectCacheSize',
+            default = str(64 << 20),
+            help    = '''
+            the size (bytes) that the --selectCache may grow to before its
+            least recently used results are evicted'''
+)
+parser.add_argument(
+            '--dedup',
+            default = 'none',
+            choices = ['none', 'content', 'uid'],
+            help    = '''
+            collapse duplicate inputs (e.g. the same study under two
+            directories) to one child, keyed by their file contents or by
+            the DICOM SOP instance UIDs in their headers; the skipped
+            duplicates are listed in the run summary'''
+)
+parser.add_argument(
+            '--copy',
+            default = 'auto',
+            choices = ['auto', 'hardlink', 'reflink', 'copy'],
+            help    = '''
+            how each child is populated with its input files: as reflinks
+            (copy-on-write clones) or as full copies; 'auto' probes whether
+            the storage supports reflinks, and a reflink falls back to a copy
+            where it fails. 'hardlink' is never picked by 'auto': the child's
+            files then share their inodes with the parent's, so a plugin that
+            modifies its input in place also modifies the parent's data. A
+            hardlink does not fall back to a copy.'''
+)
+parser.add_argument(
+            '--chunkFiles',
+            default = '0',
+            help    = '''
+            in file mode (without --inNode), pack up to this many inputs
+            into one child, copied by a single pl-shexec with a combined
+            fileFilter; 0 (or 1) does not chunk by count'''
+)
+parser.add_argument(
+            '--chunkBytes',
+            default = '0',
+            help    = '''
+            in file mode, close a chunk of inputs before its total size
+            would exceed this many bytes; 0 does not chunk by size'''
+)
+parser.add_argument(
+            '--incremental',
+            default = '',
+            help    = '''
+            the manifest.json of a previous run: only inputs that are new,
+            whose fingerprint changed, or whose child failed then get a
+            child; the others (including children still pending after a
+            --noblock run) are carried over into this run's manifest'''
+)
+parser.add_argument(
+            '--fingerprint',
+            default = 'stat',
+            choices = ['stat', 'hash', 'none'],
+            help    = '''
+            how inputs are fingerprinted in the manifest: 'stat' from file
+            sizes and mtimes, 'hash' from file contents (hashed in a process
+            pool with --incremental)'''
+)
+parser.add_argument(
+            '--exclude',
+            default = '',
+            help    = '''
+            comma separated patterns of paths (relative to the inputdir) to
+            skip with '--discovery stream'; matching directories are not
+            entered'''
+)
 parser.add_argument(
             '--pluginInstanceID',
             default = '',
@@ -128,6 +355,51 @@ parser.add_argument(
             default = '',
             help    = 'optional node on which the controller will wait/block. Useful to measure execution time'
 )
+parser.add_argument(
+            '--childMode',
+            default = 'native',
+            choices = ['native', 'cli'],
+            help    = '''
+            how to create each child: 'native' POSTs the pl-shexec directly
+            through a shared CUBE client, 'cli' shells out to chrispl-run
+            (native falls back to cli on error)'''
+)
+parser.add_argument(
+            '--metadataTTL',
+            default = '0',
+            help    = '''
+            time-to-live (seconds) of cached CUBE pipeline/plugin metadata
+            shared by all children; 0 means cache for the whole run'''
+)
+parser.add_argument(
+            '--poller',
+            default = 'batch',
+            choices = ['batch', 'single'],
+            help    = '''
+            how to wait on nodes: 'batch' multiplexes all waits over one
+            central poller using bulk per-feed queries, 'single' polls each
+            node from its own worker. '--engine async' always uses 'batch'.'''
+)
+parser.add_argument(
+            '--pollMin',
+            default = '1',
+            help    = '''
+            minimum interval (seconds) between status polls of CUBE; the
+            first poll is immediate and later ones back off from this value'''
+)
+parser.add_argument(
+            '--pollInterval',
+            default = '5',
+            help    = 'maximum interval (seconds) between status polls of CUBE'
+)
+parser.add_argument(
+            '--pollHistory',
+            default = '',
+            help    = '''
+            optional JSON file of node durations from past runs, used as an
+            expected-duration hint when polling (and updated at the end of
+            this run)'''
+)
 parser.add_argument(
             '--verbosity',
             default = '0',
@@ -140,6 +412,48 @@ parser.add_argument(
             action  = 'store_true',
             default = False
 )
+parser.add_argument(
+            "--engine",
+            help    = '''
+            the fan-out engine: 'thread' uses a thread pool (with --thread)
+            or runs serially, 'async' runs every child as a coroutine,
+            'staged' pipelines create/schedule/await stages over bounded
+            queues''',
+            default = 'thread',
+            choices = ['thread', 'async', 'staged']
+)
+parser.add_argument(
+            "--concurrency",
+            help    = "maximum number of children in flight with '--engine async'",
+            default = '256'
+)
+parser.add_argument(
+            "--stageWorkers",
+            help    = "'<create>,<schedule>,<await>' workers per stage with '--engine staged'",
+            default = '4,4,64'
+)
+parser.add_argument(
+            "--stageQueue",
+            help    = "size of the bounded queue between stages with '--engine staged'",
+            default = '16'
+)
+parser.add_argument(
+            "--noresume",
+            help    = '''
+            ignore (and truncate) the child journal of an earlier run in the
+            outputdir; by default inputs that already have a child, workflow
+            or result recorded there resume from that stage''',
+            dest    = 'noresume',
+            action  = 'store_true',
+            default = False
+)
+parser.add_argument(
+            "--httpPool",
+            help    = '''
+            size of the shared HTTP connection pool to CUBE; 0 sizes it to
+            the number of workers that can make requests concurrently''',
+            default = '0'
+)
 parser.add_argument(
             "--pftelDB",
             help    = "an optional pftel telemetry logger, of form '<pftelURL>/api/v1/<object>/<collection>/<event>'",
@@ -152,6 +466,16 @@ parser.add_argument(
             action  = 'store_true',
             default = False
 )
+parser.add_argument(
+            "--noblock",
+            help    = '''
+            only create children and schedule their workflows, then write
+            the manifest and exit; track completion later with
+            'dyworkflow-watch <outputdir>/manifest.json'.''',
+            dest    = 'noblock',
+            action  = 'store_true',
+            default = False
+)
 parser.add_argument(
             "--notimeout",
             help    = "if specified, then controller never timesout while waiting on nodes to complete",
@@ -279,13 +603,14 @@ def childFilter_build(options: Namespace, Env : data.env) -> action.PluginRun:
             Env.CUBE.parentPluginInstanceID_discover()['parentPluginInstanceID']
     return PLinputFilter
 
-def respawnChild_catchError(PLseed:action.PluginRun, input: Path) -> dict:
+def respawnChild_catchError(PLseed:action.PluginRun, input: Path, **kwargs) -> dict:
     """
     Re-run a failed filter (pl-shexec) with explicit error catching
 
     Args:
         PLseed (action.Pluginrun): the plugin run object to re-execute
         input (Path): the input on which the seed failed
+        kwargs: passed on to the plugin run (e.g. a chunk's fileFilter)
 
     Returns:
         dict: the detailed error log from the failed run
@@ -293,7 +618,7 @@ def respawnChild_catchError(PLseed:action.PluginRun, input: Path) -> dict:
     global  LOG
     LOG("Some error was returned when planting the seed!")
     LOG('Replanting seed with error catching on...')
-    d_seedreplant:dict  = PLseed(str(input), append = "--jsonReturn")
+    d_seedreplant:dict  = PLseed(str(input), append = "--jsonReturn", **kwargs)
     return d_seedreplant
 
 def childNode_create(options:Namespace, env:data.env, input:Path, d_ret:dict[Any, Any]) -> bool:
@@ -304,18 +629,16 @@ def childNode_create(options:Namespace, env:data.env, input:Path, d_ret:dict[Any
         nonlocal str_heartbeat
         Path('%s/start-%s.touch' % (env.outputdir.touch(), str_threadName))
         LOG("Processing parent in thread %s..." % str_threadName)
-        fl:TextIOWrapper                = open(str_heartbeat, 'w')
-        fl.write('Start time: {}\n'.format(timenow()))
-        fl.close()
+        heartbeat_mark(str_heartbeat, 'Start')
         LOG("Filtering parent->child in %s" % str(input))
 
     str_threadName:str              = current_thread().getName()
-    str_heartbeat:str               = str(env.outputdir.joinpath('heartbeat-%s.log' % \
-                                                str_threadName))
+    str_heartbeat:str               = heartbeat_file(env)
     d_ret['heartbeat']              = str_heartbeat
-    conditional:behavior.Filter     = behavior.Filter()
-    conditional.obj_pass            = behavior.unconditionalPass
-    if not conditional.obj_pass(str(input)):
+    conditional:behavior.Filter     = selection or \
+                                        behavior.Filter(filterOp = behavior.unconditionalPass)
+    l_input:list                    = chunker.files(input) if chunker else [str(input)]
+    if not all(conditional.obj_pass(str_input) for str_input in l_input):
         d_ret['status']             = False
         d_ret['message']            = 'No data in parent was filtered'
         return False
@@ -323,24 +646,243 @@ def childNode_create(options:Namespace, env:data.env, input:Path, d_ret:dict[Any
     initLogging_do()
 
     PLinputFilter:action.PluginRun  = childFilter_build(options, env)
-    d_ret['childFilter']            = PLinputFilter(str(input))
+    d_chunk:dict[str, str]          = {}
+    if chunker and str(input) in chunker.d_chunk:
+        d_chunk['fileFilter']       = chunker.fileFilter(input)
+    d_ret['childFilter']            = PLinputFilter(str(input), **d_chunk)
     if not d_ret['childFilter']['status']:
-        d_ret['childFilter']['debug'] = respawnChild_catchError(PLinputFilter, input)
+        d_ret['childFilter']['debug'] = respawnChild_catchError(PLinputFilter, input, **d_chunk)
         return False
 
     return True
 
-def workflow_attachToChild(options:Namespace, env:data.env, d_ret:dict[Any, Any]) -> bool:
+def fingerprint_get(options:Namespace, str_input:str) -> str:
+    """
+    The fingerprint of <str_input> for the manifest: as computed by the
+    --incremental filter, else computed here ('' with '--fingerprint none').
+    A chunk's fingerprint is that of the fingerprints of its inputs.
+    """
+    if chunker and str_input in chunker.d_chunk:
+        d_input:dict                = chunkInputs_get(options, str_input)
+        if not all(d_input.values()):
+            return ''
+        return 'chunk:' + hashlib.sha256('\n'.join(d_input.values()).encode()).hexdigest()
+    if incremental and str_input in incremental.d_fingerprint:
+        return incremental.d_fingerprint[str_input]
+    if options.fingerprint == 'hash':
+        return fingerprint.fingerprint_hash(Path(str_input))
+    if options.fingerprint == 'stat':
+        return fingerprint.fingerprint_stat(Path(str_input))
+    return ''
+
+def inputFiles_get(str_input:str) -> list:
+    '''
+    The files of <str_input>: those of a chunk, or of an input directory
+    '''
+    l_input:list                    = chunker.files(str_input) if chunker else [str_input]
+    return [f for str_file in l_input for f in fingerprint.files_list(Path(str_file))]
+
+def copy_resolve(options:Namespace, env:data.env, input:Path) -> str:
+    """
+    Resolve '--copy auto' to the strategy that the storage supports, by
+    probing with (the first file of) <input>.
 
-    def endLogging_do() -> None:
-        fl:TextIOWrapper                = open(d_ret['heartbeat'], 'w')
-        fl.write('End   time: {}\n'.format(timenow()))
-        fl.close()
+    Returns:
+        str: the copy strategy for all children
+    """
+    with copyLock:
+        if options.copy == 'auto':
+            l_file:list             = inputFiles_get(str(input))
+            options.copy            = action.copyStrategy_probe(l_file[0], env.outputdir) \
+                                        if l_file else 'copy'
+            LOG("Children are populated by '%s'" % options.copy)
+        return options.copy
+
+def bytesAvoided_get(options:Namespace, str_input:str) -> int:
+    '''
+    An estimate of the bytes of <str_input> that a linking copy strategy
+    did not copy: the controller cannot see whether a reflink silently
+    fell back to a copy in the child, so this is an upper bound
+    '''
+    if options.copy not in ['hardlink', 'reflink']:
+        return 0
+    nbytes:int                      = 0
+    for str_file in inputFiles_get(str_input):
+        try:
+            nbytes                 += os.stat(str_file).st_size
+        except OSError:
+            pass
+    return nbytes
+
+def chunkInputs_get(options:Namespace, str_input:str) -> dict:
+    '''
+    The inputs packed into the chunk <str_input>, with their fingerprints
+    '''
+    return {str_file: fingerprint_get(options, str_file)
+                for str_file in chunker.d_chunk[str_input]}
+
+def heartbeat_file(env:data.env) -> str:
+    '''
+    The heartbeat of this thread's child: its lease with --queue, else a
+    per-thread log in the outputdir
+    '''
+    if getattr(leaseLocal, 'lease', ''):
+        return leaseLocal.lease
+    return str(env.outputdir.joinpath('heartbeat-%s.log' % \
+                                        current_thread().getName()))
+
+def heartbeat_mark(str_heartbeat:str, str_event:str) -> None:
+    if workQueue and str_heartbeat == getattr(leaseLocal, 'lease', ''):
+        workQueue.heartbeat(str_heartbeat)
+        return
+    fl:TextIOWrapper                = open(str_heartbeat, 'w')
+    fl.write('{:<5} time: {}\n'.format(str_event, timenow()))
+    fl.close()
+
+def heartbeat_end(d_ret:dict[Any, Any]) -> None:
+    heartbeat_mark(d_ret['heartbeat'], 'End')
+
+def childResult_init() -> dict[Any, Any]:
+    """
+    Return the (empty) result structure of one child's growth
 
-    workflow:action.Workflow        = action.Workflow(env = env, options = options)
-    d_ret["workflowRun"]            = workflow(d_ret['childFilter']['branchInstanceID'])
-    endLogging_do()
-    return True
+    Returns:
+        dict: the result structure
+    """
+    d_childFilter:dict[Any, Any]    = {
+        "status"        : False,
+        "message"       : "",
+        "error"         : "unable to filter child",
+        "debug"         : {}
+    }
+    d_worflowRun:dict[Any, Any]     = {
+        "status"        : False,
+        "message"       : "",
+        "error"         : "unable to attach workflow to child"
+    }
+    d_ret:dict                      = {
+        "status"        : False,
+        "message"       : "",
+        "heartbeat"     : "",
+        "childFilter"   : d_childFilter,
+        "workflowRun"   : d_worflowRun
+    }
+    return d_ret
+
+class ChildStages(engine.Stages):
+    """
+    The growth of one child (see parentNode_process) broken into the
+    separate stages driven by the fan-out engines.
+    """
+
+    def __init__(self, options:Namespace, env:data.env):
+        self.options:Namespace          = options
+        self.env:data.env               = env
+
+    def resumed(self, input:Path, d_journal:dict) -> tuple[bool, dict[Any, Any]]:
+        """
+        Rebuild the result structure of <input> from its journal state
+        <d_journal> (see runJournal). A child that had finished is done
+        already; otherwise it continues with the stage after the last one
+        journaled.
+        """
+        d_ret:dict[Any, Any]            = childResult_init()
+        d_ret['status']                 = True
+        d_ret['resumed']                = d_journal['stage']
+        d_ret['heartbeat']              = heartbeat_file(self.env)
+        d_ret['childFilter']            = {
+            'status'            : True,
+            'run'               : {'mode': 'journal'},
+            'input'             : str(input),
+            'branchInstanceID'  : d_journal['branchInstanceID']
+        }
+        LOG("Resuming %s after stage '%s'" % (str(input), d_journal['stage']))
+        if d_journal['stage'] != 'finished':
+            return True, d_ret
+        d_ret['workflowRun']            = {
+            'finished'  : True,
+            'status'    : d_journal.get('status', ''),
+            'plid'      : d_journal.get('blockNodeID', -1)
+        }
+        d_child:dict                    = {k: d_journal.get(k) for k in l_manifestField}
+        if 'inputs' in d_journal: d_child['inputs'] = d_journal['inputs']
+        d_ret['manifest']               = runManifest.add(**d_child)
+        ld_forestResult.append(d_ret)
+        return False, d_ret
+
+    def create(self, input:Path, output:Path) -> tuple[bool, dict[Any, Any]]:
+        self.env.set_telnet_trace_if_specified()
+        copy_resolve(self.options, self.env, input)
+        if runJournal.stage_reached(str(input), 'created'):
+            return self.resumed(input, runJournal.state(str(input)))
+        d_ret:dict[Any, Any]            = childResult_init()
+        b_ok:bool                       = childNode_create(self.options, self.env, input, d_ret)
+        if b_ok:
+            runJournal.record(str(input), 'created',
+                branchInstanceID    = d_ret['childFilter']['branchInstanceID']
+            )
+        return b_ok, d_ret
+
+    def schedule(self, d_ret:dict[Any, Any]) -> action.Workflow:
+        workflow:action.Workflow        = action.Workflow(env = self.env, options = self.options)
+        str_input:str                   = d_ret['childFilter']['input']
+        d_journal:dict                  = runJournal.state(str_input)
+        if runJournal.stage_reached(str_input, 'scheduled'):
+            workflow.computeFlow_resume(
+                d_ret['childFilter']['branchInstanceID'], d_journal['workflowID']
+            )
+            return workflow
+        workflow.computeFlow_schedule(d_ret['childFilter']['branchInstanceID'])
+        runJournal.record(str_input, 'scheduled',
+            workflowID          = workflow.ld_workflowhist[-1]['workflow_id']
+        )
+        return workflow
+
+    def watch(self, workflow:action.Workflow) -> Future | dict:
+        d_workflowInst:dict             = workflow.ld_workflowhist[-1]['pipeline_plugins']
+        if self.options.noblock:
+            return workflow.computeFlow_detach(d_workflowInst)
+        if self.options.poller == 'batch':
+            return workflow.computeFlow_watch(d_workflowInst)
+        return workflow.computeFlow_wait(d_workflowInst)
+
+    def timeout(self, workflow:action.Workflow) -> float:
+        return workflow.computeFlow_timeout()
+
+    def abandon(self, workflow:action.Workflow) -> dict:
+        return workflow.computeFlow_abandon()
+
+    def complete(self, d_ret:dict[Any, Any], workflow:action.Workflow, d_wait:dict) -> dict:
+        d_ret["workflowRun"]            = d_wait
+        heartbeat_end(d_ret)
+        str_input:str                   = d_ret['childFilter']['input']
+        d_chunk:dict                    = {}
+        if chunker and str_input in chunker.d_chunk:
+            d_chunk['inputs']           = chunkInputs_get(self.options, str_input)
+        d_child:dict                    = runManifest.add(
+            fingerprint     = fingerprint_get(self.options, str_input),
+            input           = str_input,
+            branchInstanceID= d_ret['childFilter']['branchInstanceID'],
+            workflowID      = workflow.ld_workflowhist[-1]['workflow_id'],
+            blockNodeID     = d_wait['plid'],
+            blockNodeTitle  = workflow.pluginParameters.blockOnNode,
+            feedID          = workflow.node_feedID(d_wait['workflow'], d_wait['plid']),
+            status          = d_wait['status'],
+            copy            = self.options.copy,
+            bytesAvoidedEstimate = bytesAvoided_get(self.options, str_input),
+            **d_chunk
+        )
+        d_ret['manifest']               = d_child
+        if poller.status_isFinal(d_wait['status']):
+            # a child resumed by a rerun did not run from "created" to
+            # "finished" in one go; its record is marked for CostModel
+            if d_ret.get('resumed'): d_chunk['resumed'] = d_ret['resumed']
+            runJournal.record(d_child['input'], 'finished',
+                **{k: d_child[k] for k in l_manifestField if k != 'input'},
+                **d_chunk
+            )
+        ld_forestResult.append(d_ret)
+        return d_ret
 
 def parentNode_process(options: Namespace, env:data.env, input: Path, output: Path) -> dict:
     """
@@ -360,45 +902,17 @@ def parentNode_process(options: Namespace, env:data.env, input: Path, output: Pa
 
     global LOG, ld_forestResult
 
-    def init_vars() ->  dict[Any, Any]:
-        d_childFilter:dict[Any, Any]    = {
-            "status"        : False,
-            "message"       : "",
-            "error"         : "unable to filter child",
-            "debug"         : {}
-        }
-        d_worflowRun:dict[Any, Any]     = {
-            "status"        : False,
-            "message"       : "",
-            "error"         : "unable to attach workflow to child"
-        }
-        d_ret:dict                      = {
-            "status"        : False,
-            "message"       : "",
-            "heartbeat"     : "",
-            "childFilter"   : d_childFilter,
-            "workflowRun"   : d_worflowRun
-        }
-        return d_ret
-
     # set_trace(term_size=(253, 62), host = '0.0.0.0', port = 7900)
-    env.set_telnet_trace_if_specified()
-    d_ret:dict[Any, Any]            = init_vars()
-
-    if not childNode_create(options, env, input, d_ret):
-        return d_ret
-
-    if workflow_attachToChild(options, env, d_ret):
-        ld_forestResult.append(d_ret)
-
     # This global variable is accessed/used to record the results
     # of multijob runs
-    return d_ret
+    return ChildStages(options, env).run(input, output)
 
 def mapper_resolve(options:Namespace, inputdir:Path, outputdir:Path) -> PathMapper:
     """
     Simply creates and returns a mapper -- either a dir_mapper_deep or a
-    file_mapper depending on options settings.
+    file_mapper depending on options settings, or (with '--discovery
+    stream|parallel') a PathFilter yielding the same pairs from a single
+    streaming traversal.
 
     Args:
         options (Namespace): CLI namespace
@@ -408,6 +922,20 @@ def mapper_resolve(options:Namespace, inputdir:Path, outputdir:Path) -> PathMapp
     Returns:
         PathMapper: a mapper as parameterized by options
     """
+    if options.discovery in ['stream', 'parallel'] or options.inputIndex:
+        return PathFilter(
+                            inputdir,
+                            outputdir,
+                            glob        = options.pattern,
+                            exclude     = options.exclude,
+                            dirs_deep   = options.inNode,
+                            workers     = options.discoveryWorkers \
+                                            if options.discovery == 'parallel' else 1,
+                            index       = InputIndex.load(options.inputIndex) \
+                                            if options.inputIndex else None,
+                            indexed     = bool(options.inputIndex),
+                            logger      = LOG
+                        )
     mapper:PathMapper   = PathMapper.dir_mapper_deep(inputdir, outputdir)
     if not options.inNode:
         mapper          = PathMapper.file_mapper(
@@ -422,16 +950,413 @@ def mapper_resolve(options:Namespace, inputdir:Path, outputdir:Path) -> PathMapp
                         )
     return mapper
 
-def multijob_handle(options:Namespace, env:data.env, mapper:PathMapper) -> bool:
+def inputs_resolve(options:Namespace, inputdir:Path, mapper:Iterable) -> Iterable:
+    """
+    Wrap <mapper>, in turn: with --shard, so that it only yields this
+    controller's slice of the inputs, with --select, only inputs whose
+    DICOM headers qualify, with --dedup, no duplicate inputs, with
+    --incremental, only inputs that need (re)processing compared to the
+    previous run's manifest, with --chunkFiles/--chunkBytes, chunks of
+    inputs and, with '--schedule longest', in descending order of cost.
+
+    Args:
+        options (Namespace): CLI namespace
+        inputdir (Path): inputdir of plugin
+        mapper (Iterable): the mapper that discovers the inputs
+
+    Returns:
+        Iterable: the (possibly filtered) mapper
+    """
+    global shard, selection, dedup
+    if options.shard:
+        shard                       = Shard(inputdir, options.shard)
+        mapper                      = shard(mapper)
+    if options.select:
+        selection                   = behavior.Filter(
+                                        filterOp = behavior.Selection(
+                                            behavior.predicates_parse(options.select)
+                                        ),
+                                        cache    = PredicateCache(
+                                            options.selectCache,
+                                            maxBytes = options.selectCacheSize
+                                        ) if options.selectCache else None
+                                    )
+        mapper                      = selection(mapper)
+    if options.dedup != 'none':
+        dedup                       = fingerprint.Dedup(mode = options.dedup)
+        mapper                      = dedup(mapper)
+    if options.incremental:
+        mapper                      = incremental_resolve(options, inputdir, mapper)
+    return schedule_resolve(options, inputdir, chunks_resolve(options, mapper))
+
+def incremental_resolve(options:Namespace, inputdir:Path, mapper:Iterable) -> Iterable:
+    '''
+    Wrap <mapper> in the --incremental filter against a previous manifest
+    '''
+    global incremental
+    previous:manifest.Manifest      = manifest.Manifest.load(Path(options.incremental))
+    # fingerprints are only comparable if made the same way as before
+    str_mode:str                    = previous.d_meta.get('fingerprint', options.fingerprint)
+    if str_mode not in ['stat', 'hash']: str_mode = 'stat'
+    options.fingerprint             = str_mode
+    incremental                     = fingerprint.Incremental(
+                                        previous,
+                                        inputdir,
+                                        mode    = str_mode
+                                    )
+    LOG("Incremental run against %d children of %s" % \
+            (len(incremental.d_previous), options.incremental))
+    return incremental(mapper)
+
+def chunks_resolve(options:Namespace, mapper:Iterable) -> Iterable:
+    '''
+    With --chunkFiles/--chunkBytes in file mode, wrap <mapper> so that it
+    yields one input per chunk of inputs
+    '''
+    global chunker
+    if int(options.chunkFiles) <= 1 and not int(options.chunkBytes):
+        return mapper
+    if options.inNode:
+        LOG("Chunking applies to file mode only; ignored with --inNode")
+        return mapper
+    chunker                         = Chunker(
+                                        count   = options.chunkFiles,
+                                        bytes   = options.chunkBytes
+                                    )
+    return chunker(mapper)
+
+def workers_count(options:Namespace) -> int:
+    '''
+    The number of children that the selected engine grows concurrently
+    '''
+    if options.queue:
+        return int(options.queueWorkers) or len(os.sched_getaffinity(0))
+    if options.engine == 'async':
+        return int(options.concurrency)
+    if options.engine == 'staged':
+        return int(options.stageWorkers.split(',')[-1])
     if int(options.thread):
-        with ThreadPoolExecutor(max_workers=len(os.sched_getaffinity(0))) as pool:
-            presults:Iterator[dict[Any, Any]] = pool.map(lambda t:
-                                        parentNode_process(options, env, *t),
-                                                            mapper)
+        return len(os.sched_getaffinity(0))
+    return 1
+
+def schedule_resolve(options:Namespace, inputdir:Path, mapper:Iterable) -> Iterable:
+    '''
+    With '--schedule longest', wrap <mapper> so that it yields the inputs
+    longest (by estimated runtime, else cost) first
+    '''
+    global scheduler
+    if options.schedule != 'longest':
+        return mapper
+    model:CostModel                 = CostModel(files = inputFiles_get)
+    for str_journal in filter(None, options.costHistory.split(',')):
+        LOG("Read %d child runtimes from %s" % (model.journal_load(Path(str_journal)), str_journal))
+    if model.calibrate(inputdir):
+        LOG("Cost model: %.3fs + %.3gs per unit of cost" % (model.intercept, model.slope))
+    scheduler                       = LongestFirst(
+                                        inputdir,
+                                        model,
+                                        workers     = workers_count(options),
+                                        priorities  = options.priority
+                                    )
+    return scheduler(mapper)
+
+def schedule_report(fanEnd:float) -> dict:
+    '''
+    The '--schedule longest' report, with the actual makespan of the
+    fan-out that ended at (monotonic time) <fanEnd>
+    '''
+    if not scheduler:
+        return {}
+    d_report:dict                   = dict(scheduler.d_report)
+    d_report['actualMakespan']      = round(fanEnd - scheduler.started, 3) \
+                                        if scheduler.started else None
+    return d_report
+
+def inputIndex_save(options:Namespace, env:data.env, mapper:Iterable) -> Path | None:
+    """
+    Persist the input index built by a PathFilter <mapper> (see
+    --inputIndex) and write what changed since the last one to the
+    outputdir.
 
-        # raise any Exceptions which happened in threads
-        for _ in presults:
-            pass
+    Args:
+        options (Namespace): CLI namespace
+        env (data.env): the environment for this tree
+        mapper (Iterable): the mapper that discovered the inputs
+
+    Returns:
+        Path | None: the index file, if one was written
+    """
+    if not options.inputIndex or not isinstance(mapper, PathFilter) or not mapper.indexNew:
+        return None
+    if mapper.indexOld:
+        with open(env.outputdir / 'inputs-diff.json', 'w') as f:
+            json.dump(mapper.d_diff, f, indent = 4)
+    pathIndex:Path                  = mapper.indexNew.save(Path(options.inputIndex))
+    LOG("Input index of %d files written to %s" % \
+            (len(mapper.indexNew.d_file), pathIndex))
+    return pathIndex
+
+def manifest_save(options:Namespace, env:data.env) -> Path:
+    """
+    Write the run manifest of all created children to the outputdir.
+
+    Args:
+        options (Namespace): CLI namespace
+        env (data.env): the environment for this tree
+
+    Returns:
+        Path: the manifest file
+    """
+    if incremental:
+        for d_child in incremental.l_carried:
+            runManifest.add(**d_child)
+    runManifest.d_meta.update({
+        'version'           : __version__,
+        'inputdir'          : str(env.inputdir),
+        'fingerprint'       : options.fingerprint,
+        'shard'             : options.shard,
+        'CUBEurl'           : options.CUBEurl,
+        'pipeline'          : options.pipeline,
+        'blockOnNode'       : options.blockOnNode,
+        'parentInstanceID'  : env.CUBE.parentPluginInstanceID,
+        'noblock'           : options.noblock
+    })
+    pathManifest:Path               = runManifest.save(env.outputdir / 'manifest.json')
+    LOG("Manifest of %d children written to %s" % \
+            (len(runManifest.children()), pathManifest))
+    return pathManifest
+
+def httpPool_size(options:Namespace) -> int:
+    """
+    The connection pool size for the shared CUBE session: either as set
+    by --httpPool, or the number of threads of the selected engine (or of
+    the --queue workers) that make requests concurrently (plus one for the
+    status poller).
+
+    Args:
+        options (Namespace): CLI namespace
+
+    Returns:
+        int: the pool size
+    """
+    if int(options.httpPool):
+        return int(options.httpPool)
+    if options.queue:
+        if options.queueRole == 'publish':
+            return 2
+        return workers_count(options) + 1
+    if options.engine == 'async':
+        return min(32, int(options.concurrency)) + 1
+    if options.engine == 'staged':
+        l_workers:list              = [int(n) for n in options.stageWorkers.split(',')]
+        return sum(l_workers[:2]) + 1
+    if int(options.thread):
+        return len(os.sched_getaffinity(0)) + 1
+    return 2
+
+def discovery_stats(mapper:Iterable) -> dict:
+    '''
+    The traversal counters of a PathFilter <mapper> ({} for a PathMapper),
+    with the number of inputs added/removed/changed if indexed
+    '''
+    if not isinstance(mapper, PathFilter):
+        return {}
+    d_stats:dict                    = dict(mapper.d_stats)
+    d_stats.update({k: len(v) for k, v in mapper.d_diff.items()})
+    return d_stats
+
+def summary_save(options:Namespace, env:data.env, mapper:Iterable = (),
+                 fanEnd:float = 0.0) -> Path:
+    """
+    Write a summary of the run -- counters of discovery, the shared
+    caches, the status poller and the HTTP session -- to the outputdir.
+
+    Args:
+        options (Namespace): CLI namespace
+        env (data.env): the environment for this tree
+        mapper (Iterable): the mapper that discovered the inputs
+        fanEnd (float): the (monotonic) time that the fan-out ended
+
+    Returns:
+        Path: the summary file
+    """
+    d_poller:dict                   = {}
+    for statusPoller in poller.d_poller.values():
+        for k, v in statusPoller.stats().items():
+            d_poller[k]             = d_poller.get(k, 0) + v
+    d_summary:dict                  = {
+        'version'           : __version__,
+        'children'          : len(runManifest.children()),
+        'journal'           : runJournal.counts(),
+        'metadata'          : metadata.cache.stats(),
+        'poller'            : d_poller,
+        'discovery'         : discovery_stats(mapper),
+        'incremental'       : incremental.d_stats if incremental else {},
+        'shard'             : shard.stats() if shard else {},
+        'queue'             : workQueue.stats() if workQueue else {},
+        'schedule'          : schedule_report(fanEnd),
+        'selection'         : selection.stats() if selection else {},
+        'dedup'             : dedup.stats() if dedup else {},
+        'chunks'            : chunker.stats() if chunker else {},
+        'copy'              : {
+            'strategy'      : options.copy,
+            'bytesAvoidedEstimate'  : sum(d.get('bytesAvoidedEstimate') or 0
+                                          for d in runManifest.children() if not d.get('carried'))
+        },
+        'session'           : session.stats(),
+        'jobs'              : jobber.joblog.stats()
+    }
+    pathSummary:Path                = env.outputdir / 'summary.json'
+    with open(pathSummary, 'w') as f:
+        json.dump(d_summary, f, indent = 4, default = str)
+    LOG("Run summary written to %s" % pathSummary)
+    return pathSummary
+
+def queue_publish(options:Namespace, env:data.env, inputs:Iterable) -> int:
+    """
+    Publish the discovered <inputs> to the --queue, keyed (and located) by
+    their paths relative to the inputdir, then close the queue.
+
+    Returns:
+        int: the number of inputs newly published
+    """
+    published:int                   = 0
+    # ranked in the order of <inputs>, e.g. longest first with --schedule
+    for rank, (input, output) in enumerate(inputs):
+        str_input:str               = str(Path(input).relative_to(env.inputdir))
+        l_file:list                 = chunker.files(input) if chunker else [str(input)]
+        published                  += workQueue.publish(str_input, {
+            'input'     : str_input,
+            'output'    : str(Path(output).relative_to(env.outputdir)),
+            'files'     : [str(Path(f).relative_to(env.inputdir)) for f in l_file]
+        }, rank = rank)
+    workQueue.close()
+    LOG("Published %d inputs to %s" % (published, options.queue))
+    return published
+
+def queue_work(options:Namespace, env:data.env) -> None:
+    """
+    Claim inputs from the --queue and grow a child from each with
+    parentNode_process, until the queue is drained. An input whose lease
+    is lost (it expired and was taken over) is dropped, and one whose
+    growth raises is released back to the queue for another attempt, or
+    recorded as failed once its --queueAttempts are used up.
+    """
+    d_item:dict | None              = workQueue.claim()
+    while d_item is not None or not workQueue.isDrained():
+        if d_item is None:
+            time.sleep(max(float(options.pollMin), 0.05))
+            d_item                  = workQueue.claim()
+            continue
+        input:Path                  = env.inputdir / d_item['input']
+        if len(d_item['files']) > 1:
+            chunker.d_chunk[str(input)] = [str(env.inputdir / f) for f in d_item['files']]
+        if not workQueue.heartbeat(d_item['lease']):
+            LOG("Lease on %s was lost before its child was grown, dropped" % d_item['input'])
+            d_item                  = workQueue.claim()
+            continue
+        leaseLocal.lease            = d_item['lease']
+        try:
+            d_ret:dict              = parentNode_process(options, env, input,
+                                                         env.outputdir / d_item['output'])
+        except Exception as e:
+            logger.exception("Growing %s failed (attempt %d of %d)" %
+                             (d_item['input'], d_item['attempts'], workQueue.maxAttempts))
+            if d_item['attempts'] < workQueue.maxAttempts:
+                workQueue.release(d_item, '%s: %s' % (type(e).__name__, e))
+            else:
+                workQueue.complete(d_item, {
+                    'input'     : str(input),
+                    'status'    : 'failed',
+                    'error'     : '%s: %s' % (type(e).__name__, e),
+                    'attempts'  : d_item['attempts']
+                })
+            d_item                  = workQueue.claim()
+            continue
+        finally:
+            leaseLocal.lease        = ''
+        if not workQueue.heartbeat(d_item['lease']) or \
+           not workQueue.complete(d_item, d_ret.get('manifest', {
+                'input'     : str(input),
+                'status'    : d_ret.get('message') or 'notCreated'
+           })):
+            LOG("Lease on %s was lost while its child was grown, left to its new owner" %
+                d_item['input'])
+        d_item                      = workQueue.claim()
+
+def queue_handle(options:Namespace, env:data.env, inputs:Iterable) -> bool:
+    """
+    With --queue, publish the <inputs> and/or work on the queued inputs
+    (concurrently) according to --queueRole.
+
+    Returns:
+        bool: True if the queue handled the run
+    """
+    global workQueue, chunker
+    if not options.queue:
+        return False
+    workQueue                       = LeaseQueue(options.queue, ttl = options.queueTTL,
+                                                 maxAttempts = options.queueAttempts)
+    LOG("Working queue %s as '%s' (%s)" % (options.queue, workQueue.owner, options.queueRole))
+    if options.queueRole == 'publish':
+        queue_publish(options, env, inputs)
+        return True
+    if options.engine != 'thread':
+        LOG("The queue is worked by --queueWorkers threads; --engine %s ignored" % options.engine)
+    # chunks published by other controllers are registered by the workers;
+    # the chunker they share must exist before they start
+    if not chunker: chunker         = Chunker()
+    publisher:Thread | None         = None
+    if options.queueRole == 'both':
+        publisher                   = Thread(target = queue_publish, name = 'QueuePublisher',
+                                             args = (options, env, inputs), daemon = True)
+        publisher.start()
+    workers:int                     = int(options.queueWorkers) or len(os.sched_getaffinity(0))
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        for future in [pool.submit(queue_work, options, env) for _ in range(workers)]:
+            future.result()
+    if publisher: publisher.join()
+    workQueue.stop()
+    return True
+
+def multijob_handle(options:Namespace, env:data.env, mapper:PathMapper) -> bool:
+    if options.engine == 'async':
+        if options.poller != 'batch':
+            # a 'single' wait would hold one of the few ioWorkers threads
+            # for the whole life of its workflow
+            LOG("The async engine waits on the batch poller; --poller %s ignored" % options.poller)
+            options.poller              = 'batch'
+        asyncEngine:engine.AsyncEngine  = engine.AsyncEngine(
+                                            ChildStages(options, env),
+                                            concurrency = int(options.concurrency),
+                                            ioWorkers   = min(32, int(options.concurrency))
+                                        )
+        asyncEngine(mapper)
+        return True
+    if options.engine == 'staged':
+        stagedEngine:engine.StagedEngine    = engine.StagedEngine(
+                                                ChildStages(options, env),
+                                                workers     = dict(zip(
+                                                    ['create', 'schedule', 'await'],
+                                                    options.stageWorkers.split(',')
+                                                )),
+                                                queueSize   = int(options.stageQueue)
+                                            )
+        stagedEngine(mapper)
+        return True
+    if int(options.thread):
+        workers:int                     = len(os.sched_getaffinity(0))
+        s_inflight:set                  = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # submit lazily (unlike pool.map, which exhausts the mapper
+            # first) so that children start while discovery continues
+            for input, output in mapper:
+                if len(s_inflight) >= 2 * workers:
+                    s_done, s_inflight  = wait(s_inflight, return_when = FIRST_COMPLETED)
+                    # raise any Exceptions which happened in threads
+                    for future in s_done: future.result()
+                s_inflight.add(pool.submit(parentNode_process, options, env, input, output))
+        for future in s_inflight: future.result()
         return True
     return False
 
@@ -464,18 +1389,39 @@ def main(options: Namespace, inputdir: Path, outputdir: Path):
     """
 
     options.pftelDB             = preamble(options)
+    metadata.cache.ttl_set(float(options.metadataTTL))
+    session.session_install(poolSize = httpPool_size(options))
+    if options.pollHistory:
+        poller.history.load(options.pollHistory)
     d_results:dict[Any, Any]    = {}
     env:data.env                = Env_setup(options,
                                             inputdir,
                                             outputdir,
                                             get_native_id())
-
+    records:int                 = runJournal.open(outputdir / 'journal.jsonl',
+                                                  resume = not options.noresume)
+    jobber.joblog.open(outputdir / 'jobs.jsonl')
+    if records:
+        LOG("Resuming from journal of %d records: %s" % (records, runJournal.counts()))
 
     mapper:PathMapper = mapper_resolve(options, inputdir, outputdir)
-    if not multijob_handle(options, env, mapper):
-        for input, output in mapper:
+    inputs:Iterable   = inputs_resolve(options, inputdir, mapper)
+    if not queue_handle(options, env, inputs) and \
+       not multijob_handle(options, env, inputs):
+        for input, output in inputs:
             d_results =   parentNode_process(options, env, input, output)
         print(d_results)
+    fanEnd:float      = time.monotonic()
+    poller.history.save(options.pollHistory)
+    runJournal.close()
+    jobber.joblog.close()
+    inputIndex_save(options, env, mapper)
+    manifest_save(options, env)
+    summary_save(options, env, mapper, fanEnd)
+    if selection and selection.cache:
+        LOG("Selection cache: %s" % selection.cache.stats())
+        selection.cache.close()
+    session.session_uninstall()
 
 if __name__ == '__main__':
     main()
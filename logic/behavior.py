@@ -7,15 +7,153 @@ str_about = '''
     copying the object into a child plugin, and then running a pipeline
     on the result of that copy-to-child.
 
-    For now, this class is mostly dummy filler.
+    The conditional logic is a small library of predicates on DICOM header
+    tags (modality, body part, series description, image size, ...), read
+    through logic.dicom from the file header only, never the pixel data.
+    A Filter evaluates them over all candidate inputs in a process pool
+    before the fan-out, so that no child (and no workflow) is created for
+    an input that does not qualify. Given a PredicateCache (see
+    state.predcache), results from earlier runs are reused for inputs that
+    have not changed, without opening them.
 '''
 
+import  os
+import  re
+import  hashlib
+import  threading
+from    collections             import deque
+from    concurrent.futures      import ProcessPoolExecutor, Future
+from    typing                  import Callable, Iterable, Iterator
+
+from    logic                   import dicom
+from    state                   import fingerprint
+from    state.predcache         import PredicateCache
+
+# bump when the meaning of a predicate changes, to invalidate cached results
+str_predicateVersion    : str   = '1'
+
 def unconditionalPass(str_object: str) -> bool:
     '''
     A dummy fall through function that always returns True.
     '''
     return True
 
+class Predicate:
+    '''
+    A condition on the value of one DICOM header tag. A file without the
+    tag fails the condition.
+    '''
+
+    # <op> -> <fn>(<header value>, <predicate values>)
+    d_op    : dict  = {
+        '='     : lambda v, l: v.upper() in l,
+        '!='    : lambda v, l: v.upper() not in l,
+        '~'     : lambda v, l: any(r.search(v) for r in l),
+        '>='    : lambda v, l: float(v) >= l[0],
+        '<='    : lambda v, l: float(v) <= l[0],
+        '>'     : lambda v, l: float(v) > l[0],
+        '<'     : lambda v, l: float(v) < l[0]
+    }
+
+    def __init__(self, tag : str, op : str, l_value : list):
+        if op not in self.d_op:
+            raise ValueError("unknown predicate operator '%s'" % op)
+        self.tag        : str   = tag
+        self.op         : str   = op
+        if op in ['=', '!=']:
+            self.l_value        = [str(v).strip().upper() for v in l_value]
+        elif op == '~':
+            self.l_value        = [re.compile(str(v), re.IGNORECASE) for v in l_value]
+        else:
+            if len(l_value) != 1:
+                raise ValueError("'%s' compares with one number, not %d" % (op, len(l_value)))
+            self.l_value        = [float(l_value[0])]
+
+    def __repr__(self) -> str:
+        return 'Predicate(%s %s %s)' % (self.tag, self.op, self.l_value)
+
+    def __call__(self, d_header : dict) -> bool:
+        if self.tag not in d_header:
+            return False
+        try:
+            return self.d_op[self.op](d_header[self.tag], self.l_value)
+        except ValueError:
+            return False
+
+def modality_is(*l_modality) -> Predicate:
+    return Predicate('Modality', '=', l_modality)
+
+def bodyPart_is(*l_bodyPart) -> Predicate:
+    return Predicate('BodyPartExamined', '=', l_bodyPart)
+
+def seriesDescription_matches(*l_regex) -> Predicate:
+    return Predicate('SeriesDescription', '~', l_regex)
+
+def imageSize_atLeast(rows : int, columns : int) -> list:
+    return [Predicate('Rows', '>=', [rows]), Predicate('Columns', '>=', [columns])]
+
+def predicates_parse(str_spec : str) -> list:
+    """
+    Parse a ';' separated list of conditions, each of the form
+    <tag><op><value>, into Predicates. <op> is one of '=' / '!=' (the
+    value is a comma separated list, compared case insensitively), '~' (a
+    regular expression searched for) or a numeric comparison '>=', '<=',
+    '>', '<'. For example:
+
+        Modality=CR,DX;BodyPartExamined=LEG,LOWER LIMB;Rows>=1024
+
+    Returns:
+        list: the predicates, all of which an input must pass (a
+              malformed condition raises a ValueError naming it)
+    """
+    l_predicate : list  = []
+    for str_cond in str_spec.split(';'):
+        if not str_cond.strip(): continue
+        match   = re.match(r'\s*(\w+)\s*(!=|>=|<=|=|~|>|<)(.*)', str_cond)
+        if not match:
+            raise ValueError("cannot parse condition '%s'" % str_cond)
+        str_tag, str_op, str_value  = match.groups()
+        if str_tag not in dicom.d_tagName:
+            raise ValueError("unknown tag '%s' in condition '%s'" % (str_tag, str_cond))
+        if not str_value.strip():
+            raise ValueError("no value in condition '%s'" % str_cond)
+        l_value : list  = [str_value] if str_op == '~' else str_value.split(',')
+        try:
+            l_predicate.append(Predicate(str_tag, str_op, l_value))
+        except (ValueError, re.error) as e:
+            raise ValueError("bad value in condition '%s': %s" % (str_cond, e)) from None
+    return l_predicate
+
+class Selection:
+    '''
+    A (picklable) filterOp: does an input file -- or any DICOM file of an
+    input directory -- pass all of <l_predicate>?
+    '''
+
+    def __init__(self, l_predicate : list):
+        self.l_predicate    : list  = list(l_predicate)
+        self.l_tag          : list  = sorted({p.tag for p in self.l_predicate})
+        self.version        : str   = hashlib.sha256(('%s\0%s' % (
+                                        str_predicateVersion, self.l_predicate
+                                      )).encode()).hexdigest()[:16]
+
+    def file_pass(self, str_file : str) -> bool:
+        d_header    : dict  = dicom.header_read(str_file, self.l_tag)
+        return all(p(d_header) for p in self.l_predicate)
+
+    def __call__(self, str_object : str) -> bool | None:
+        '''
+        Does <str_object> pass? None (falsy) if it cannot be read, e.g. it
+        vanished since it was discovered.
+        '''
+        if not os.path.exists(str_object):
+            return None
+        try:
+            l_file  : list  = fingerprint.files_list(str_object)
+        except OSError:
+            return None
+        return any(self.file_pass(f) for f in l_file)
+
 class Filter:
     '''
     An abstraction for evaluating a "condition" on some "object".
@@ -24,7 +162,93 @@ class Filter:
     def __init__(self, *args, **kwargs):
         # point this to a function with signature
         # <filterOp>(<str_object> : str) : bool
-        self.filterOp = None
+        self.filterOp   : Callable | None   = None
+        self.workers    : int               = len(os.sched_getaffinity(0))
+        self.cache      : PredicateCache | None = None
+        for k, v in kwargs.items():
+            if k == 'filterOp'  : self.filterOp = v
+            if k == 'workers'   : self.workers  = max(1, int(v))
+            if k == 'cache'     : self.cache    = v
+
+        # str_object -> verdict, of objects already evaluated (not kept
+        # for the unconditionalPass, which costs nothing to re-evaluate)
+        self.d_verdict  : dict              = {}
+        self.b_memo     : bool              = self.filterOp is not unconditionalPass
+        self.lock       : threading.Lock    = threading.Lock()
+        self.d_stats    : dict              = {
+            'passed'    : 0,
+            'rejected'  : 0,
+            'unreadable': 0
+        }
+
+    def verdict(self, str_object : str, b_pass : bool | None) -> bool:
+        '''
+        Record the result <b_pass> for <str_object>, where None means that
+        the object could not be read (and does not pass)
+        '''
+        str_stat    : str   = 'unreadable' if b_pass is None else \
+                                ('passed' if b_pass else 'rejected')
+        with self.lock:
+            if self.b_memo: self.d_verdict[str_object] = bool(b_pass)
+            self.d_stats[str_stat] += 1
+        return bool(b_pass)
+
+    def cached(self, str_object : str) -> bool | None:
+        '''
+        The result for <str_object> from the PredicateCache (None on a miss)
+        '''
+        if not self.cache: return None
+        return self.cache.get(str_object, getattr(self.filterOp, 'version', ''))
+
+    def evaluated(self, str_object : str, b_pass : bool | None) -> bool:
+        if self.cache and b_pass is not None:
+            self.cache.put(str_object, getattr(self.filterOp, 'version', ''), b_pass)
+        return self.verdict(str_object, b_pass)
 
     def obj_pass(self, str_object: str) -> bool:
-        return self.filterOp(str_object)
\ No newline at end of file
+        with self.lock:
+            if str_object in self.d_verdict:
+                return self.d_verdict[str_object]
+        b_pass  : bool | None   = self.cached(str_object)
+        if b_pass is not None:
+            return self.verdict(str_object, b_pass)
+        return self.evaluated(str_object, self.filterOp(str_object))
+
+    def stats(self) -> dict:
+        with self.lock:
+            d_stats : dict  = dict(self.d_stats)
+        if self.cache: d_stats['cache'] = self.cache.stats()
+        return d_stats
+
+    def __call__(self, mapper : Iterable) -> Iterator[tuple]:
+        """
+        Yield the (<input>, <output>) pairs of <mapper> whose input passes,
+        lazily and in order; the filterOp runs in a process pool for the
+        inputs whose result is not cached.
+        """
+        window      : int   = 4 * self.workers
+        dq_pending  : deque = deque()
+
+        def resolved(item : tuple, future : Future) -> bool:
+            b_pass  : bool | None   = future.result()
+            if getattr(future, 'b_cached', False):
+                return self.verdict(str(item[0]), b_pass)
+            return self.evaluated(str(item[0]), b_pass)
+
+        with ProcessPoolExecutor(max_workers = self.workers,
+                                 mp_context  = fingerprint.mpContext) as pool:
+            for item in mapper:
+                b_pass  : bool | None   = self.cached(str(item[0]))
+                if b_pass is None:
+                    future  : Future    = pool.submit(self.filterOp, item[0])
+                else:
+                    future              = Future()
+                    future.b_cached     = True
+                    future.set_result(b_pass)
+                dq_pending.append((item, future))
+                while dq_pending and (len(dq_pending) >= window or dq_pending[0][1].done()):
+                    item, future        = dq_pending.popleft()
+                    if resolved(item, future): yield item
+            while dq_pending:
+                item, future            = dq_pending.popleft()
+                if resolved(item, future): yield item
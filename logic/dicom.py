@@ -0,0 +1,142 @@
+str_about = '''
+    A minimal, dependency free reader of DICOM file headers.
+
+    Only the data elements before the pixel data are parsed, directly
+    from a memory map of the file, so that reading a few identifying tags
+    (e.g. the study/series/SOP instance UIDs) touches only the first
+    pages of each file rather than loading whole images. Explicit and
+    implicit VR little endian transfer syntaxes are supported; anything
+    that cannot be parsed simply yields no tags.
+
+    This backs both the UID keys of --dedup and the header predicates of
+    logic.behavior.
+'''
+
+import  mmap
+import  struct
+
+# (group, element) of commonly used tags
+tag_TransferSyntaxUID   : tuple = (0x0002, 0x0010)
+tag_SOPInstanceUID      : tuple = (0x0008, 0x0018)
+tag_Modality            : tuple = (0x0008, 0x0060)
+tag_SeriesDescription   : tuple = (0x0008, 0x103E)
+tag_BodyPartExamined    : tuple = (0x0018, 0x0015)
+tag_StudyInstanceUID    : tuple = (0x0020, 0x000D)
+tag_SeriesInstanceUID   : tuple = (0x0020, 0x000E)
+tag_Rows                : tuple = (0x0028, 0x0010)
+tag_Columns             : tuple = (0x0028, 0x0011)
+tag_PixelData           : tuple = (0x7FE0, 0x0010)
+
+d_tagName   : dict  = {
+    'TransferSyntaxUID' : tag_TransferSyntaxUID,
+    'SOPInstanceUID'    : tag_SOPInstanceUID,
+    'Modality'          : tag_Modality,
+    'StudyInstanceUID'  : tag_StudyInstanceUID,
+    'SeriesInstanceUID' : tag_SeriesInstanceUID,
+    'SeriesDescription' : tag_SeriesDescription,
+    'BodyPartExamined'  : tag_BodyPartExamined,
+    'Rows'              : tag_Rows,
+    'Columns'           : tag_Columns
+}
+# tags with a binary (US, unsigned short) value, returned as decimal strings
+s_tagUS     : set   = {tag_Rows, tag_Columns}
+
+# VRs with a 2 byte reserved field and 4 byte length in explicit VR
+s_longVR    : set   = {b'OB', b'OD', b'OF', b'OL', b'OV', b'OW', b'SQ',
+                       b'SV', b'UC', b'UN', b'UR', b'UT', b'UV'}
+str_implicitLE  : str   = '1.2.840.10008.1.2'
+undefined   : int   = 0xFFFFFFFF
+
+class DICOMError(Exception):
+    '''
+    Raised when a header cannot be parsed
+    '''
+
+def element_read(buf, pos : int, b_explicit : bool) -> tuple:
+    """
+    Read the data element header at <pos>. Values of undefined length
+    (sequences) are skipped over entirely.
+
+    Returns:
+        tuple: ((group, element), <value start>, <value length>, <next pos>)
+    """
+    if pos + 8 > len(buf):
+        raise DICOMError('truncated element header')
+    group, element  = struct.unpack_from('<HH', buf, pos)
+    if group == 0xFFFE:
+        # item / delimitation tags never have a VR
+        length      = struct.unpack_from('<I', buf, pos + 4)[0]
+        start       = pos + 8
+    elif b_explicit or group == 0x0002:
+        vr          : bytes = bytes(buf[pos + 4:pos + 6])
+        if vr in s_longVR:
+            length  = struct.unpack_from('<I', buf, pos + 8)[0]
+            start   = pos + 12
+        else:
+            length  = struct.unpack_from('<H', buf, pos + 6)[0]
+            start   = pos + 8
+    else:
+        length      = struct.unpack_from('<I', buf, pos + 4)[0]
+        start       = pos + 8
+    if length == undefined:
+        tag_end : tuple = (0xFFFE, 0xE00D) if (group, element) == (0xFFFE, 0xE000) \
+                            else (0xFFFE, 0xE0DD)
+        return (group, element), start, 0, undefined_skip(buf, start, b_explicit, tag_end)
+    if start + length > len(buf):
+        raise DICOMError('truncated element (%04X,%04X)' % (group, element))
+    return (group, element), start, length, start + length
+
+def undefined_skip(buf, pos : int, b_explicit : bool, tag_end : tuple) -> int:
+    """
+    Skip the elements (or items) of an undefined length value starting at
+    <pos>, up to and including the delimitation item <tag_end>.
+
+    Returns:
+        int: the position after the value
+    """
+    while True:
+        tag, _, _, pos  = element_read(buf, pos, b_explicit)
+        if tag == tag_end:
+            return pos
+
+def header_read(str_file : str, l_tag : list) -> dict:
+    """
+    Read the values of the tags in <l_tag> ((group, element) tuples or
+    names in d_tagName) from the header of DICOM file <str_file>.
+
+    Returns:
+        dict: tag (as passed) -> value (str, stripped of padding; binary
+              US values such as Rows as decimal strings); tags
+              not present are omitted, and a non-DICOM or unparsable file
+              gives {}
+    """
+    d_want      : dict  = {d_tagName.get(t, t): t for t in l_tag}
+    last        : tuple = max(d_want) if d_want else (0, 0)
+    d_value     : dict  = {}
+    try:
+        with open(str_file, 'rb') as f, \
+             mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as buf:
+            if len(buf) < 132 or buf[128:132] != b'DICM':
+                return {}
+            pos         : int   = 132
+            b_explicit  : bool  = True
+            while pos < len(buf):
+                tag, start, length, next = element_read(buf, pos, b_explicit)
+                if tag > last or tag >= tag_PixelData:
+                    break
+                if tag in d_want or tag == tag_TransferSyntaxUID:
+                    if tag in s_tagUS and length >= 2:
+                        str_value   = str(struct.unpack_from('<H', buf, start)[0])
+                    else:
+                        str_value   = bytes(buf[start:start + length]).rstrip(b'\0 ').decode(
+                                        errors = 'replace'
+                                      )
+                    if tag == tag_TransferSyntaxUID:
+                        b_explicit  = str_value != str_implicitLE
+                    if tag in d_want:
+                        d_value[d_want[tag]]    = str_value
+                        if len(d_value) == len(d_want): break
+                pos             = next
+    except (OSError, ValueError, DICOMError, struct.error):
+        return d_value
+    return d_value
@@ -21,9 +21,10 @@ def get_requires(rel_path:str) -> list:
     l_packages:list     = []
     str_package:str     = ''
     with open (rel_path, 'r') as f:
-        str_package     = f.readline()
-        if not str_package.startswith("#") and len(str_package):
-            l_packages.append(str_package)
+        for str_package in f:
+            str_package = str_package.strip()
+            if not str_package.startswith("#") and len(str_package):
+                l_packages.append(str_package)
     return l_packages
 
 setup(
@@ -39,7 +40,9 @@ setup(
     license             = 'MIT',
     entry_points        = {
         'console_scripts': [
-            'dyworkflow = dyworkflow:main'
+            'dyworkflow = dyworkflow:main',
+            'dyworkflow-watch = control.watch:main',
+            'dyworkflow-merge = control.merge:main'
         ]
     },
     classifiers         = [
@@ -0,0 +1,298 @@
+str_about = '''
+    This module provides input fingerprints and the --incremental filter
+    built on them.
+
+    An input (a file, or with --inNode a directory of files) is keyed by
+    its path relative to the inputdir and fingerprinted either cheaply
+    from stat() data (size and mtime) or from a hash of its content,
+    computed in a process pool. Comparing these with the fingerprints
+    recorded in the manifest of a previous run, only inputs that are new
+    or have changed (or whose child failed) are passed on to the fan-out;
+    the records of the unchanged ones are carried over into this run's
+    manifest, as are those of children still pending in CUBE (scheduled
+    by a --noblock run whose statuses have not been watched to the end
+    yet), which are not grown a second time. The inputs of a chunked
+    child are compared one by one.
+
+    The same machinery backs --dedup: inputs are keyed by a name
+    independent fingerprint of their content (or of the DICOM SOP
+    instance UIDs they hold) and all but the first input with a given
+    key are dropped before fan-out.
+'''
+
+import  os
+import  hashlib
+import  multiprocessing
+from    collections             import deque
+from    concurrent.futures      import ProcessPoolExecutor, Executor
+from    pathlib                 import Path
+from    typing                  import Callable, Iterable, Iterator
+
+from    state                   import manifest
+from    logic                   import dicom
+
+# The start method of the worker processes of the pools here (and of the
+# --select filter): forking this multithreaded controller could copy a
+# lock held by another thread into the child, so a fork server is used.
+mpContext   = multiprocessing.get_context('forkserver')
+
+# CUBE plugin instance statuses of a child that is still running (or yet
+# to run); the child is in hand and is not grown again
+l_pendingStatus : list  = ['created', 'waiting', 'scheduled', 'started', 'registeringFiles']
+
+def files_list(path : Path) -> list:
+    '''
+    The files making up input <path>: itself, or those in a directory
+    (not recursing, as with the dir_mapper_deep leaf directories), sorted
+    '''
+    if not os.path.isdir(path):
+        return [str(path)]
+    with os.scandir(path) as it:
+        return sorted(e.path for e in it if e.is_file())
+
+def fingerprint_stat(path : Path) -> str:
+    """
+    A fingerprint of <path> from stat() data: the size and mtime of each
+    of its files.
+
+    Returns:
+        str: 'stat:<hex digest>', or '' if <path> cannot be read (e.g. it
+             vanished since it was discovered)
+    """
+    h   = hashlib.sha256()
+    try:
+        for str_file in files_list(path):
+            st  = os.stat(str_file)
+            h.update(('%s\0%d\0%d\n' % (os.path.basename(str_file),
+                                       st.st_size, st.st_mtime_ns)).encode())
+    except OSError:
+        return ''
+    return 'stat:' + h.hexdigest()
+
+def fingerprint_hash(path : Path) -> str:
+    """
+    A fingerprint of <path> from the content of each of its files (runs
+    in a worker process).
+
+    Returns:
+        str: 'sha256:<hex digest>', or '' if <path> cannot be read
+    """
+    h   = hashlib.sha256()
+    try:
+        for str_file in files_list(path):
+            h.update(os.path.basename(str_file).encode() + b'\0')
+            with open(str_file, 'rb') as f:
+                while chunk := f.read(1 << 20):
+                    h.update(chunk)
+            h.update(b'\n')
+    except OSError:
+        return ''
+    return 'sha256:' + h.hexdigest()
+
+def file_digest(str_file : str) -> str:
+    h   = hashlib.sha256()
+    with open(str_file, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+def fingerprint_content(path : Path) -> str:
+    """
+    A fingerprint of the set of file contents of <path>, independent of
+    file names (so that the same study copied under other names matches).
+
+    Returns:
+        str: 'content:<hex digest>', 'empty:<path>' for a directory without
+             files (so that no two empty inputs match), or '' if <path>
+             cannot be read
+    """
+    try:
+        l_file  : list  = files_list(path)
+        if not l_file:
+            return 'empty:' + str(path)
+        l_digest: list  = sorted(file_digest(f) for f in l_file)
+    except OSError:
+        return ''
+    return 'content:' + hashlib.sha256('\n'.join(l_digest).encode()).hexdigest()
+
+def fingerprint_uid(path : Path) -> str:
+    """
+    A fingerprint of the set of DICOM SOP instance UIDs in <path>, read
+    from the file headers only. Files without one (not DICOM) contribute
+    their content digest instead.
+
+    Returns:
+        str: 'uid:<hex digest>', 'empty:<path>' for a directory without
+             files, or '' if <path> cannot be read
+    """
+    l_key       : list  = []
+    try:
+        l_file  : list  = files_list(path)
+        if not l_file:
+            return 'empty:' + str(path)
+        for str_file in l_file:
+            str_uid     = dicom.header_read(str_file, ['SOPInstanceUID']).get('SOPInstanceUID', '')
+            l_key.append('sop:' + str_uid if str_uid else 'sha256:' + file_digest(str_file))
+    except OSError:
+        return ''
+    return 'uid:' + hashlib.sha256('\n'.join(sorted(l_key)).encode()).hexdigest()
+
+def map_windowed(executor : Executor, fn : Callable, it : Iterable,
+                 window : int) -> Iterator[tuple]:
+    """
+    Like executor.map(<fn>, <it>) -- in order -- but consuming <it> lazily,
+    with at most <window> calls outstanding.
+
+    Yields:
+        tuple: (<item>, <fn(item)>)
+    """
+    dq_pending  : deque = deque()
+    for item in it:
+        dq_pending.append((item, executor.submit(fn, item[0])))
+        if len(dq_pending) >= window:
+            item, future    = dq_pending.popleft()
+            yield item, future.result()
+    while dq_pending:
+        item, future        = dq_pending.popleft()
+        yield item, future.result()
+
+class Incremental:
+    '''
+    Filter (<input>, <output>) pairs down to those whose fingerprint
+    differs from the one in a previous run's manifest.
+    '''
+
+    def __init__(self, previous : manifest.Manifest, inputdir : Path, *args, **kwargs):
+        self.mode       : str           = 'stat'
+        self.workers    : int           = len(os.sched_getaffinity(0))
+        for k, v in kwargs.items():
+            if k == 'mode'      : self.mode     = v
+            if k == 'workers'   : self.workers  = max(1, int(v))
+
+        self.inputdir   : Path          = Path(inputdir)
+        self.inputdirPrev : Path        = Path(previous.d_meta.get('inputdir', inputdir))
+        self.d_previous : dict          = {}
+        for d in previous.children():
+            # a chunk of inputs is compared input by input
+            for str_input, str_fingerprint in d.get('inputs', {d['input']: d.get('fingerprint')}).items():
+                if not str_fingerprint: continue
+                d_input : dict          = dict(d, input = str_input, fingerprint = str_fingerprint)
+                if 'inputs' in d:
+                    d_input.pop('inputs')
+                    d_input['chunk']    = d['input']
+                self.d_previous[self.key(str_input, self.inputdirPrev)] = d_input
+        # str(input) -> fingerprint of all inputs seen in this run
+        self.d_fingerprint  : dict      = {}
+        self.l_carried  : list          = []
+        self.d_stats    : dict          = {
+            'new'       : 0,
+            'changed'   : 0,
+            'retried'   : 0,
+            'unchanged' : 0,
+            'pending'   : 0,
+            'unreadable': 0
+        }
+
+    @staticmethod
+    def key(str_input : str, inputdir : Path) -> str:
+        try:
+            return str(Path(str_input).relative_to(inputdir))
+        except ValueError:
+            return str(str_input)
+
+    def verdict(self, input : Path, str_fingerprint : str) -> bool:
+        '''
+        Record the <str_fingerprint> of <input>; is the input to be run?
+        An input without a fingerprint could not be read (it vanished
+        after discovery) and is skipped, as is an unchanged one whose
+        child is still pending.
+        '''
+        if not str_fingerprint:
+            self.d_stats['unreadable'] += 1
+            return False
+        self.d_fingerprint[str(input)]  = str_fingerprint
+        d_prev  : dict | None   = self.d_previous.get(self.key(str(input), self.inputdir))
+        if d_prev is None:
+            self.d_stats['new']        += 1
+            return True
+        if d_prev['fingerprint'] != str_fingerprint:
+            self.d_stats['changed']    += 1
+            return True
+        if d_prev.get('status') in l_pendingStatus:
+            self.d_stats['pending']    += 1
+            self.l_carried.append(dict(d_prev, input = str(input), carried = True))
+            return False
+        if d_prev.get('status') != 'finishedSuccessfully':
+            self.d_stats['retried']    += 1
+            return True
+        self.d_stats['unchanged']      += 1
+        self.l_carried.append(dict(d_prev, input = str(input), carried = True))
+        return False
+
+    def __call__(self, mapper : Iterable) -> Iterator[tuple]:
+        """
+        Yield only the new or changed pairs of <mapper>, lazily. With
+        'hash' fingerprints the hashing runs in a process pool.
+        """
+        if self.mode != 'hash':
+            for input, output in mapper:
+                if self.verdict(input, fingerprint_stat(input)):
+                    yield input, output
+            return
+        with ProcessPoolExecutor(max_workers = self.workers,
+                                 mp_context  = mpContext) as pool:
+            for (input, output), str_fingerprint in map_windowed(
+                        pool, fingerprint_hash, mapper, 4 * self.workers):
+                if self.verdict(input, str_fingerprint):
+                    yield input, output
+
+class Dedup:
+    '''
+    Drop (<input>, <output>) pairs whose content (or DICOM UID) key has
+    already been seen in this run, keeping the first in mapper order.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.mode       : str           = 'content'
+        self.workers    : int           = len(os.sched_getaffinity(0))
+        for k, v in kwargs.items():
+            if k == 'mode'      : self.mode     = v
+            if k == 'workers'   : self.workers  = max(1, int(v))
+
+        # key -> the input kept for it
+        self.d_kept     : dict          = {}
+        self.l_skipped  : list          = []
+        # inputs that could not be read (they vanished after discovery)
+        self.unreadable : int           = 0
+
+    def stats(self) -> dict:
+        return {
+            'mode'      : self.mode,
+            'unique'    : len(self.d_kept),
+            'duplicates': len(self.l_skipped),
+            'unreadable': self.unreadable,
+            'skipped'   : list(self.l_skipped)
+        }
+
+    def __call__(self, mapper : Iterable) -> Iterator[tuple]:
+        """
+        Yield the pairs of <mapper> whose key is new, lazily; the keys are
+        computed in a process pool. Inputs that cannot be read are skipped.
+        """
+        fn_key  : Callable  = fingerprint_uid if self.mode == 'uid' else fingerprint_content
+        with ProcessPoolExecutor(max_workers = self.workers,
+                                 mp_context  = mpContext) as pool:
+            for (input, output), str_key in map_windowed(
+                        pool, fn_key, mapper, 4 * self.workers):
+                if not str_key:
+                    self.unreadable    += 1
+                    continue
+                if str_key in self.d_kept:
+                    self.l_skipped.append({
+                        'input'         : str(input),
+                        'duplicateOf'   : self.d_kept[str_key],
+                        'key'           : str_key
+                    })
+                    continue
+                self.d_kept[str_key]    = str(input)
+                yield input, output
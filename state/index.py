@@ -0,0 +1,162 @@
+str_about = '''
+    This module provides a persistent index of the input tree: every
+    directory visited by discovery (with its mtime) and every file in it
+    (with its size, mtime and the include pattern it matched).
+
+    The index is stored compactly -- one blob of '\\0' separated relative
+    paths followed by flat int64 arrays -- so that a later run loads it
+    with a handful of reads. That run then only re-lists (and re-stats
+    the files of) directories whose mtime has changed, reusing the
+    indexed listing for all others, and reports the inputs added, removed
+    and changed since the index was written.
+'''
+
+import  json
+import  threading
+from    array                   import array
+from    pathlib                 import Path
+
+class InputIndex:
+    '''
+    An index of directory listings keyed by path relative to the inputdir.
+    '''
+
+    str_magic   : bytes = b'DYIX1\n'
+
+    def __init__(self, *args, **kwargs):
+        self.d_meta     : dict              = {}
+        for k, v in kwargs.items():
+            if k == 'meta'  : self.d_meta   = dict(v)
+
+        # directory -> mtime_ns
+        self.d_dir      : dict              = {}
+        # file -> (size, mtime_ns, pattern index or -1)
+        self.d_file     : dict              = {}
+        # directory -> ([subdir names], [file names]) (built on load)
+        self.d_listing  : dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+
+    def dir_record(self, str_relDir : str, mtime : int, l_entry : list,
+                   fn_pattern = None) -> None:
+        """
+        Record the listing <l_entry> -- (<name>, <path>, <isDir>, <size>,
+        <mtime_ns>) tuples -- of <str_relDir>, whose mtime is <mtime>.
+        <fn_pattern>(<relpath>) gives the index of the include pattern a
+        file matched (or -1).
+        """
+        with self.lock:
+            self.d_dir[str_relDir]  = int(mtime)
+            for str_name, _, b_dir, size, mtime_ns in l_entry:
+                str_rel : str   = str_relDir + '/' + str_name if str_relDir else str_name
+                if b_dir:
+                    # a placeholder until (or unless) the subdirectory is
+                    # itself visited, so that it stays in this listing
+                    self.d_dir.setdefault(str_rel, -1)
+                    continue
+                self.d_file[str_rel]    = (
+                    int(size), int(mtime_ns), fn_pattern(str_rel) if fn_pattern else -1
+                )
+
+    def listing_get(self, str_relDir : str, mtime : int, inputdir : Path) -> list | None:
+        """
+        The indexed listing of <str_relDir>, in the same form as recorded,
+        if the directory's current <mtime> is unchanged; else None.
+        """
+        if self.d_dir.get(str_relDir) != int(mtime):
+            return None
+        l_subdir, l_file    = self.d_listing.get(str_relDir, ([], []))
+        str_base    : str   = str(inputdir / str_relDir) if str_relDir else str(inputdir)
+        l_entry     : list  = [(n, '%s/%s' % (str_base, n), True, 0, 0) for n in l_subdir]
+        for str_name in l_file:
+            str_rel : str   = str_relDir + '/' + str_name if str_relDir else str_name
+            size, mtime_ns, _   = self.d_file[str_rel]
+            l_entry.append((str_name, '%s/%s' % (str_base, str_name), False, size, mtime_ns))
+        return sorted(l_entry)
+
+    def listings_build(self) -> None:
+        '''
+        Rebuild the per-directory listings from the flat tables
+        '''
+        self.d_listing  = {str_dir: ([], []) for str_dir in self.d_dir}
+        for str_dir in self.d_dir:
+            if not str_dir: continue
+            str_parent, _, str_name = str_dir.rpartition('/')
+            if str_parent in self.d_listing:
+                self.d_listing[str_parent][0].append(str_name)
+        for str_file in self.d_file:
+            str_parent, _, str_name = str_file.rpartition('/')
+            if str_parent in self.d_listing:
+                self.d_listing[str_parent][1].append(str_name)
+
+    def diff(self, previous : 'InputIndex', b_matchedOnly : bool = True) -> dict:
+        """
+        Compare the files in this index with those of <previous>.
+
+        Returns:
+            dict: lists of 'added', 'removed' and 'changed' relative paths
+        """
+        def files(index : InputIndex) -> dict:
+            return {k: v for k, v in index.d_file.items()
+                        if not b_matchedOnly or v[2] >= 0}
+        d_new   : dict  = files(self)
+        d_old   : dict  = files(previous)
+        return {
+            'added'     : sorted(set(d_new) - set(d_old)),
+            'removed'   : sorted(set(d_old) - set(d_new)),
+            'changed'   : sorted(k for k in set(d_new) & set(d_old)
+                                    if d_new[k][:2] != d_old[k][:2])
+        }
+
+    def save(self, path : Path) -> Path:
+        '''
+        Write the index to <path> (atomically, via a rename)
+        '''
+        path                    = Path(path)
+        with self.lock:
+            l_dir   : list      = list(self.d_dir)
+            l_file  : list      = list(self.d_file)
+            a_dir   : array     = array('q', (self.d_dir[k] for k in l_dir))
+            a_file  : array     = array('q')
+            for k in l_file: a_file.extend(self.d_file[k])
+        blob        : bytes     = '\0'.join(l_dir + l_file).encode('utf-8', 'surrogateescape')
+        d_header    : dict      = dict(self.d_meta, dirs = len(l_dir),
+                                       files = len(l_file), blob = len(blob))
+        pathTmp     : Path      = path.with_name(path.name + '.tmp')
+        with open(pathTmp, 'wb') as f:
+            f.write(self.str_magic)
+            f.write(json.dumps(d_header).encode() + b'\n')
+            f.write(blob)
+            a_dir.tofile(f)
+            a_file.tofile(f)
+        pathTmp.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path : Path) -> 'InputIndex | None':
+        """
+        Read an index written by save(); None if missing or unreadable.
+        """
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(cls.str_magic)) != cls.str_magic:
+                    return None
+                d_header    : dict  = json.loads(f.readline())
+                blob        : bytes = f.read(d_header['blob'])
+                a_dir       : array = array('q')
+                a_file      : array = array('q')
+                a_dir.fromfile(f, d_header['dirs'])
+                a_file.fromfile(f, 3 * d_header['files'])
+        except (OSError, ValueError, EOFError, KeyError):
+            return None
+        l_path      : list          = blob.decode('utf-8', 'surrogateescape').split('\0') \
+                                        if d_header['dirs'] + d_header['files'] else []
+        ndirs       : int           = d_header.pop('dirs')
+        d_header.pop('files'); d_header.pop('blob')
+        index       : InputIndex    = cls(meta = d_header)
+        index.d_dir                 = dict(zip(l_path[:ndirs], a_dir))
+        index.d_file                = {
+            str_file: tuple(a_file[3 * i:3 * i + 3])
+            for i, str_file in enumerate(l_path[ndirs:])
+        }
+        index.listings_build()
+        return index
@@ -0,0 +1,148 @@
+str_about = '''
+    This module provides the child journal: an append-only JSON-lines
+    file in the outputdir recording, per input, the stage transitions of
+    its child -- "created" (with the branchInstanceID), "scheduled" (with
+    the workflow ID) and "finished" (with the final status).
+
+    Every record is flushed (and fsync'd) as it is written, so after the
+    controller dies the journal tells a rerun which stage each input had
+    reached; the rerun then resumes from there rather than creating
+    duplicate children and workflows.
+'''
+
+import  os
+import  json
+import  threading
+from    pathlib                 import Path
+from    datetime                import datetime, timezone
+from    typing                  import TextIO
+
+class Journal:
+    '''
+    A thread-safe, append-only journal of child stage transitions.
+    '''
+
+    l_stage     : list  = ['created', 'scheduled', 'finished']
+
+    def __init__(self, *args, **kwargs):
+        self.fsync      : bool              = True
+        for k, v in kwargs.items():
+            if k == 'fsync' : self.fsync    = bool(v)
+
+        self.path       : Path | None       = None
+        self.f          : TextIO | None     = None
+        # input -> merged state of all records for that input
+        self.d_state    : dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+
+    def replay(self, path : Path) -> int:
+        """
+        Rebuild the per-input state from the journal at <path>. A torn
+        last line (from a crash mid-write) is ignored.
+
+        Returns:
+            int: the number of records replayed
+        """
+        records : int   = 0
+        with open(path) as f:
+            for str_line in f:
+                if not str_line.endswith('\n'):
+                    break
+                try:
+                    d_record    : dict  = json.loads(str_line)
+                except ValueError:
+                    continue
+                self.d_state.setdefault(d_record['input'], {}).update(d_record)
+                records        += 1
+        return records
+
+    def open(self, path : Path, resume : bool = True) -> int:
+        """
+        Open the journal at <path> for appending. If <resume>, any existing
+        records are replayed first; otherwise the journal is truncated.
+
+        Returns:
+            int: the number of records replayed
+        """
+        records : int   = 0
+        with self.lock:
+            self.path       = Path(path)
+            self.d_state    = {}
+            if resume and self.path.exists():
+                records     = self.replay(self.path)
+                self.tail_trim(self.path)
+            self.f          = open(self.path, 'a' if resume else 'w')
+        return records
+
+    @staticmethod
+    def tail_trim(path : Path) -> None:
+        '''
+        Cut a torn last line off the journal at <path>, so that the records
+        appended next do not run on from it
+        '''
+        with open(path, 'rb+') as f:
+            end     : int   = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start       = max(0, end - 4096)
+                f.seek(start)
+                i   : int   = f.read(end - start).rfind(b'\n')
+                if i >= 0:
+                    f.truncate(start + i + 1)
+                    return
+                end         = start
+            f.truncate(0)
+
+    def record(self, str_input : str, str_stage : str, **kwargs) -> dict:
+        """
+        Append a <str_stage> transition for <str_input>, with any extra
+        fields in <kwargs>, and merge it into the state of that input.
+
+        Returns:
+            dict: the record written
+        """
+        d_record    : dict  = dict(
+                                kwargs,
+                                input   = str(str_input),
+                                stage   = str_stage,
+                                time    = datetime.now(timezone.utc).astimezone().isoformat()
+                            )
+        str_line    : str   = json.dumps(d_record, default = str) + '\n'
+        with self.lock:
+            self.d_state.setdefault(d_record['input'], {}).update(d_record)
+            if self.f:
+                self.f.write(str_line)
+                self.f.flush()
+                if self.fsync: os.fsync(self.f.fileno())
+        return d_record
+
+    def state(self, str_input : str) -> dict:
+        '''
+        The merged journal state of <str_input> ({} if never seen)
+        '''
+        with self.lock:
+            return dict(self.d_state.get(str(str_input), {}))
+
+    def stage_reached(self, str_input : str, str_stage : str) -> bool:
+        '''
+        Has <str_input> reached (at least) <str_stage>?
+        '''
+        str_last    : str   = self.state(str_input).get('stage', '')
+        if str_last not in self.l_stage:
+            return False
+        return self.l_stage.index(str_last) >= self.l_stage.index(str_stage)
+
+    def counts(self) -> dict:
+        '''
+        The number of inputs whose last recorded stage is each stage
+        '''
+        d_count : dict  = {}
+        with self.lock:
+            for d_state in self.d_state.values():
+                d_count[d_state['stage']]   = d_count.get(d_state['stage'], 0) + 1
+        return d_count
+
+    def close(self) -> None:
+        with self.lock:
+            if self.f:
+                self.f.close()
+                self.f  = None
@@ -0,0 +1,295 @@
+str_about = '''
+    This module provides a work queue of lease files in a shared
+    directory, through which any number of cooperating dyworkflow
+    controllers (on any nodes that mount the directory) pull inputs, so
+    that the work balances itself however much the inputs vary in cost.
+
+    An item is published exactly once (whoever creates published/<id>
+    first), then moves between three subdirectories, always by an atomic
+    rename, so that exactly one controller wins every transition:
+
+        todo/<rank>-<id>.json       published, unclaimed; claimed in
+                                    <rank> (publication) order
+        leased/<id>@<owner>.json    claimed by <owner>, who keeps the
+                                    lease alive by touching its mtime
+        done/<id>.json              completed, with the child's record
+
+    A lease whose mtime is older than the time-to-live is expired (its
+    owner died) and may be stolen by renaming it to a new owner; the old
+    owner finds out when it next renews or completes the lease, both of
+    which fail once the lease file is gone. Every claim counts as an
+    attempt on the item, and an item claimed more than <maxAttempts>
+    times (one that keeps failing, or killing its controllers) is
+    completed as failed rather than handed out again. The queue is
+    drained once it is closed (all inputs published), and no item is
+    left to do or leased.
+'''
+
+import  os
+import  json
+import  time
+import  uuid
+import  socket
+import  hashlib
+import  threading
+from    pathlib                 import Path
+
+class LeaseQueue:
+    '''
+    One controller's handle on a shared lease queue directory.
+    '''
+
+    def __init__(self, queuedir : Path, *args, **kwargs):
+        self.ttl        : float             = 300.0
+        self.maxAttempts: int               = 3
+        self.owner      : str               = '%s-%d-%s' % (
+                                                socket.gethostname(), os.getpid(),
+                                                uuid.uuid4().hex[:6]
+                                            )
+        for k, v in kwargs.items():
+            if k == 'ttl'           : self.ttl          = float(v)
+            if k == 'maxAttempts'   : self.maxAttempts  = max(1, int(v))
+            if k == 'owner'         : self.owner        = str(v)
+
+        self.queuedir   : Path              = Path(queuedir)
+        for str_dir in ['published', 'todo', 'leased', 'done']:
+            (self.queuedir / str_dir).mkdir(parents = True, exist_ok = True)
+        # lease path -> item, of the leases held by this controller
+        self.d_held     : dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+        self.evStop     : threading.Event   = threading.Event()
+        self.heartbeater: threading.Thread | None = None
+        self.d_stats    : dict              = {
+            'published' : 0,
+            'claimed'   : 0,
+            'reclaimed' : 0,
+            'completed' : 0,
+            'lost'      : 0,
+            'released'  : 0,
+            'exhausted' : 0,
+            'heartbeats': 0
+        }
+
+    @staticmethod
+    def item_id(str_key : str) -> str:
+        return hashlib.sha1(str_key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def stat_add(self, key : str, n : int = 1) -> None:
+        with self.lock:
+            self.d_stats[key]  += n
+
+    def json_write(self, path : Path, d : dict) -> None:
+        pathTmp : Path  = path.with_name('.%s.%s.tmp' % (path.name, self.owner))
+        with open(pathTmp, 'w') as f:
+            json.dump(d, f, default = str)
+        pathTmp.replace(path)
+
+    def completing(self, str_id : str) -> Path:
+        '''
+        Where a lease is moved (out of sight of claim()) while it completes
+        '''
+        return self.queuedir / 'leased' / ('.%s@%s.completing' % (str_id, self.owner))
+
+    def leases(self, str_id : str = '') -> list:
+        return [p for p in (self.queuedir / 'leased').iterdir()
+                    if p.name.endswith('.json') and (not str_id or p.name.startswith(str_id + '@'))]
+
+    @staticmethod
+    def todo_name(str_id : str, rank : int) -> str:
+        return '%012d-%s.json' % (rank, str_id)
+
+    def publish(self, str_key : str, d_item : dict, rank : int = 0) -> bool:
+        """
+        Publish the item <d_item>, identified by <str_key> (e.g. the input
+        path relative to the inputdir), unless it is already in the queue
+        in any state -- so that several controllers can publish the same
+        inputs. Items are claimed in order of <rank>.
+
+        Returns:
+            bool: was the item newly published?
+        """
+        str_id  : str   = self.item_id(str_key)
+        try:
+            # the exclusive create is the atomic test-and-set of the item
+            os.close(os.open(self.queuedir / 'published' / str_id,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        self.json_write(self.queuedir / 'todo' / self.todo_name(str_id, rank),
+                        dict(d_item, id = str_id, rank = rank))
+        self.stat_add('published')
+        return True
+
+    def close(self) -> None:
+        '''
+        Mark the queue as closed: all inputs have been published
+        '''
+        (self.queuedir / 'closed').touch()
+
+    def lease_take(self, pathFrom : Path, str_id : str) -> dict | None:
+        pathLease   : Path  = self.queuedir / 'leased' / ('%s@%s.json' % (str_id, self.owner))
+        try:
+            os.rename(pathFrom, pathLease)
+            # a todo file keeps its (old) mtime through the rename, so
+            # until it is touched it can be stolen as an expired lease
+            os.utime(pathLease)
+            with open(pathLease) as f:
+                d_item  : dict  = json.load(f)
+        except FileNotFoundError:
+            # another controller won this one
+            return None
+        d_item['attempts']  = d_item.get('attempts', 0) + 1
+        self.json_write(pathLease, d_item)
+        d_item['lease']     = str(pathLease)
+        with self.lock:
+            self.d_held[str(pathLease)] = d_item
+        self.heartbeat_start()
+        return d_item
+
+    def claim(self) -> dict | None:
+        """
+        Claim the next item to do or, if there is none, steal an expired
+        lease. Items beyond their <maxAttempts> are completed as failed on
+        the way.
+
+        Returns:
+            dict | None: the item (with its 'lease' path and 'attempts'
+                         count), or None if there is nothing to claim
+                         right now
+        """
+        for pathTodo in sorted((self.queuedir / 'todo').glob('*.json')):
+            d_item  = self.lease_take(pathTodo, pathTodo.stem.split('-')[-1])
+            if d_item is not None and not self.exhausted(d_item):
+                self.stat_add('claimed')
+                return d_item
+        now     : float = time.time()
+        for pathLease in self.leases():
+            try:
+                if now - pathLease.stat().st_mtime < self.ttl: continue
+            except FileNotFoundError:
+                continue
+            d_item  = self.lease_take(pathLease, pathLease.name.split('@')[0])
+            if d_item is not None and not self.exhausted(d_item):
+                self.stat_add('reclaimed')
+                return d_item
+        return None
+
+    def exhausted(self, d_item : dict) -> bool:
+        '''
+        Complete the just claimed <d_item> as failed if it has used up its
+        attempts; was it?
+        '''
+        if d_item['attempts'] <= self.maxAttempts:
+            return False
+        self.complete(d_item, {
+            'input'     : d_item.get('input', ''),
+            'status'    : 'failed',
+            'error'     : d_item.get('error', 'claimed %d times' % (d_item['attempts'] - 1)),
+            'attempts'  : d_item['attempts'] - 1
+        })
+        self.stat_add('exhausted')
+        return True
+
+    def isDrained(self) -> bool:
+        return (self.queuedir / 'closed').exists() and \
+               not any((self.queuedir / 'todo').glob('*.json')) and not self.leases() and \
+               not any((self.queuedir / 'leased').glob('*.completing'))
+
+    def heartbeat(self, str_lease : str) -> bool:
+        '''
+        Renew the lease <str_lease>; False if it has been lost
+        '''
+        try:
+            os.utime(str_lease)
+        except FileNotFoundError:
+            with self.lock:
+                if self.d_held.pop(str_lease, None) is not None:
+                    self.d_stats['lost']   += 1
+            return False
+        self.stat_add('heartbeats')
+        return True
+
+    def heartbeat_start(self) -> None:
+        '''
+        Start the thread renewing all held leases, every third of the ttl
+        '''
+        with self.lock:
+            if self.heartbeater: return
+            self.heartbeater    = threading.Thread(
+                                    target  = self.heartbeat_loop,
+                                    name    = 'LeaseHeartbeat',
+                                    daemon  = True
+                                )
+        self.heartbeater.start()
+
+    def heartbeat_loop(self) -> None:
+        while not self.evStop.wait(self.ttl / 3):
+            with self.lock:
+                l_lease : list  = list(self.d_held)
+            for str_lease in l_lease:
+                self.heartbeat(str_lease)
+
+    def complete(self, d_item : dict, d_record : dict) -> bool:
+        """
+        Complete the leased <d_item>, recording <d_record> (the child's
+        manifest record) in done/, and release the lease -- unless the
+        lease has been lost (it expired and was stolen), in which case
+        the item is left to its new owner.
+
+        Returns:
+            bool: was the item completed by this controller?
+        """
+        str_lease   : str   = d_item['lease']
+        pathCompleting      = self.completing(d_item['id'])
+        with self.lock:
+            b_held  : bool  = self.d_held.pop(str_lease, None) is not None
+        try:
+            # the atomic test that the lease is still ours
+            os.rename(str_lease, pathCompleting)
+        except FileNotFoundError:
+            if b_held: self.stat_add('lost')
+            return False
+        self.json_write(self.queuedir / 'done' / (d_item['id'] + '.json'),
+                        dict(d_record, owner = self.owner))
+        os.unlink(pathCompleting)
+        self.stat_add('completed')
+        return True
+
+    def release(self, d_item : dict, str_error : str = '') -> None:
+        '''
+        Give the leased <d_item> back to the queue, to be claimed again;
+        <str_error> (why it failed) is kept with the item
+        '''
+        with self.lock:
+            self.d_held.pop(d_item['lease'], None)
+        if str_error:
+            try:
+                with open(d_item['lease']) as f:
+                    d_stored    : dict  = json.load(f)
+                self.json_write(Path(d_item['lease']), dict(d_stored, error = str_error))
+            except FileNotFoundError:
+                return
+        try:
+            os.rename(d_item['lease'], self.queuedir / 'todo' /
+                      self.todo_name(d_item['id'], d_item.get('rank', 0)))
+        except FileNotFoundError:
+            return
+        self.stat_add('released')
+
+    def records(self) -> list:
+        '''
+        The records of all completed items, by any controller
+        '''
+        l_record    : list  = []
+        for pathDone in sorted((self.queuedir / 'done').glob('*.json')):
+            with open(pathDone) as f:
+                l_record.append(json.load(f))
+        return l_record
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.d_stats, owner = self.owner, held = len(self.d_held))
+
+    def stop(self) -> None:
+        self.evStop.set()
+        if self.heartbeater: self.heartbeater.join()
@@ -0,0 +1,117 @@
+str_about = '''
+    This module provides the run manifest: a JSON record of every child
+    created by a run -- the input it was created from, its plugin
+    instance ID, the workflow scheduled on it and the plugin instance ID
+    of the node that is (or would be) blocked on.
+
+    In --noblock mode the manifest is the hand-off to the separate
+    "dyworkflow-watch" command, which reads it to track completion later.
+
+    The manifests of the controllers that each ran one --shard of a parent
+    are combined into one with merge() (the "dyworkflow-merge" command).
+'''
+
+import  json
+import  threading
+from    pathlib                 import Path
+from    datetime                import datetime, timezone
+
+class Manifest:
+    '''
+    A thread-safe collection of per-child records, with JSON load/save.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.d_meta     : dict              = {}
+        self.l_child    : list              = []
+        self.lock       : threading.Lock    = threading.Lock()
+        for k, v in kwargs.items():
+            if k == 'meta'      : self.d_meta   = dict(v)
+
+    def add(self, **kwargs) -> dict:
+        """
+        Add one child record built from <kwargs>, conventionally:
+
+            input, branchInstanceID, workflowID, blockNodeID, blockNodeTitle,
+            feedID, status
+
+        Returns:
+            dict: the record added
+        """
+        d_child : dict  = dict(kwargs)
+        with self.lock:
+            self.l_child.append(d_child)
+        return d_child
+
+    def children(self) -> list:
+        with self.lock:
+            return list(self.l_child)
+
+    def asdict(self) -> dict:
+        with self.lock:
+            return {
+                'meta'      : self.d_meta,
+                'children'  : list(self.l_child)
+            }
+
+    def save(self, path : Path) -> Path:
+        '''
+        Write the manifest as JSON to <path> (atomically, via a rename)
+        '''
+        path                    = Path(path)
+        d_manifest  : dict      = self.asdict()
+        d_manifest['meta']['saved'] = datetime.now(timezone.utc).astimezone().isoformat()
+        pathTmp     : Path      = path.with_name(path.name + '.tmp')
+        with open(pathTmp, 'w') as f:
+            json.dump(d_manifest, f, indent = 4, default = str)
+        pathTmp.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path : Path) -> 'Manifest':
+        with open(path) as f:
+            d_manifest  : dict  = json.load(f)
+        manifest    : Manifest  = cls(meta = d_manifest.get('meta', {}))
+        manifest.l_child        = d_manifest.get('children', [])
+        return manifest
+
+    @classmethod
+    def merge(cls, l_manifest : list) -> 'Manifest':
+        """
+        Combine the manifests of the shards of one run. The shards must
+        agree on their count and be distinct; the merged meta lists the
+        shards present and missing, and any input recorded by more than
+        one shard.
+
+        Returns:
+            Manifest: the merged manifest
+        """
+        d_shard     : dict      = {}
+        for m in l_manifest:
+            str_shard   : str   = m.d_meta.get('shard', '') or '0/1'
+            if str_shard in d_shard:
+                raise ValueError("shard %s given more than once" % str_shard)
+            d_shard[str_shard]  = m
+        s_count     : set       = {s.split('/')[1] for s in d_shard}
+        if len(s_count) > 1:
+            raise ValueError("shards of different counts: %s" % sorted(d_shard))
+        count       : int       = int(s_count.pop()) if s_count else 0
+        merged      : Manifest  = cls(meta = dict(l_manifest[0].d_meta) if l_manifest else {})
+        d_seen      : dict      = {}
+        l_duplicate : list      = []
+        for str_shard in sorted(d_shard, key = lambda s: int(s.split('/')[0])):
+            for d_child in d_shard[str_shard].children():
+                if d_child.get('input') in d_seen:
+                    l_duplicate.append(d_child.get('input'))
+                    continue
+                d_seen[d_child.get('input')]    = str_shard
+                merged.l_child.append(dict(d_child, shard = str_shard))
+        merged.d_meta.pop('saved', None)
+        merged.d_meta.update({
+            'shard'     : '',
+            'shards'    : sorted(d_shard, key = lambda s: int(s.split('/')[0])),
+            'missing'   : ['%d/%d' % (i, count) for i in range(count)
+                                if '%d/%d' % (i, count) not in d_shard],
+            'duplicates': l_duplicate
+        })
+        return merged
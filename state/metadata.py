@@ -0,0 +1,115 @@
+str_about = '''
+    This module provides a process-wide cache of (mostly static) CUBE
+    metadata -- pipelines, their default parameters, and plugin lookups.
+
+    Every child in a run needs the same metadata, so rather than having
+    each worker re-query CUBE, the first worker to ask for an entry fills
+    it and all others reuse that result. Entries are keyed by a tuple that
+    always starts with the CUBE url, can optionally expire after a TTL,
+    and can be explicitly invalidated.
+'''
+
+import  threading
+import  time
+from    typing                  import Any, Callable
+
+class MetadataCache:
+    '''
+    A thread-safe, keyed cache with optional time-to-live. Concurrent
+    requests for the same missing key block on a per-key lock so that
+    the (expensive) fetch is only ever done once.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.ttl        : float             = 0.0
+        for k, v in kwargs.items():
+            if k == 'ttl'   : self.ttl      = float(v)
+
+        self.d_entry    : dict              = {}
+        self.d_keyLock  : dict              = {}
+        self.lock       : threading.Lock    = threading.Lock()
+        self.d_stats    : dict              = {
+            'hits'      : 0,
+            'misses'    : 0,
+            'expired'   : 0
+        }
+
+    def ttl_set(self, ttl : float) -> float:
+        '''
+        Set the time-to-live (in seconds) of entries. A <ttl> of 0 means
+        entries never expire.
+        '''
+        self.ttl    = float(ttl)
+        return self.ttl
+
+    def entry_isValid(self, key : tuple) -> bool:
+        '''
+        Is there a current (non-expired) entry for <key>? Must be called
+        with self.lock held.
+        '''
+        if key not in self.d_entry:
+            return False
+        if self.ttl and time.monotonic() - self.d_entry[key]['time'] > self.ttl:
+            del self.d_entry[key]
+            self.d_stats['expired'] += 1
+            return False
+        return True
+
+    def get(self, key : tuple, fetch : Callable[[], Any]) -> Any:
+        """
+        Return the cached value for <key>, calling <fetch> to fill the
+        entry if it is missing or expired.
+
+        Args:
+            key (tuple):        cache key, conventionally (<CUBEurl>, <kind>, <name>)
+            fetch (Callable):   a no-argument callable that returns the value
+
+        Returns:
+            Any: the (possibly cached) value
+        """
+        with self.lock:
+            if self.entry_isValid(key):
+                self.d_stats['hits']   += 1
+                return self.d_entry[key]['value']
+            keyLock : threading.Lock    = self.d_keyLock.setdefault(
+                                            key, threading.Lock()
+                                        )
+        with keyLock:
+            with self.lock:
+                # another thread might have filled this while we waited
+                if self.entry_isValid(key):
+                    self.d_stats['hits']   += 1
+                    return self.d_entry[key]['value']
+                self.d_stats['misses']     += 1
+            value   : Any   = fetch()
+            with self.lock:
+                self.d_entry[key]   = {
+                    'value'     : value,
+                    'time'      : time.monotonic()
+                }
+        return value
+
+    def invalidate(self, *keyPrefix) -> int:
+        """
+        Drop all entries whose key starts with <keyPrefix>. With no
+        prefix, the whole cache is cleared.
+
+        Returns:
+            int: the number of entries dropped
+        """
+        with self.lock:
+            l_drop  : list  = [key for key in self.d_entry
+                                if key[:len(keyPrefix)] == keyPrefix]
+            for key in l_drop:
+                del self.d_entry[key]
+        return len(l_drop)
+
+    def stats(self) -> dict:
+        '''
+        Return a copy of the hit/miss counters
+        '''
+        with self.lock:
+            return dict(self.d_stats, entries = len(self.d_entry))
+
+# The process-wide cache, shared by all workers
+cache   : MetadataCache = MetadataCache()
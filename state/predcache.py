@@ -0,0 +1,170 @@
+str_about = '''
+    This module provides a persistent cache of filter predicate results
+    (see logic.behavior), so that a run over an already seen parent does
+    not read the headers of its inputs again.
+
+    A result is keyed by the identity of the input -- its path, size and
+    mtime (for a directory, the total size and latest mtime of its files)
+    -- and the version of the predicates that produced it, so that both a
+    changed input and a changed --select spec miss. The cache is a small
+    sqlite database, bounded in size on disk: when it grows beyond that,
+    the least recently used results are evicted.
+'''
+
+import  os
+import  sqlite3
+import  threading
+from    pathlib                 import Path
+
+def identity(str_path : str) -> tuple[int, int]:
+    """
+    The (size, mtime_ns) identity of <str_path>: of the file itself or,
+    for a directory, the total size and latest mtime of its files. Only
+    stat() is used; no file is opened.
+
+    Returns:
+        tuple[int, int]: (size, mtime_ns), or (-1, -1) if it cannot be stat'd
+    """
+    try:
+        st  = os.stat(str_path)
+        if not os.path.isdir(str_path):
+            return st.st_size, st.st_mtime_ns
+        size    : int   = 0
+        mtime   : int   = st.st_mtime_ns
+        with os.scandir(str_path) as it:
+            for e in it:
+                if not e.is_file(): continue
+                st      = e.stat()
+                size   += st.st_size
+                mtime   = max(mtime, st.st_mtime_ns)
+        return size, mtime
+    except OSError:
+        return -1, -1
+
+class PredicateCache:
+    '''
+    A thread-safe, size bounded, LRU cache of boolean predicate results.
+    Writes (and recency updates) are batched and committed every
+    <batch> changes and on close().
+    '''
+
+    def __init__(self, path : Path, *args, **kwargs):
+        self.maxBytes   : int               = 64 << 20
+        self.batch      : int               = 256
+        for k, v in kwargs.items():
+            if k == 'maxBytes'  : self.maxBytes = int(v)
+            if k == 'batch'     : self.batch    = max(1, int(v))
+
+        self.path       : Path              = Path(path)
+        self.lock       : threading.Lock    = threading.Lock()
+        self.db         : sqlite3.Connection = sqlite3.connect(
+                                                str(self.path),
+                                                check_same_thread = False
+                                            )
+        # must precede table creation to take effect; lets evictions
+        # actually shrink the file
+        self.db.execute('PRAGMA auto_vacuum = FULL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS verdict (
+                path    TEXT    NOT NULL,
+                size    INTEGER NOT NULL,
+                mtime   INTEGER NOT NULL,
+                version TEXT    NOT NULL,
+                pass    INTEGER NOT NULL,
+                used    INTEGER NOT NULL,
+                PRIMARY KEY (path, version)
+            )''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS verdict_used ON verdict (used)')
+        self.db.commit()
+        # a logical clock of use, continued from the last run
+        self.clock      : int               = self.db.execute(
+                                                'SELECT COALESCE(MAX(used), 0) FROM verdict'
+                                            ).fetchone()[0]
+        self.pending    : int               = 0
+        self.d_stats    : dict              = {
+            'hits'      : 0,
+            'misses'    : 0,
+            'stale'     : 0,
+            'evicted'   : 0
+        }
+
+    def tick(self) -> int:
+        self.clock     += 1
+        self.pending   += 1
+        return self.clock
+
+    def get(self, str_path : str, version : str) -> bool | None:
+        """
+        The cached result for <str_path> under predicates <version>, if the
+        input is unchanged since it was cached.
+
+        Returns:
+            bool | None: the result, or None on a miss
+        """
+        size, mtime     = identity(str_path)
+        with self.lock:
+            row         = self.db.execute(
+                            'SELECT size, mtime, pass FROM verdict WHERE path = ? AND version = ?',
+                            (str_path, version)
+                          ).fetchone()
+            if row is None or (row[0], row[1]) != (size, mtime):
+                self.d_stats['misses'] += 1
+                if row is not None: self.d_stats['stale'] += 1
+                return None
+            self.d_stats['hits']   += 1
+            self.db.execute(
+                'UPDATE verdict SET used = ? WHERE path = ? AND version = ?',
+                (self.tick(), str_path, version)
+            )
+            self.commit_ifDue()
+            return bool(row[2])
+
+    def put(self, str_path : str, version : str, b_pass : bool) -> None:
+        size, mtime     = identity(str_path)
+        if size < 0: return
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO verdict VALUES (?, ?, ?, ?, ?, ?)',
+                (str_path, size, mtime, version, int(b_pass), self.tick())
+            )
+            self.commit_ifDue()
+
+    def bytes(self) -> int:
+        page_count  : int   = self.db.execute('PRAGMA page_count').fetchone()[0]
+        page_size   : int   = self.db.execute('PRAGMA page_size').fetchone()[0]
+        return page_count * page_size
+
+    def commit_ifDue(self, b_force : bool = False) -> None:
+        '''
+        Commit the pending changes (if enough, or <b_force>), then evict
+        the least recently used tenth of the results while over maxBytes.
+        Must be called with self.lock held.
+        '''
+        if not self.pending or (self.pending < self.batch and not b_force):
+            return
+        self.db.commit()
+        self.pending    = 0
+        while self.bytes() > self.maxBytes:
+            rows    : int   = self.db.execute('SELECT COUNT(*) FROM verdict').fetchone()[0]
+            if not rows: break
+            cursor          = self.db.execute(
+                                'DELETE FROM verdict WHERE used <= '
+                                '(SELECT used FROM verdict ORDER BY used LIMIT 1 OFFSET ?)',
+                                (max(0, rows // 10 - 1),)
+                              )
+            self.d_stats['evicted'] += cursor.rowcount
+            self.db.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups : int   = self.d_stats['hits'] + self.d_stats['misses']
+            return dict(self.d_stats,
+                hitRate = round(self.d_stats['hits'] / lookups, 4) if lookups else 0.0,
+                entries = self.db.execute('SELECT COUNT(*) FROM verdict').fetchone()[0],
+                bytes   = self.bytes()
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            self.commit_ifDue(b_force = True)
+            self.db.close()
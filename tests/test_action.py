@@ -0,0 +1,96 @@
+import pytest
+
+import dyworkflow
+from control import action
+
+
+@pytest.fixture
+def pluginRun(mocker):
+    """
+    A PluginRun on a fake CUBE client whose plugin lookup succeeds, with
+    the CLI path stubbed out.
+    """
+    cl = mocker.MagicMock()
+    cl.get_plugins.return_value = {'data': [{'id': 5, 'name': 'pl-shexec'}]}
+    cl.get_plugin_parameters.return_value = {'data': [{'flag': '--exec', 'name': 'exec'}]}
+    cl.create_plugin_instance.return_value = {'id': 42}
+    mocker.patch.object(action, 'CUBEclient_get', return_value=cl)
+    mocker.patch.object(action.PluginRun, 'd_pluginMeta', {})
+    cli = mocker.patch.object(action.PluginRun, 'pluginRun_CLI',
+                              return_value={'mode': 'cli', 'returncode': 0, 'stdout': 'plugin instance 43'})
+    options = dyworkflow.parser.parse_args(['--copy', 'copy'])
+    return action.PluginRun(env=mocker.MagicMock(), options=options), cl, cli
+
+
+def test_native(pluginRun):
+    run, cl, cli = pluginRun
+    d_ret = run('/incoming/study')
+    assert d_ret['status'] and d_ret['branchInstanceID'] == 42
+    assert d_ret['run']['mode'] == 'native'
+    cli.assert_not_called()
+
+
+def test_lookup_error_falls_back_to_cli(pluginRun):
+    """
+    CUBE failing before the instance is requested falls back to the CLI.
+    """
+    run, cl, cli = pluginRun
+    cl.get_plugins.side_effect = ConnectionError('CUBE unreachable')
+    d_ret = run('/incoming/study')
+    assert d_ret['status'] and d_ret['branchInstanceID'] == '43'
+    cl.create_plugin_instance.assert_not_called()
+    cli.assert_called_once()
+
+
+def test_create_error_is_not_retried(pluginRun):
+    """
+    A failed create request (which may have created the instance anyway)
+    fails the child rather than creating another one through the CLI.
+    """
+    run, cl, cli = pluginRun
+    cl.create_plugin_instance.side_effect = TimeoutError('read timed out')
+    d_ret = run('/incoming/study')
+    assert not d_ret['status'] and d_ret['branchInstanceID'] == -1
+    assert d_ret['run']['stderr'] == 'TimeoutError: read timed out'
+    cli.assert_not_called()
+
+
+def template_client(mocker):
+    cl = mocker.MagicMock()
+    item = mocker.MagicMock()
+    item.links = [mocker.MagicMock(rel='plugins', href='http://cube/pipelines/3/plugins/'),
+                  mocker.MagicMock(rel='workflows', href='http://cube/pipelines/3/workflows/')]
+    cl._fetch_resource.return_value = mocker.MagicMock(items=[item])
+    return cl
+
+
+def test_workflow_template(mocker):
+    """
+    The workflows url is looked up once; each create is one POST to it.
+    """
+    cl = template_client(mocker)
+    template = action.WorkflowTemplate(cl, 'pipeline', {'id': 3, 'nodes': [{'piping_id': 1}]})
+    assert template.workflowsURL == 'http://cube/pipelines/3/workflows/'
+    request = mocker.patch.object(action, 'Request')
+    request.return_value.get_data_from_collection.return_value = {'data': [{'id': 9}]}
+    assert template.create(cl, '42') == {'id': 9}
+    str_url, d_data = request.return_value.post.call_args[0][:2]
+    assert str_url == template.workflowsURL
+    assert d_data == {'previous_plugin_inst_id': '42', 'nodes_info': '[{"piping_id": 1}]'}
+    cl.create_workflow.assert_not_called()
+
+
+def test_workflow_template_changed_chrisclient(mocker):
+    """
+    python-chrisclient internals that are gone fail with an error naming
+    the version they come from.
+    """
+    cl = template_client(mocker)
+    del cl._fetch_resource
+    with pytest.raises(RuntimeError, match=r'workflows url lookup.*python-chrisclient==2\.9\.1'):
+        action.WorkflowTemplate(cl, 'pipeline', {'id': 3, 'nodes': []})
+
+    template = action.WorkflowTemplate(template_client(mocker), 'pipeline', {'id': 3, 'nodes': []})
+    mocker.patch.object(action, 'Request', side_effect=TypeError('unexpected argument'))
+    with pytest.raises(RuntimeError, match='workflow POST'):
+        template.create(cl, '42')
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+from logic import behavior
+from test_dicom import dicom_write
+
+
+def test_predicates_parse():
+    l_predicate = behavior.predicates_parse(
+        'Modality=CR,dx; BodyPartExamined!=HEAD;SeriesDescription~^ap\\b;Rows>=1024;')
+    assert [(p.tag, p.op) for p in l_predicate] == [
+        ('Modality', '='), ('BodyPartExamined', '!='), ('SeriesDescription', '~'), ('Rows', '>=')]
+    assert l_predicate[0].l_value == ['CR', 'DX']
+    assert l_predicate[0]({'Modality': 'dx'})
+    assert not l_predicate[1]({'BodyPartExamined': 'head'})
+    assert l_predicate[2]({'SeriesDescription': 'AP chest'})
+    assert not l_predicate[3]({'Rows': '512'})
+    assert not l_predicate[3]({})
+
+
+@pytest.mark.parametrize('str_spec, str_error', [
+    ('Modality', "cannot parse condition 'Modality'"),
+    ('=CR', "cannot parse condition '=CR'"),
+    ('PatientName=X', "unknown tag 'PatientName' in condition 'PatientName=X'"),
+    ('Modality=', "no value in condition 'Modality='"),
+    ('Rows>= ', "no value in condition 'Rows>= '"),
+    ('Rows>=big', "bad value in condition 'Rows>=big'"),
+    ('Rows>=512,1024', "bad value in condition 'Rows>=512,1024'"),
+    ('SeriesDescription~(ap', "bad value in condition 'SeriesDescription~(ap'"),
+])
+def test_predicates_parse_malformed(str_spec: str, str_error: str):
+    """
+    A malformed --select spec raises a ValueError naming the condition.
+    """
+    with pytest.raises(ValueError) as e:
+        behavior.predicates_parse('Modality=CR;' + str_spec)
+    assert str(e.value).startswith(str_error)
+
+
+def test_selection(tmp_path: Path):
+    """
+    A file passes if its header satisfies all predicates; a directory if
+    any of its files does.
+    """
+    dicom_write(tmp_path / 'explicit.dcm')
+    dicom_write(tmp_path / 'implicit.dcm', explicit=False)
+    (tmp_path / 'notes.txt').write_text('not an image')
+
+    selection = behavior.Selection(behavior.predicates_parse('Modality=CR;Rows>=1024;Columns<1024'))
+    assert selection(str(tmp_path / 'explicit.dcm'))
+    assert selection(str(tmp_path / 'implicit.dcm'))
+    assert not selection(str(tmp_path / 'notes.txt'))
+    assert selection(str(tmp_path))
+    assert not behavior.Selection(behavior.predicates_parse('Modality=CT'))(str(tmp_path))
+
+
+def test_selection_version():
+    """
+    The cache version changes with the predicates.
+    """
+    def version(str_spec: str) -> str:
+        return behavior.Selection(behavior.predicates_parse(str_spec)).version
+
+    assert version('Modality=CR') == version(' Modality = cr ')
+    assert version('Modality=CR') != version('Modality=DX')
+
+
+def test_filter(tmp_path: Path):
+    """
+    Inputs are filtered lazily and in order; an input that vanished since
+    discovery does not pass and is counted as unreadable.
+    """
+    for name in ['a', 'b', 'c']:
+        (tmp_path / name).mkdir()
+    dicom_write(tmp_path / 'a' / 'image.dcm')
+    dicom_write(tmp_path / 'c' / 'image.dcm')
+    l_pair = [(tmp_path / name, name) for name in ['a', 'b', 'gone', 'c']]
+
+    selection = behavior.Filter(filterOp=behavior.Selection(behavior.predicates_parse('Modality=CR')),
+                                workers=2)
+    assert list(selection(l_pair)) == [l_pair[0], l_pair[3]]
+    assert selection.stats() == {'passed': 2, 'rejected': 1, 'unreadable': 1}
+    assert selection.obj_pass(str(tmp_path / 'a'))
+    assert not selection.obj_pass(str(tmp_path / 'gone'))
+    assert selection.stats()['passed'] == 2
+
+
+def test_filter_unconditional_keeps_no_verdicts():
+    conditional = behavior.Filter(filterOp=behavior.unconditionalPass)
+    assert all(conditional.obj_pass('input-%d' % i) for i in range(100))
+    assert conditional.d_verdict == {}
+    assert conditional.stats()['passed'] == 100
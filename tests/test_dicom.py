@@ -0,0 +1,123 @@
+import struct
+from pathlib import Path
+
+import pytest
+
+from logic import dicom
+
+str_explicitLE = '1.2.840.10008.1.2.1'
+
+
+def element(group: int, element: int, vr: bytes, value, explicit: bool = True) -> bytes:
+    """
+    Encode one little endian data element, in explicit or implicit VR.
+    """
+    if isinstance(value, str):
+        value = value.encode()
+    if len(value) % 2:
+        value += b'\0'
+    if not explicit and group != 0x0002:
+        return struct.pack('<HHI', group, element, len(value)) + value
+    if vr in dicom.s_longVR:
+        return struct.pack('<HH', group, element) + vr + b'\0\0' + struct.pack('<I', len(value)) + value
+    return struct.pack('<HH', group, element) + vr + struct.pack('<H', len(value)) + value
+
+
+def sequence(group: int, element: int, inner: bytes, explicit: bool = True) -> bytes:
+    """
+    A sequence of undefined length holding one item of undefined length.
+    """
+    item = struct.pack('<HHI', 0xFFFE, 0xE000, dicom.undefined) + inner + \
+           struct.pack('<HHI', 0xFFFE, 0xE00D, 0)
+    header = struct.pack('<HH', group, element) + (b'SQ\0\0' if explicit else b'') + \
+             struct.pack('<I', dicom.undefined)
+    return header + item + struct.pack('<HHI', 0xFFFE, 0xE0DD, 0)
+
+
+def dataset(explicit: bool = True) -> bytes:
+    """
+    A small CR image header: an undefined length sequence between the
+    SOP instance UID / modality and the study/series UIDs, image size
+    and pixel data.
+    """
+    return b''.join([
+        element(0x0008, 0x0018, b'UI', '1.2.3.4', explicit),
+        element(0x0008, 0x0060, b'CS', 'CR', explicit),
+        sequence(0x0008, 0x1115,
+                 element(0x0008, 0x1150, b'UI', '9.9.9', explicit) +
+                 sequence(0x0008, 0x114A, element(0x0008, 0x1155, b'UI', '8.8', explicit), explicit),
+                 explicit),
+        element(0x0018, 0x0015, b'CS', 'LEG', explicit),
+        element(0x0020, 0x000D, b'UI', '1.2.3', explicit),
+        element(0x0020, 0x000E, b'UI', '1.2.3.1', explicit),
+        element(0x0028, 0x0010, b'US', struct.pack('<H', 1024), explicit),
+        element(0x0028, 0x0011, b'US', struct.pack('<H', 768), explicit),
+        element(0x7FE0, 0x0010, b'OW', b'\x01' * 256, explicit),
+    ])
+
+
+def dicom_write(path: Path, explicit: bool = True, preamble: bool = True) -> Path:
+    meta = element(0x0002, 0x0010, b'UI', str_explicitLE if explicit else dicom.str_implicitLE)
+    meta = element(0x0002, 0x0000, b'UL', struct.pack('<I', len(meta))) + meta
+    path.write_bytes((b'\0' * 128 + b'DICM' if preamble else b'') + meta + dataset(explicit))
+    return path
+
+
+l_tag = ['SOPInstanceUID', 'Modality', 'BodyPartExamined', 'StudyInstanceUID',
+         'SeriesInstanceUID', 'Rows', 'Columns']
+
+
+@pytest.mark.parametrize('explicit', [True, False], ids=['explicit', 'implicit'])
+def test_header_read(tmp_path: Path, explicit: bool):
+    """
+    Tags before and after an undefined length sequence are read in both
+    explicit and implicit VR little endian, binary US values as numbers.
+    """
+    path = dicom_write(tmp_path / 'image.dcm', explicit)
+    assert dicom.header_read(str(path), l_tag) == {
+        'SOPInstanceUID': '1.2.3.4',
+        'Modality': 'CR',
+        'BodyPartExamined': 'LEG',
+        'StudyInstanceUID': '1.2.3',
+        'SeriesInstanceUID': '1.2.3.1',
+        'Rows': '1024',
+        'Columns': '768',
+    }
+
+
+def test_header_read_by_tag_tuple(tmp_path: Path):
+    path = dicom_write(tmp_path / 'image.dcm')
+    assert dicom.header_read(str(path), [dicom.tag_Modality, 'Rows']) == \
+           {dicom.tag_Modality: 'CR', 'Rows': '1024'}
+
+
+def test_header_read_missing_tag(tmp_path: Path):
+    path = dicom_write(tmp_path / 'image.dcm')
+    assert dicom.header_read(str(path), ['SeriesDescription']) == {}
+
+
+@pytest.mark.parametrize('explicit', [True, False], ids=['explicit', 'implicit'])
+def test_header_read_truncated(tmp_path: Path, explicit: bool):
+    """
+    A file cut short inside the sequence yields the tags read before the
+    cut, and no error.
+    """
+    path = dicom_write(tmp_path / 'image.dcm', explicit)
+    data = path.read_bytes()
+    path.write_bytes(data[:data.index(b'9.9.9') + 2])
+    assert dicom.header_read(str(path), l_tag) == {'SOPInstanceUID': '1.2.3.4', 'Modality': 'CR'}
+
+
+def test_header_read_missing_preamble(tmp_path: Path):
+    """
+    Without the 128 byte preamble and 'DICM' prefix, a file is not DICOM.
+    """
+    path = dicom_write(tmp_path / 'image.dcm', preamble=False)
+    assert dicom.header_read(str(path), l_tag) == {}
+
+
+def test_header_read_not_dicom(tmp_path: Path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('not an image')
+    assert dicom.header_read(str(path), l_tag) == {}
+    assert dicom.header_read(str(tmp_path / 'missing.dcm'), l_tag) == {}
@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from control import engine
+
+
+class FakeStages(engine.Stages):
+    """
+    Stages whose behavior is chosen by the input name: 'nocreate' and
+    'noschedule' fail that stage, 'raise-<stage>' raises in it, 'sync'
+    watches without a future and 'slow' is never resolved (so it times
+    out and is abandoned). Other waits resolve shortly, from another
+    thread, like the status poller's. The number of children between
+    create and complete is tracked.
+    """
+
+    def __init__(self, timeout: float = 0.0):
+        self.waitTimeout = timeout
+        self.lock = threading.Lock()
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.d_maxStage = {}
+        self.d_inStage = {}
+
+    def enter(self, str_stage: str, str_input: str) -> None:
+        if str_input == 'raise-' + str_stage:
+            raise RuntimeError(str_input)
+        with self.lock:
+            self.d_inStage[str_stage] = self.d_inStage.get(str_stage, 0) + 1
+            self.d_maxStage[str_stage] = max(self.d_maxStage.get(str_stage, 0),
+                                             self.d_inStage[str_stage])
+        time.sleep(0.01)
+        with self.lock:
+            self.d_inStage[str_stage] -= 1
+
+    def create(self, input, output):
+        with self.lock:
+            self.inFlight += 1
+            self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        self.enter('create', str(input))
+        if str(input) == 'nocreate':
+            self.done()
+            return False, {'input': str(input), 'stage': 'create'}
+        return True, {'input': str(input), 'output': output}
+
+    def schedule(self, d_ret):
+        self.enter('schedule', d_ret['input'])
+        if d_ret['input'] == 'noschedule':
+            self.done()
+            d_ret['stage'] = 'schedule'
+            return None
+        return d_ret['input']
+
+    def watch(self, handle):
+        self.enter('watch', handle)
+        if handle == 'sync':
+            return {'status': 'finishedSuccessfully'}
+        future = Future()
+        if handle != 'slow':
+            threading.Timer(0.02, future.set_result, [{'status': 'finishedSuccessfully'}]).start()
+        return future
+
+    def timeout(self, handle):
+        return self.waitTimeout
+
+    def abandon(self, handle):
+        return {'status': 'started'}
+
+    def complete(self, d_ret, handle, d_wait):
+        self.enter('complete', handle)
+        self.done()
+        return dict(d_ret, stage='complete', status=d_wait['status'])
+
+    def done(self) -> None:
+        with self.lock:
+            self.inFlight -= 1
+
+
+def pairs(l_input: list) -> list:
+    return [(name, Path('/out') / name) for name in l_input]
+
+
+def by_input(l_result: list) -> dict:
+    return {d['input']: (d['stage'], d.get('status')) for d in l_result}
+
+
+l_mixed = ['a', 'nocreate', 'noschedule', 'sync', 'b']
+d_mixed = {
+    'a': ('complete', 'finishedSuccessfully'),
+    'nocreate': ('create', None),
+    'noschedule': ('schedule', None),
+    'sync': ('complete', 'finishedSuccessfully'),
+    'b': ('complete', 'finishedSuccessfully'),
+}
+
+
+def test_async_engine_stages():
+    """
+    Every input yields one result, from the stage it stopped at.
+    """
+    result = engine.AsyncEngine(FakeStages(), concurrency=4, ioWorkers=2)(pairs(l_mixed))
+    assert by_input(result) == d_mixed
+
+
+def test_async_engine_concurrency_bound():
+    stages = FakeStages()
+    result = engine.AsyncEngine(stages, concurrency=3, ioWorkers=8)(
+                pairs(['input-%d' % i for i in range(20)]))
+    assert len(result) == 20
+    assert stages.maxInFlight == 3
+
+
+def test_async_engine_timeout_abandons():
+    result = engine.AsyncEngine(FakeStages(timeout=0.1))(pairs(['slow', 'a']))
+    assert by_input(result) == {'slow': ('complete', 'started'),
+                                'a': ('complete', 'finishedSuccessfully')}
+
+
+@pytest.mark.parametrize('str_stage', ['create', 'schedule', 'watch', 'complete'])
+def test_async_engine_error_propagates(str_stage: str):
+    with pytest.raises(RuntimeError, match='raise-' + str_stage):
+        engine.AsyncEngine(FakeStages())(pairs(['a', 'raise-' + str_stage, 'b']))
+
+
+def test_staged_engine_stages():
+    result = engine.StagedEngine(FakeStages(), queueSize=2)(pairs(l_mixed))
+    assert by_input(result) == d_mixed
+
+
+def test_staged_engine_workers_bound():
+    """
+    Each stage runs at most its number of workers at once.
+    """
+    stages = FakeStages()
+    result = engine.StagedEngine(stages, workers={'create': 2, 'schedule': 1, 'await': 3},
+                                 queueSize=1)(pairs(['input-%d' % i for i in range(20)]))
+    assert len(result) == 20
+    assert stages.d_maxStage['create'] == 2
+    assert stages.d_maxStage['schedule'] == 1
+    assert stages.d_maxStage['watch'] <= 3
+
+
+def test_staged_engine_timeout_abandons():
+    result = engine.StagedEngine(FakeStages(timeout=0.1))(pairs(['slow', 'a']))
+    assert by_input(result) == {'slow': ('complete', 'started'),
+                                'a': ('complete', 'finishedSuccessfully')}
+
+
+@pytest.mark.parametrize('str_stage', ['create', 'schedule', 'watch', 'complete'])
+def test_staged_engine_error_propagates(str_stage: str):
+    """
+    An error in a stage is raised once the pipeline has drained; the other
+    inputs still complete.
+    """
+    staged = engine.StagedEngine(FakeStages())
+    with pytest.raises(RuntimeError, match='raise-' + str_stage):
+        staged(pairs(['a', 'raise-' + str_stage, 'b']))
+    assert sorted(d['input'] for d in staged.ld_result) == ['a', 'b']
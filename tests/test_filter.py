@@ -0,0 +1,175 @@
+from pathlib import Path
+
+import pytest
+from chris_plugin import PathMapper
+
+from control.filter import Chunker, PathFilter, Shard, shard_parse
+
+l_tree = [
+    'a.dcm', 'notes.txt',
+    'b/1.dcm', 'b/2.dcm', 'b/c/3.dcm', 'b/c/skip.txt',
+    'b/d/4.dcm', 'e/5.dcm', 'e/tmp/6.dcm', 'e/tmp/deeper/7.dcm',
+    'f/empty/.keep',
+]
+
+
+def tree_write(inputdir: Path) -> Path:
+    """
+    Write an input tree of (empty) files, mixing matching and other files
+    at several depths.
+    """
+    for str_rel in l_tree:
+        (inputdir / str_rel).parent.mkdir(parents=True, exist_ok=True)
+        (inputdir / str_rel).touch()
+    return inputdir
+
+
+def rel(l_pair: list, inputdir: Path, outputdir: Path) -> list:
+    return [(str(i.relative_to(inputdir)), str(o.relative_to(outputdir))) for i, o in l_pair]
+
+
+@pytest.fixture
+def dirs(tmp_path: Path) -> tuple:
+    inputdir = tree_write(tmp_path / 'in')
+    outputdir = tmp_path / 'out'
+    outputdir.mkdir()
+    return inputdir, outputdir
+
+
+def test_walk_matches_file_mapper(dirs: tuple):
+    """
+    The walk yields the pairs PathMapper.file_mapper does, depth first in
+    name order (a directory's files before its subdirectories).
+    """
+    inputdir, outputdir = dirs
+    l_walk = list(PathFilter(inputdir, outputdir, glob='**/*.dcm', parents=False).walk())
+    l_mapper = list(PathMapper.file_mapper(inputdir, outputdir, glob='**/*.dcm'))
+    assert sorted(l_walk) == sorted(l_mapper)
+    assert [i for i, _ in rel(l_walk, inputdir, outputdir)] == [
+        'a.dcm', 'b/1.dcm', 'b/2.dcm', 'b/c/3.dcm', 'b/d/4.dcm',
+        'e/5.dcm', 'e/tmp/6.dcm', 'e/tmp/deeper/7.dcm',
+    ]
+    assert all(i == o for i, o in rel(l_walk, inputdir, outputdir))
+
+
+def test_walk_matches_dir_mapper_deep(dirs: tuple):
+    inputdir, outputdir = dirs
+    l_walk = list(PathFilter(inputdir, outputdir, dirs_deep=True, parents=False).walk())
+    l_mapper = list(PathMapper.dir_mapper_deep(inputdir, outputdir))
+    assert sorted(l_walk) == sorted(l_mapper)
+    assert [i for i, _ in rel(l_walk, inputdir, outputdir)] == \
+           ['b/c', 'b/d', 'e/tmp/deeper', 'f/empty']
+
+
+def test_walk_include_exclude(dirs: tuple):
+    """
+    Includes add to the glob; an excluded directory is pruned without
+    being entered, and an excluded file is left out.
+    """
+    inputdir, outputdir = dirs
+    mapper = PathFilter(inputdir, outputdir, glob='**/*.dcm', include='**/*.txt',
+                        exclude='e/tmp/**,b/2.dcm', parents=False)
+    assert [i for i, _ in rel(list(mapper.walk()), inputdir, outputdir)] == [
+        'a.dcm', 'notes.txt', 'b/1.dcm', 'b/c/3.dcm', 'b/c/skip.txt', 'b/d/4.dcm', 'e/5.dcm',
+    ]
+    assert mapper.d_stats['pruned'] == 1
+    assert mapper.d_stats['dirs'] == 7
+
+
+@pytest.mark.parametrize('dirs_deep', [False, True])
+def test_walk_readahead_order(dirs: tuple, dirs_deep: bool):
+    """
+    Reading listings ahead in a pool changes nothing about the pairs or
+    their order.
+    """
+    inputdir, outputdir = dirs
+    l_serial = list(PathFilter(inputdir, outputdir, glob='**/*.dcm', dirs_deep=dirs_deep,
+                               parents=False).walk())
+    for workers in [2, 4, 16]:
+        assert list(PathFilter(inputdir, outputdir, glob='**/*.dcm', dirs_deep=dirs_deep,
+                               parents=False, workers=workers).walk()) == l_serial
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_walk_symlink_cycle(dirs: tuple, workers: int):
+    """
+    A symlink back up the tree is not followed, so the walk ends and
+    yields every file once; symlinked files are still yielded.
+    """
+    inputdir, outputdir = dirs
+    (inputdir / 'b' / 'c' / 'loop').symlink_to(inputdir, target_is_directory=True)
+    (inputdir / 'e' / 'link.dcm').symlink_to(inputdir / 'a.dcm')
+    l_input = [i for i, _ in rel(list(PathFilter(inputdir, outputdir, glob='**/*.dcm',
+                                                 parents=False, workers=workers).walk()),
+                                 inputdir, outputdir)]
+    assert l_input == ['a.dcm', 'b/1.dcm', 'b/2.dcm', 'b/c/3.dcm', 'b/d/4.dcm',
+                       'e/5.dcm', 'e/link.dcm', 'e/tmp/6.dcm', 'e/tmp/deeper/7.dcm']
+
+
+def files_write(inputdir: Path, l_name: list, size: int = 10) -> list:
+    inputdir.mkdir(exist_ok=True)
+    for str_name in l_name:
+        (inputdir / str_name).write_bytes(b'x' * size)
+    return [(inputdir / str_name, Path('/out') / str_name) for str_name in l_name]
+
+
+def test_chunker_filter_cap(tmp_path: Path):
+    """
+    Chunks are cut before their combined fileFilter would pass filterMax
+    characters; every file is in exactly one chunk, in order.
+    """
+    l_name = ['file-%03d-%s.dcm' % (i, 'x' * (i % 7)) for i in range(200)]
+    l_pair = files_write(tmp_path, l_name)
+    chunker = Chunker(count=1000)
+    l_chunk = list(chunker(l_pair))
+    assert len(l_chunk) > 1
+    assert all(len(chunker.fileFilter(input)) <= Chunker.filterMax for input, _ in l_chunk)
+    assert [f for input, _ in l_chunk for f in chunker.files(input)] == \
+           [str(input) for input, _ in l_pair]
+    assert [output for _, output in l_chunk] == \
+           [Path('/out') / Path(chunker.files(input)[0]).name for input, _ in l_chunk]
+    assert chunker.stats()['inputs'] == 200
+
+
+def test_chunker_count_and_bytes(tmp_path: Path):
+    """
+    A chunk holds at most <count> files and <bytes> bytes; a file larger
+    than <bytes> is a chunk on its own.
+    """
+    l_pair = files_write(tmp_path, ['a', 'b', 'c', 'd', 'e'])
+    chunker = Chunker(count=2)
+    assert [len(chunker.files(i)) for i, _ in chunker(l_pair)] == [2, 2, 1]
+    (tmp_path / 'c').write_bytes(b'x' * 100)
+    chunker = Chunker(bytes=30)
+    l_chunk = list(chunker(l_pair))
+    assert [chunker.files(i) for i, _ in l_chunk] == \
+           [[str(tmp_path / 'a'), str(tmp_path / 'b')], [str(tmp_path / 'c')],
+            [str(tmp_path / 'd'), str(tmp_path / 'e')]]
+    assert l_chunk[0][0] == Path(str(tmp_path / 'a') + '+1')
+    assert chunker.fileFilter(l_chunk[0][0]) == 'a,b'
+
+
+def test_shard_covers_every_input_once(dirs: tuple):
+    """
+    The N slices are disjoint and together cover every input, whatever
+    the mount point of the inputdir.
+    """
+    inputdir, outputdir = dirs
+    l_all = list(PathFilter(inputdir, outputdir, glob='**/*', parents=False).walk())
+    for N in [1, 2, 3, 7]:
+        l_slice = [list(Shard(inputdir, '%d/%d' % (i, N))(l_all)) for i in range(N)]
+        assert sorted(p for l_pair in l_slice for p in l_pair) == sorted(l_all)
+        moved = [[(Path('/elsewhere') / i.relative_to(inputdir), o) for i, o in l_pair]
+                 for l_pair in l_slice]
+        assert moved == [list(Shard('/elsewhere', '%d/%d' % (i, N))(
+                            (Path('/elsewhere') / i.relative_to(inputdir), o) for i, o in l_all))
+                         for i in range(N)]
+    shard = Shard(inputdir, '1/3')
+    list(shard(l_all))
+    assert shard.stats()['kept'] + shard.stats()['skipped'] == len(l_all)
+
+
+@pytest.mark.parametrize('str_shard', ['3/3', '-1/2', '1', 'a/b', '1/0'])
+def test_shard_parse_errors(str_shard: str):
+    with pytest.raises(ValueError):
+        shard_parse(str_shard)
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+
+from state import fingerprint, manifest
+from test_dicom import dicom_write
+
+
+def study(path: Path, l_content: list) -> Path:
+    path.mkdir(parents=True)
+    for i, content in enumerate(l_content):
+        (path / ('%d.dcm' % i)).write_bytes(content)
+    return path
+
+
+def pairs(l_path: list) -> list:
+    return [(p, p) for p in l_path]
+
+
+def test_fingerprint_stat_and_hash(tmp_path: Path):
+    a = study(tmp_path / 'a', [b'one', b'two'])
+    stat, hash = fingerprint.fingerprint_stat(a), fingerprint.fingerprint_hash(a)
+    assert stat.startswith('stat:') and hash.startswith('sha256:')
+    (a / '1.dcm').write_bytes(b'TWO')
+    assert fingerprint.fingerprint_hash(a) != hash
+    assert fingerprint.fingerprint_stat(tmp_path / 'gone') == ''
+    assert fingerprint.fingerprint_hash(tmp_path / 'gone') == ''
+
+
+def test_fingerprint_content_ignores_names(tmp_path: Path):
+    a = study(tmp_path / 'a', [b'one', b'two'])
+    b = study(tmp_path / 'b', [b'two', b'one'])
+    assert fingerprint.fingerprint_content(a) == fingerprint.fingerprint_content(b)
+    assert fingerprint.fingerprint_hash(a) != fingerprint.fingerprint_hash(b)
+    assert fingerprint.fingerprint_content(tmp_path / 'gone') == ''
+    assert fingerprint.fingerprint_uid(tmp_path / 'gone') == ''
+
+
+def test_fingerprint_empty_directories_differ(tmp_path: Path):
+    a = study(tmp_path / 'a', [])
+    b = study(tmp_path / 'b', [])
+    for fn in [fingerprint.fingerprint_content, fingerprint.fingerprint_uid]:
+        assert fn(a) != fn(b)
+
+
+@pytest.mark.parametrize('mode', ['content', 'uid'])
+def test_dedup(tmp_path: Path, mode: str):
+    """
+    The first of several inputs with the same key is kept; empty and
+    vanished inputs are never duplicates, and vanished ones are skipped.
+    """
+    a = study(tmp_path / 'a', [b'one', b'two'])
+    b = study(tmp_path / 'b', [b'two', b'one'])
+    c = study(tmp_path / 'c', [b'three'])
+    e1 = study(tmp_path / 'e1', [])
+    e2 = study(tmp_path / 'e2', [])
+    gone = tmp_path / 'gone'
+
+    dedup = fingerprint.Dedup(mode=mode, workers=2)
+    assert list(dedup(pairs([a, gone, b, e1, c, e2]))) == pairs([a, e1, c, e2])
+    d_stats = dedup.stats()
+    assert d_stats['unique'] == 4
+    assert d_stats['duplicates'] == 1 and d_stats['unreadable'] == 1
+    assert d_stats['skipped'][0]['input'] == str(b)
+    assert d_stats['skipped'][0]['duplicateOf'] == str(a)
+
+
+def test_dedup_uid_matches_reencoded_copies(tmp_path: Path):
+    """
+    The same SOP instance stored in another transfer syntax differs in
+    content, but not in its 'uid' key.
+    """
+    dicom_write(study(tmp_path / 'a', []) / 'image.dcm')
+    dicom_write(study(tmp_path / 'b', []) / 'image.dcm', explicit=False)
+    l_pair = pairs([tmp_path / 'a', tmp_path / 'b'])
+    assert list(fingerprint.Dedup(mode='content', workers=1)(l_pair)) == l_pair
+    assert list(fingerprint.Dedup(mode='uid', workers=1)(l_pair)) == l_pair[:1]
+
+
+def test_incremental_verdicts(tmp_path: Path):
+    """
+    Against a previous manifest, new and changed inputs and failed
+    children are run; unchanged finished children and children still
+    pending in CUBE are carried over.
+    """
+    l_input = [study(tmp_path / name, [name.encode()])
+               for name in ['done', 'edited', 'failed', 'scheduled', 'started', 'new']]
+    previous = manifest.Manifest()
+    previous.d_meta['inputdir'] = str(tmp_path)
+    for input, str_status in zip(l_input, ['finishedSuccessfully', 'finishedSuccessfully',
+                                           'finishedWithError', 'scheduled', 'started']):
+        previous.add(input=str(input), status=str_status,
+                     fingerprint=fingerprint.fingerprint_hash(input))
+    (l_input[1] / '0.dcm').write_bytes(b'EDITED')
+
+    incremental = fingerprint.Incremental(previous, tmp_path, mode='hash', workers=2)
+    assert list(incremental(pairs(l_input))) == pairs([l_input[1], l_input[2], l_input[5]])
+    assert incremental.d_stats == {'new': 1, 'changed': 1, 'retried': 1,
+                                   'unchanged': 1, 'pending': 2, 'unreadable': 0}
+    assert [(d['input'], d['status']) for d in incremental.l_carried] == [
+        (str(l_input[0]), 'finishedSuccessfully'),
+        (str(l_input[3]), 'scheduled'),
+        (str(l_input[4]), 'started')]
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+
+from control.filter import PathFilter
+from state.index import InputIndex
+
+
+def index_walk(inputdir: Path, outputdir: Path, index: InputIndex | None = None) -> PathFilter:
+    """
+    Discover the inputs of <inputdir> with indexing on (against the
+    earlier <index>, if given).
+    """
+    mapper = PathFilter(inputdir, outputdir, glob='**/*.dcm', parents=False,
+                        indexed=True, index=index)
+    list(mapper.walk())
+    return mapper
+
+
+def roundtrip(index: InputIndex, path: Path) -> InputIndex:
+    loaded = InputIndex.load(index.save(path))
+    assert loaded is not None
+    assert loaded.d_meta == index.d_meta
+    assert loaded.d_dir == index.d_dir
+    assert loaded.d_file == index.d_file
+    return loaded
+
+
+def test_roundtrip_empty_index(tmp_path: Path):
+    loaded = roundtrip(InputIndex(meta={'inputdir': 'x'}), tmp_path / 'index')
+    assert loaded.d_dir == {} and loaded.d_file == {}
+
+
+def test_roundtrip_empty_tree(tmp_path: Path):
+    """
+    An empty inputdir is indexed as the root '' directory alone.
+    """
+    inputdir = tmp_path / 'in'
+    inputdir.mkdir()
+    index = index_walk(inputdir, tmp_path / 'out').indexNew
+    assert list(index.d_dir) == ['']
+    loaded = roundtrip(index, tmp_path / 'index')
+    assert loaded.listing_get('', index.d_dir[''], inputdir) == []
+
+
+def test_roundtrip_tree(tmp_path: Path):
+    """
+    Files in the root '' directory and below round trip with their
+    listings, and unchanged directories reuse the indexed listing.
+    """
+    inputdir = tmp_path / 'in'
+    (inputdir / 'study' / 'series').mkdir(parents=True)
+    (inputdir / 'top.dcm').write_bytes(b'x' * 10)
+    (inputdir / 'notes.txt').write_text('not matched')
+    (inputdir / 'study' / 'series' / 'a.dcm').write_bytes(b'x' * 20)
+    index = index_walk(inputdir, tmp_path / 'out').indexNew
+    assert set(index.d_dir) == {'', 'study', 'study/series'}
+    assert index.d_file['top.dcm'][0] == 10 and index.d_file['top.dcm'][2] == 0
+    assert index.d_file['notes.txt'][2] == -1
+
+    loaded = roundtrip(index, tmp_path / 'index')
+    assert loaded.d_listing['study'] == (['series'], [])
+    assert sorted(loaded.d_listing[''][1]) == ['notes.txt', 'top.dcm']
+    assert [e[0] for e in loaded.listing_get('', index.d_dir[''], inputdir)] == \
+           ['notes.txt', 'study', 'top.dcm']
+    assert loaded.listing_get('', index.d_dir[''] + 1, inputdir) is None
+
+    again = index_walk(inputdir, tmp_path / 'out', loaded)
+    assert again.d_stats['reused'] == 3
+    assert again.d_diff == {'added': [], 'removed': [], 'changed': []}
+
+
+def test_diff(tmp_path: Path):
+    """
+    Inputs added, removed and changed since the saved index are reported;
+    files matching no include pattern are not.
+    """
+    inputdir = tmp_path / 'in'
+    (inputdir / 'study').mkdir(parents=True)
+    (inputdir / 'keep.dcm').write_bytes(b'k')
+    (inputdir / 'study' / 'gone.dcm').write_bytes(b'g')
+    (inputdir / 'study' / 'edit.dcm').write_bytes(b'e')
+    previous = InputIndex.load(index_walk(inputdir, tmp_path / 'out').indexNew.save(tmp_path / 'index'))
+
+    (inputdir / 'study' / 'gone.dcm').unlink()
+    (inputdir / 'study' / 'edit.dcm').write_bytes(b'edited')
+    (inputdir / 'study' / 'new.dcm').write_bytes(b'n')
+    (inputdir / 'new.txt').write_text('not matched')
+    # the directory mtime must change for it to be re-listed
+    st = os.stat(inputdir / 'study')
+    os.utime(inputdir / 'study', ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    mapper = index_walk(inputdir, tmp_path / 'out', previous)
+    assert mapper.d_diff == {
+        'added': ['study/new.dcm'],
+        'removed': ['study/gone.dcm'],
+        'changed': ['study/edit.dcm'],
+    }
+
+
+def test_load_rejects_foreign_file(tmp_path: Path):
+    path = tmp_path / 'index'
+    path.write_bytes(b'not an index')
+    assert InputIndex.load(path) is None
+    assert InputIndex.load(tmp_path / 'missing') is None
@@ -0,0 +1,179 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+from control import jobber
+
+
+def script(tmp_path: Path, str_name: str, str_code: str) -> str:
+    """
+    Write the python <str_code> to a script, returning the command to run it.
+    """
+    path = tmp_path / str_name
+    path.write_text(str_code)
+    return '%s %s' % (sys.executable, path)
+
+
+def test_job_run(tmp_path: Path):
+    shell = jobber.Jobber({'verbosity': 0})
+    d_ret = shell.job_run(script(tmp_path, 'ok.py',
+                                 'import sys; print("out"); print("err", file=sys.stderr); sys.exit(3)'))
+    assert d_ret['stdout'] == 'out\n' and d_ret['stderr'] == 'err\n'
+    assert d_ret['returncode'] == 3 and not d_ret['timedOut']
+    assert d_ret['truncated'] == {'stdout': 0, 'stderr': 0}
+
+
+def test_job_run_truncates_and_spills(tmp_path: Path):
+    """
+    Only the last bufferSize bytes of a stream are kept; the spill file
+    has all of it.
+    """
+    shell = jobber.Jobber({'verbosity': 0, 'bufferSize': 100, 'spillDir': str(tmp_path)})
+    d_ret = shell.job_run(script(tmp_path, 'chatty.py',
+                                 'import sys; sys.stdout.write("".join("%05d" % i for i in range(1000)))'))
+    assert d_ret['stdout'] == ''.join('%05d' % i for i in range(980, 1000))
+    assert d_ret['truncated']['stdout'] == 4900
+    assert Path(d_ret['spill']['stdout']).read_text() == ''.join('%05d' % i for i in range(1000))
+
+
+def test_job_run_stderr_flood(tmp_path: Path):
+    """
+    A child writing far more than a pipe buffer to stderr before any
+    stdout (which deadlocked reading the pipes one after the other)
+    completes.
+    """
+    shell = jobber.Jobber({'verbosity': 0, 'bufferSize': 1024, 'timeout': 30})
+    d_ret = shell.job_run(script(tmp_path, 'flood.py',
+                                 'import sys\n'
+                                 'sys.stderr.write("e" * (4 << 20)); sys.stderr.flush()\n'
+                                 'print("done")\n'))
+    assert not d_ret['timedOut'] and d_ret['returncode'] == 0
+    assert d_ret['stdout'] == 'done\n'
+    assert d_ret['stderr'] == 'e' * 1024
+    assert d_ret['truncated']['stderr'] == (4 << 20) - 1024
+
+
+def test_job_run_timeout_kills(tmp_path: Path):
+    """
+    A job past its timeout is killed; what it wrote before is kept.
+    """
+    shell = jobber.Jobber({'verbosity': 0})
+    d_ret = shell.job_run(script(tmp_path, 'hang.py',
+                                 'import sys, time; print("started", flush=True); time.sleep(60)'),
+                          timeout=0.5)
+    assert d_ret['timedOut']
+    assert d_ret['returncode'] == -9
+    assert d_ret['stdout'] == 'started\n'
+    assert d_ret['wallTime'] < 30
+
+
+def test_joblog_close_flushes(tmp_path: Path):
+    """
+    Every record added is in jobs.jsonl, in order, once the log is closed;
+    the in-memory history keeps only the last <keep>.
+    """
+    path = tmp_path / 'jobs.jsonl'
+    joblog = jobber.JobLog(keep=10, batchSize=16, interval=60)
+    joblog.add({'cmd': 'before open'})
+    joblog.open(str(path))
+    for i in range(100):
+        joblog.add({'cmd': 'job %d' % i, 'returncode': i % 2})
+    joblog.close()
+
+    l_record = [json.loads(str_line) for str_line in path.read_text().splitlines()]
+    assert [d['cmd'] for d in l_record] == ['before open'] + ['job %d' % i for i in range(100)]
+    assert all('time' in d for d in l_record)
+    assert joblog.stats() == {'records': 101, 'written': 101, 'dropped': 0}
+    assert [d['cmd'] for d in joblog.history()] == ['job %d' % i for i in range(90, 100)]
+
+
+class FakeShell:
+    """
+    Stands in for a Jobber: "jobs" sleep briefly and return the returncode
+    given as their command (or raise for 'raise'), tracking how many run
+    at once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.maxRunning = 0
+
+    def job_run(self, str_cmd: str, **kwargs) -> dict:
+        with self.lock:
+            self.running += 1
+            self.maxRunning = max(self.maxRunning, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if str_cmd == 'raise':
+            raise RuntimeError(str_cmd)
+        return {'returncode': int(str_cmd)}
+
+
+def test_jobpool_cap_and_status():
+    """
+    At most <cap> jobs run at once; the aggregate returncode is that of
+    the first failed job, and a job that raised counts as failed.
+    """
+    shell = FakeShell()
+    pool = jobber.JobPool(cap=2)
+    l_handle = [pool.submit(shell, str_cmd)[0] for str_cmd in ['0', '0', '3', 'raise', '0', '5']]
+    d_status = pool.wait_all()
+    assert shell.maxRunning == 2
+    assert d_status == {'jobs': 6, 'running': 0, 'succeeded': 3, 'cancelled': 0,
+                        'failed': [l_handle[2], l_handle[3], l_handle[5]], 'returncode': 3}
+    assert pool.status(l_handle[:2])['returncode'] == 0
+    pool.shutdown()
+
+
+def test_jobpool_keeps_last_finished():
+    shell = FakeShell()
+    pool = jobber.JobPool(cap=4, keep=3)
+    l_handle = [pool.submit(shell, '0')[0] for _ in range(10)]
+    pool.wait_all()
+    pool.shutdown()
+    assert len(pool.futures()) == 3
+    assert set(pool.futures()) <= set(l_handle)
+
+
+def test_jobpool_kill_all(tmp_path: Path):
+    """
+    kill_all kills the running job and cancels the queued ones, which are
+    counted apart from the failed.
+    """
+    pool = jobber.JobPool(cap=1)
+    shell = jobber.Jobber({'verbosity': 0})
+    str_cmd = script(tmp_path, 'hang.py', 'import time; time.sleep(60)')
+    l_handle = [pool.submit(shell, str_cmd)[0] for _ in range(3)]
+    deadline = time.monotonic() + 10
+    while pool.d_job[l_handle[0]]['process'] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert pool.kill_all() == 1
+    d_status = pool.wait_all(timeout=10)
+    assert d_status['cancelled'] == 2
+    assert d_status['failed'] == [l_handle[0]] and d_status['returncode'] == -9
+    assert pool.kill_all() == 0
+    pool.shutdown()
+
+
+def test_jobpool_kill_all_skips_exited(tmp_path: Path, mocker):
+    """
+    A process that has exited (but is not reaped yet) is not signalled.
+    """
+    pool = jobber.JobPool(cap=1)
+    p = subprocess.Popen([sys.executable, '-c', 'pass'])
+    os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+    pool.d_job[1] = {'cmd': 'exited', 'future': Future(), 'process': p, 'kill': False}
+    pool.d_job[1]['future'].set_running_or_notify_cancel()
+    kill = mocker.spy(p, 'kill')
+    assert pool.kill_all() == 0
+    kill.assert_not_called()
+    assert p.returncode == 0
+    pool.shutdown()
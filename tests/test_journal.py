@@ -0,0 +1,178 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import dyworkflow
+from control import action
+from state import journal, manifest
+
+
+class StubWorkflow:
+    """
+    Stands in for action.Workflow, recording the compute flow calls.
+    """
+    calls: list = []
+
+    def __init__(self, *args, **kwargs):
+        self.ld_workflowhist = []
+
+    def computeFlow_schedule(self, branchInstanceID):
+        StubWorkflow.calls.append(('schedule', branchInstanceID))
+        self.ld_workflowhist.append({'workflow_id': 70, 'pipeline_plugins': {}})
+
+    def computeFlow_resume(self, branchInstanceID, workflowID):
+        StubWorkflow.calls.append(('resume', branchInstanceID, workflowID))
+        self.ld_workflowhist.append({'workflow_id': workflowID, 'pipeline_plugins': {}})
+
+
+@pytest.fixture
+def stages(mocker, tmp_path: Path):
+    """
+    A ChildStages over a fresh journal in <tmp_path>, with child creation
+    and the Workflow stubbed out.
+    """
+    StubWorkflow.calls = []
+    runJournal = journal.Journal(fsync=False)
+    mocker.patch.object(dyworkflow, 'runJournal', runJournal)
+    mocker.patch.object(dyworkflow, 'runManifest', manifest.Manifest())
+    mocker.patch.object(dyworkflow, 'ld_forestResult', [])
+    mocker.patch.object(dyworkflow, 'heartbeat_file', return_value='')
+    mocker.patch.object(action, 'Workflow', StubWorkflow)
+
+    def created(options, env, input, d_ret):
+        d_ret['childFilter'] = {'input': str(input), 'branchInstanceID': 11}
+        return True
+
+    create = mocker.patch.object(dyworkflow, 'childNode_create', side_effect=created)
+    options = dyworkflow.parser.parse_args(['--copy', 'copy'])
+    env = mocker.MagicMock()
+    return dyworkflow.ChildStages(options, env), runJournal, create
+
+
+def journal_write(path: Path, l_record: list, str_tail: str = '') -> None:
+    with open(path, 'w') as f:
+        for d_record in l_record:
+            f.write(json.dumps(d_record) + '\n')
+        f.write(str_tail)
+
+
+def test_replay_ignores_torn_last_line(tmp_path: Path):
+    """
+    A record cut short by a crash mid-write is dropped on replay; the
+    records before it are kept and appending continues after it.
+    """
+    path = tmp_path / 'journal.jsonl'
+    journal_write(path, [
+        {'input': 'a', 'stage': 'created', 'branchInstanceID': 1},
+        {'input': 'a', 'stage': 'scheduled', 'workflowID': 2},
+        {'input': 'b', 'stage': 'created', 'branchInstanceID': 3},
+    ], '{"input": "b", "stage": "sched')
+
+    runJournal = journal.Journal(fsync=False)
+    assert runJournal.open(path) == 3
+    assert runJournal.state('a') == {'input': 'a', 'stage': 'scheduled',
+                                     'branchInstanceID': 1, 'workflowID': 2}
+    assert runJournal.stage_reached('b', 'created')
+    assert not runJournal.stage_reached('b', 'scheduled')
+    assert runJournal.counts() == {'scheduled': 1, 'created': 1}
+
+    runJournal.record('b', 'scheduled', workflowID=4)
+    runJournal.close()
+    replayed = journal.Journal()
+    assert replayed.replay(path) == 4
+    assert replayed.state('b')['workflowID'] == 4
+    assert len([json.loads(str_line) for str_line in path.read_text().splitlines()]) == 4
+
+
+def test_open_without_resume_truncates(tmp_path: Path):
+    path = tmp_path / 'journal.jsonl'
+    journal_write(path, [{'input': 'a', 'stage': 'finished', 'status': 'finishedSuccessfully'}])
+    runJournal = journal.Journal(fsync=False)
+    assert runJournal.open(path, resume=False) == 0
+    runJournal.close()
+    assert path.read_text() == ''
+    assert not runJournal.stage_reached('a', 'created')
+
+
+def test_fresh_input_is_created_and_scheduled(stages, tmp_path: Path):
+    childStages, runJournal, create = stages
+    runJournal.open(tmp_path / 'journal.jsonl')
+    input = tmp_path / 'study'
+
+    b_ok, d_ret = childStages.create(input, tmp_path / 'out')
+    assert b_ok and create.call_count == 1
+    childStages.schedule(d_ret)
+    assert StubWorkflow.calls == [('schedule', 11)]
+    assert runJournal.state(str(input))['stage'] == 'scheduled'
+    assert runJournal.state(str(input))['workflowID'] == 70
+
+
+def test_resume_after_created_schedules(stages, tmp_path: Path):
+    """
+    An input journaled as "created" is not created again, but its
+    workflow is scheduled on the journaled child.
+    """
+    childStages, runJournal, create = stages
+    input = tmp_path / 'study'
+    path = tmp_path / 'journal.jsonl'
+    journal_write(path, [{'input': str(input), 'stage': 'created', 'branchInstanceID': 21}])
+    runJournal.open(path)
+
+    b_ok, d_ret = childStages.create(input, tmp_path / 'out')
+    assert b_ok and d_ret['resumed'] == 'created'
+    assert d_ret['childFilter']['branchInstanceID'] == 21
+    create.assert_not_called()
+    childStages.schedule(d_ret)
+    assert StubWorkflow.calls == [('schedule', 21)]
+    assert runJournal.state(str(input))['stage'] == 'scheduled'
+
+
+def test_resume_after_scheduled_reattaches(stages, tmp_path: Path):
+    """
+    An input journaled as "scheduled" resumes its journaled workflow
+    rather than scheduling a new one.
+    """
+    childStages, runJournal, create = stages
+    input = tmp_path / 'study'
+    path = tmp_path / 'journal.jsonl'
+    journal_write(path, [
+        {'input': str(input), 'stage': 'created', 'branchInstanceID': 21},
+        {'input': str(input), 'stage': 'scheduled', 'workflowID': 33},
+    ])
+    runJournal.open(path)
+
+    b_ok, d_ret = childStages.create(input, tmp_path / 'out')
+    assert b_ok and d_ret['resumed'] == 'scheduled'
+    workflow = childStages.schedule(d_ret)
+    create.assert_not_called()
+    assert StubWorkflow.calls == [('resume', 21, 33)]
+    assert workflow.ld_workflowhist[-1]['workflow_id'] == 33
+
+
+def test_resume_after_finished_is_done(stages, tmp_path: Path):
+    """
+    An input journaled as "finished" is not run again; its journaled
+    result goes straight into the manifest.
+    """
+    childStages, runJournal, create = stages
+    input = tmp_path / 'study'
+    path = tmp_path / 'journal.jsonl'
+    journal_write(path, [
+        {'input': str(input), 'stage': 'created', 'branchInstanceID': 21},
+        {'input': str(input), 'stage': 'scheduled', 'workflowID': 33},
+        {'input': str(input), 'stage': 'finished', 'workflowID': 33,
+         'blockNodeID': 44, 'status': 'finishedSuccessfully'},
+    ])
+    runJournal.open(path)
+
+    b_ok, d_ret = childStages.create(input, tmp_path / 'out')
+    assert not b_ok and d_ret['resumed'] == 'finished'
+    assert d_ret['workflowRun']['status'] == 'finishedSuccessfully'
+    create.assert_not_called()
+    assert StubWorkflow.calls == []
+    l_child = dyworkflow.runManifest.children()
+    assert [(d['input'], d['workflowID'], d['status']) for d in l_child] == \
+           [(str(input), 33, 'finishedSuccessfully')]
+    assert d_ret['manifest'] is l_child[0]
+    assert dyworkflow.ld_forestResult == [d_ret]
@@ -0,0 +1,190 @@
+import os
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from state.leases import LeaseQueue
+
+
+def lease_age(d_item: dict, seconds: float) -> None:
+    """
+    Backdate the lease of <d_item>, as if its owner stopped heartbeating.
+    """
+    then = time.time() - seconds
+    os.utime(d_item['lease'], (then, then))
+
+
+def test_publish_is_idempotent(tmp_path: Path):
+    """
+    An input is published once, however many controllers publish it and
+    whatever state it has reached since.
+    """
+    queueA = LeaseQueue(tmp_path, owner='a')
+    queueB = LeaseQueue(tmp_path, owner='b')
+    assert queueA.publish('study-1', {'input': 'study-1'})
+    assert not queueA.publish('study-1', {'input': 'study-1'})
+    assert not queueB.publish('study-1', {'input': 'study-1'})
+
+    d_item = queueA.claim()
+    assert not queueB.publish('study-1', {'input': 'study-1'})
+    queueA.complete(d_item, {'input': 'study-1', 'status': 'finishedSuccessfully'})
+    assert not queueB.publish('study-1', {'input': 'study-1'})
+
+    assert len(list((tmp_path / 'todo').iterdir())) == 0
+    assert queueA.stats()['published'] + queueB.stats()['published'] == 1
+    queueA.stop()
+
+
+def test_claim_order_and_exclusivity(tmp_path: Path):
+    """
+    Items are claimed in rank order, and each by exactly one of several
+    controllers claiming concurrently.
+    """
+    publisher = LeaseQueue(tmp_path, owner='publisher')
+    for i in range(40):
+        publisher.publish('study-%d' % i, {'input': 'study-%d' % i}, rank=i)
+    publisher.close()
+
+    first = LeaseQueue(tmp_path, owner='first')
+    assert first.claim()['input'] == 'study-0'
+
+    l_queue = [LeaseQueue(tmp_path, owner='c%d' % i) for i in range(2)]
+
+    def drain(queue: LeaseQueue) -> list:
+        l_input = []
+        while (d_item := queue.claim()) is not None:
+            l_input.append(d_item['input'])
+        return l_input
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        l_claimed = [f.result() for f in [pool.submit(drain, q) for q in l_queue]]
+    assert sorted(l_claimed[0] + l_claimed[1]) == sorted('study-%d' % i for i in range(1, 40))
+    assert not set(l_claimed[0]) & set(l_claimed[1])
+    for queue in [first] + l_queue:
+        queue.stop()
+
+
+def test_expired_lease_is_stolen(tmp_path: Path):
+    """
+    A lease that has not been renewed for the ttl is reclaimed by another
+    controller; the original owner's heartbeat then reports it lost.
+    """
+    queueA = LeaseQueue(tmp_path, owner='a', ttl=60)
+    queueB = LeaseQueue(tmp_path, owner='b', ttl=60)
+    queueA.publish('study-1', {'input': 'study-1'})
+    d_item = queueA.claim()
+    assert queueB.claim() is None
+
+    lease_age(d_item, 30)
+    assert queueB.claim() is None
+    lease_age(d_item, 61)
+    d_stolen = queueB.claim()
+    assert d_stolen['input'] == 'study-1'
+    assert d_stolen['lease'].endswith('@b.json')
+    assert queueB.stats()['reclaimed'] == 1
+
+    assert not queueA.heartbeat(d_item['lease'])
+    assert queueA.stats()['lost'] == 1
+    assert queueB.heartbeat(d_stolen['lease'])
+    queueA.stop()
+    queueB.stop()
+
+
+def test_release_requeues(tmp_path: Path):
+    queue = LeaseQueue(tmp_path, owner='a')
+    queue.publish('study-1', {'input': 'study-1'}, rank=3)
+    d_item = queue.claim()
+    queue.release(d_item)
+    assert queue.stats()['held'] == 0
+    d_again = queue.claim()
+    assert d_again['input'] == 'study-1' and d_again['rank'] == 3
+    queue.stop()
+
+
+def test_is_drained(tmp_path: Path):
+    """
+    The queue is drained only once it is closed and nothing is left to do
+    or leased; the completed records are collected from done/.
+    """
+    queue = LeaseQueue(tmp_path, owner='a')
+    assert not queue.isDrained()
+    queue.publish('study-1', {'input': 'study-1'})
+    queue.publish('study-2', {'input': 'study-2'})
+    assert not queue.isDrained()
+    queue.close()
+    assert not queue.isDrained()
+
+    l_item = [queue.claim(), queue.claim()]
+    assert queue.claim() is None
+    assert not queue.isDrained()
+    for d_item in l_item:
+        queue.complete(d_item, {'input': d_item['input'], 'status': 'finishedSuccessfully'})
+    assert queue.isDrained()
+    assert sorted(d['input'] for d in queue.records()) == ['study-1', 'study-2']
+    assert {d['owner'] for d in queue.records()} == {'a'}
+    queue.stop()
+
+
+def test_stolen_lease_is_not_completed(tmp_path: Path):
+    """
+    The owner of a stolen lease cannot complete it; the record is left to
+    the new owner.
+    """
+    queueA = LeaseQueue(tmp_path, owner='a', ttl=60)
+    queueB = LeaseQueue(tmp_path, owner='b', ttl=60)
+    queueA.publish('study-1', {'input': 'study-1'})
+    d_item = queueA.claim()
+    lease_age(d_item, 61)
+    d_stolen = queueB.claim()
+
+    assert not queueA.complete(d_item, {'input': 'study-1', 'status': 'finishedSuccessfully'})
+    assert queueA.records() == []
+    assert queueB.complete(d_stolen, {'input': 'study-1', 'status': 'finishedSuccessfully'})
+    assert [d['owner'] for d in queueB.records()] == ['b']
+    queueA.stop()
+    queueB.stop()
+
+
+def test_claim_renews_an_old_todo(tmp_path: Path):
+    """
+    An item published longer than the ttl ago is not an expired lease as
+    soon as it is claimed.
+    """
+    queueA = LeaseQueue(tmp_path, owner='a', ttl=60)
+    queueB = LeaseQueue(tmp_path, owner='b', ttl=60)
+    queueA.publish('study-1', {'input': 'study-1'})
+    then = time.time() - 120
+    for path in (tmp_path / 'todo').iterdir():
+        os.utime(path, (then, then))
+    d_item = queueA.claim()
+    assert queueB.claim() is None
+    assert queueA.heartbeat(d_item['lease'])
+    queueA.stop()
+    queueB.stop()
+
+
+def test_attempts_are_capped(tmp_path: Path):
+    """
+    Every claim (after a release, or a lease lost with its controller) is
+    an attempt; past maxAttempts the item is completed as failed, with
+    the last error released with it.
+    """
+    queueA = LeaseQueue(tmp_path, owner='a', ttl=60, maxAttempts=2)
+    queueB = LeaseQueue(tmp_path, owner='b', ttl=60, maxAttempts=2)
+    queueA.publish('study-1', {'input': 'study-1'})
+    queueA.close()
+
+    d_item = queueA.claim()
+    assert d_item['attempts'] == 1
+    queueA.release(d_item, 'RuntimeError: boom')
+    d_item = queueA.claim()
+    assert d_item['attempts'] == 2
+    lease_age(d_item, 61)
+
+    assert queueB.claim() is None
+    assert queueB.stats()['exhausted'] == 1
+    assert queueB.isDrained()
+    assert queueB.records() == [{'input': 'study-1', 'status': 'failed',
+                                 'error': 'RuntimeError: boom', 'attempts': 2, 'owner': 'b'}]
+    queueA.stop()
+    queueB.stop()
@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from control import merge
+from state import manifest
+
+
+def shard_write(tmp_path: Path, str_shard: str, l_input: list) -> str:
+    """
+    Write the manifest of one shard, with a child per input.
+    """
+    shardManifest = manifest.Manifest(meta={'shard': str_shard, 'inputdir': '/in'})
+    for str_input in l_input:
+        shardManifest.add(input=str_input, status='scheduled')
+    return str(shardManifest.save(tmp_path / ('manifest-%s.json' % str_shard.replace('/', 'of'))))
+
+
+def test_merge(tmp_path: Path):
+    """
+    Children are merged in shard order; an input recorded by more than one
+    shard is kept once and listed as a duplicate.
+    """
+    l_manifest = [shard_write(tmp_path, '1/2', ['c', 'a']), shard_write(tmp_path, '0/2', ['b', 'a'])]
+    pathMerged = tmp_path / 'merged.json'
+    assert merge.main(l_manifest + ['--output', str(pathMerged)]) == 0
+    d_merged = json.loads(pathMerged.read_text())
+    assert [(d['input'], d['shard']) for d in d_merged['children']] == \
+           [('b', '0/2'), ('a', '0/2'), ('c', '1/2')]
+    assert d_merged['meta']['shards'] == ['0/2', '1/2']
+    assert d_merged['meta']['missing'] == [] and d_merged['meta']['duplicates'] == ['a']
+
+
+def test_merge_duplicate_shard(tmp_path: Path, capsys):
+    l_manifest = [shard_write(tmp_path, '0/2', ['a']), shard_write(tmp_path, '1/2', ['b'])]
+    pathMerged = tmp_path / 'merged.json'
+    assert merge.main(l_manifest + [l_manifest[0], '--output', str(pathMerged)]) == 2
+    assert 'shard 0/2 given more than once' in capsys.readouterr().err
+    assert not pathMerged.exists()
+
+
+def test_merge_mismatched_counts(tmp_path: Path, capsys):
+    l_manifest = [shard_write(tmp_path, '0/2', ['a']), shard_write(tmp_path, '1/3', ['b'])]
+    pathMerged = tmp_path / 'merged.json'
+    assert merge.main(l_manifest + ['--output', str(pathMerged)]) == 2
+    assert 'shards of different counts' in capsys.readouterr().err
+    assert not pathMerged.exists()
+
+
+def test_merge_missing_shards(tmp_path: Path, capsys):
+    """
+    A missing shard fails the merge unless --partial, which records it.
+    """
+    l_manifest = [shard_write(tmp_path, '0/3', ['a']), shard_write(tmp_path, '2/3', ['b'])]
+    pathMerged = tmp_path / 'merged.json'
+    assert merge.main(l_manifest + ['--output', str(pathMerged)]) == 1
+    assert 'missing shards 1/3' in capsys.readouterr().err
+    assert not pathMerged.exists()
+    assert merge.main(l_manifest + ['--output', str(pathMerged), '--partial']) == 0
+    assert json.loads(pathMerged.read_text())['meta']['missing'] == ['1/3']
+
+
+def test_merge_unreadable_manifest(tmp_path: Path):
+    assert merge.main([str(tmp_path / 'missing.json')]) == 2
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from state.metadata import MetadataCache
+
+
+def test_hit_and_miss():
+    cache = MetadataCache()
+    l_fetch = []
+    fetch = lambda: l_fetch.append(1) or {'id': 1}
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == {'id': 1}
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == {'id': 1}
+    assert len(l_fetch) == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'expired': 0, 'entries': 1}
+
+
+def test_single_flight():
+    """
+    Threads asking for the same missing key at once share one fetch;
+    other keys are fetched concurrently, not behind it.
+    """
+    cache = MetadataCache()
+    barrier = threading.Barrier(8)
+    l_fetch = []
+    lock = threading.Lock()
+
+    def fetch(str_name: str):
+        with lock:
+            l_fetch.append(str_name)
+        time.sleep(0.1)
+        return str_name.upper()
+
+    d_result = {}
+
+    def worker(i: int):
+        str_name = 'a' if i < 6 else 'b%d' % i
+        barrier.wait()
+        d_result[i] = cache.get(('cube', 'plugin', str_name), lambda: fetch(str_name))
+
+    l_thread = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    started = time.monotonic()
+    for thread in l_thread: thread.start()
+    for thread in l_thread: thread.join()
+    assert time.monotonic() - started < 0.3
+    assert sorted(l_fetch) == ['a', 'b6', 'b7']
+    assert [d_result[i] for i in range(8)] == ['A'] * 6 + ['B6', 'B7']
+    assert cache.stats()['misses'] == 3 and cache.stats()['hits'] == 5
+
+
+def test_failed_fetch_is_not_cached():
+    cache = MetadataCache()
+
+    def fail():
+        raise ConnectionError('CUBE unreachable')
+
+    try:
+        cache.get(('cube', 'pipeline', 'a'), fail)
+    except ConnectionError:
+        pass
+    assert cache.get(('cube', 'pipeline', 'a'), lambda: 'ok') == 'ok'
+
+
+def test_ttl_expiry():
+    cache = MetadataCache(ttl=0.05)
+    l_fetch = []
+    fetch = lambda: l_fetch.append(1) or len(l_fetch)
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == 1
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == 1
+    time.sleep(0.1)
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == 2
+    assert cache.stats()['expired'] == 1
+    cache.ttl_set(0)
+    time.sleep(0.1)
+    assert cache.get(('cube', 'pipeline', 'a'), fetch) == 2
+
+
+def test_invalidate_prefix():
+    """
+    Only the keys starting with the prefix are dropped; no prefix clears
+    the cache.
+    """
+    cache = MetadataCache()
+    for key in [('cube1', 'pipeline', 'a'), ('cube1', 'pipeline', 'b'),
+                ('cube1', 'plugin', 'a'), ('cube2', 'pipeline', 'a')]:
+        cache.get(key, lambda: key)
+    assert cache.invalidate('cube1', 'pipeline') == 2
+    assert cache.invalidate('cube1', 'pipeline') == 0
+    assert sorted(cache.d_entry) == [('cube1', 'plugin', 'a'), ('cube2', 'pipeline', 'a')]
+    assert cache.get(('cube1', 'pipeline', 'a'), lambda: 'refetched') == 'refetched'
+    assert cache.invalidate() == 3
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,89 @@
+import pytest
+
+from control import poller
+
+
+class FakeClient:
+    """
+    Stands in for a chrisclient Client over the plugin instances of
+    <d_plinst> (id -> status), all in feed 1, honouring the feed_id, id,
+    limit and offset query parameters.
+    """
+
+    def __init__(self, d_plinst: dict, error: Exception | None = None):
+        self.d_plinst = d_plinst
+        self.error = error
+        self.l_query = []
+
+    def get_plugin_instances(self, d_query: dict) -> dict:
+        self.l_query.append(d_query)
+        if self.error:
+            raise self.error
+        l_id = [i for i in sorted(self.d_plinst, reverse=True)
+                if d_query.get('feed_id') == 1 and d_query.get('id', i) == i]
+        offset, limit = d_query.get('offset', 0), d_query['limit']
+        return {
+            'data': [{'id': i, 'status': self.d_plinst[i]} for i in l_id[offset:offset + limit]],
+            'hasNextPage': offset + limit < len(l_id),
+        }
+
+
+def statusPoller(cl: FakeClient, **kwargs) -> poller.StatusPoller:
+    return poller.StatusPoller(cl, schedule={'minInterval': 0.01, 'maxInterval': 0.02,
+                                             'jitter': 0}, **kwargs)
+
+
+def test_feed_fetch_by_id():
+    """
+    A few instances are fetched with one query by id each.
+    """
+    cl = FakeClient({i: 'started' for i in range(1, 101)})
+    d_found = statusPoller(cl, idQueries=2).feed_fetch(1, {5, 7})
+    assert sorted(d_found) == [5, 7]
+    assert [d.get('id') for d in cl.l_query] == [5, 7]
+
+
+def test_feed_fetch_by_listing():
+    """
+    Many instances are fetched by paging the feed listing, which stops
+    once all of them have been seen.
+    """
+    cl = FakeClient({i: 'started' for i in range(1, 101)})
+    d_found = statusPoller(cl, idQueries=2, pageSize=10).feed_fetch(1, {95, 85, 75})
+    assert sorted(d_found) == [75, 85, 95]
+    assert all('id' not in d for d in cl.l_query)
+    assert [d['offset'] for d in cl.l_query] == [0, 10, 20]
+
+    d_found = statusPoller(cl, idQueries=2, pageSize=10).feed_fetch(1, {95, 85, 1000})
+    assert sorted(d_found) == [85, 95]
+
+
+def test_watch_resolves_finished():
+    """
+    Futures resolve once their instance reaches a final status; the others
+    keep being polled.
+    """
+    cl = FakeClient({1: 'finishedSuccessfully', 2: 'started'})
+    sp = statusPoller(cl)
+    f1, f2 = sp.watch(1, 1), sp.watch(2, 1)
+    assert f1.result(timeout=5)['status'] == 'finishedSuccessfully'
+    assert not f2.done()
+    cl.d_plinst[2] = 'finishedWithError'
+    assert f2.result(timeout=5)['status'] == 'finishedWithError'
+    assert sp.stats()['resolved'] == 2 and sp.stats()['outstanding'] == 0
+
+
+def test_repeated_errors_fail_futures():
+    """
+    A poll error is retried; once a wait has failed maxErrors polls in a
+    row its future is failed with the error.
+    """
+    cl = FakeClient({1: 'started'}, error=ConnectionError('CUBE is down'))
+    sp = statusPoller(cl, maxErrors=3)
+    future = sp.watch(1, 1)
+    with pytest.raises(ConnectionError):
+        future.result(timeout=5)
+    d_stats = sp.stats()
+    assert d_stats['errors'] == 3 and d_stats['failed'] == 1
+    assert d_stats['outstanding'] == 0
+    assert len(cl.l_query) == 3
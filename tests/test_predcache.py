@@ -0,0 +1,113 @@
+import os
+from pathlib import Path
+
+from state.predcache import PredicateCache, identity
+
+
+def inputs_write(inputdir: Path, count: int) -> list:
+    inputdir.mkdir(exist_ok=True)
+    l_path = []
+    for i in range(count):
+        path = inputdir / ('%04d-%s.dcm' % (i, 'x' * 100))
+        path.write_bytes(b'x' * i)
+        l_path.append(str(path))
+    return l_path
+
+
+def test_hit_and_miss(tmp_path: Path):
+    str_input, = inputs_write(tmp_path / 'in', 1)
+    cache = PredicateCache(tmp_path / 'cache.db')
+    assert cache.get(str_input, 'v1') is None
+    cache.put(str_input, 'v1', True)
+    cache.put(str(tmp_path / 'gone'), 'v1', True)
+    assert cache.get(str_input, 'v1') is True
+    d_stats = cache.stats()
+    assert (d_stats['hits'], d_stats['misses'], d_stats['stale']) == (1, 1, 0)
+    assert d_stats['entries'] == 1 and d_stats['hitRate'] == 0.5
+    cache.close()
+
+
+def test_persists_across_runs(tmp_path: Path):
+    str_input, = inputs_write(tmp_path / 'in', 1)
+    cache = PredicateCache(tmp_path / 'cache.db')
+    cache.put(str_input, 'v1', False)
+    cache.close()
+    cache = PredicateCache(tmp_path / 'cache.db')
+    assert cache.get(str_input, 'v1') is False
+    assert cache.clock == 2
+    cache.close()
+
+
+def test_stale_on_change(tmp_path: Path):
+    """
+    A result is not reused once the size or mtime of its input (or, for
+    a directory, of any file in it) changes.
+    """
+    str_input, = inputs_write(tmp_path / 'in', 1)
+    cache = PredicateCache(tmp_path / 'cache.db')
+    cache.put(str_input, 'v1', True)
+    st = os.stat(str_input)
+    os.utime(str_input, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.get(str_input, 'v1') is None
+    cache.put(str_input, 'v1', True)
+    Path(str_input).write_bytes(b'longer')
+    os.utime(str_input, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.get(str_input, 'v1') is None
+    assert cache.stats()['stale'] == 2
+
+    str_dir = str(tmp_path / 'in')
+    cache.put(str_dir, 'v1', True)
+    assert cache.get(str_dir, 'v1') is True
+    (tmp_path / 'in' / 'new').write_bytes(b'x')
+    assert cache.get(str_dir, 'v1') is None
+    cache.close()
+
+
+def test_identity(tmp_path: Path):
+    l_input = inputs_write(tmp_path / 'in', 3)
+    (tmp_path / 'in' / 'sub').mkdir()
+    size, mtime = identity(str(tmp_path / 'in'))
+    assert size == 0 + 1 + 2
+    assert mtime == max(os.stat(p).st_mtime_ns for p in l_input + [str(tmp_path / 'in')])
+    assert identity(str(tmp_path / 'gone')) == (-1, -1)
+
+
+def test_version_invalidates(tmp_path: Path):
+    """
+    Results are kept per predicate version: another version misses, and
+    each keeps its own result.
+    """
+    str_input, = inputs_write(tmp_path / 'in', 1)
+    cache = PredicateCache(tmp_path / 'cache.db')
+    cache.put(str_input, 'v1', True)
+    assert cache.get(str_input, 'v2') is None
+    cache.put(str_input, 'v2', False)
+    assert cache.get(str_input, 'v1') is True
+    assert cache.get(str_input, 'v2') is False
+    assert cache.stats()['stale'] == 0
+    cache.close()
+
+
+def test_lru_eviction(tmp_path: Path):
+    """
+    Past maxBytes, the least recently used results are evicted until the
+    database fits again; results just used survive.
+    """
+    l_input = inputs_write(tmp_path / 'in', 600)
+    cache = PredicateCache(tmp_path / 'cache.db', maxBytes=48 << 10, batch=1)
+    for str_input in l_input[:10]:
+        cache.put(str_input, 'v1', True)
+    for i, str_input in enumerate(l_input[10:]):
+        if not i % 20:
+            for str_recent in l_input[:10]:
+                cache.get(str_recent, 'v1')
+        cache.put(str_input, 'v1', True)
+
+    d_stats = cache.stats()
+    assert d_stats['evicted'] > 0
+    assert d_stats['bytes'] <= 48 << 10
+    assert d_stats['entries'] + d_stats['evicted'] == 600
+    assert all(cache.get(str_input, 'v1') is True for str_input in l_input[:10])
+    assert cache.get(l_input[10], 'v1') is None
+    assert cache.get(l_input[-1], 'v1') is True
+    cache.close()
@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from control.schedule import CostModel, LongestFirst, makespan
+
+
+def inputs_write(inputdir: Path, d_size: dict) -> list:
+    """
+    Write one input file per name in <d_size> of that many bytes.
+    """
+    inputdir.mkdir(exist_ok=True)
+    l_path = []
+    for name, size in d_size.items():
+        (inputdir / name).write_bytes(b'x' * size)
+        l_path.append(inputdir / name)
+    return l_path
+
+
+def journal_write(path: Path, l_record: list) -> Path:
+    with open(path, 'w') as f:
+        for str_input, str_stage, second, d_extra in l_record:
+            f.write(json.dumps(dict(d_extra, input=str_input, stage=str_stage,
+                                    time='2026-01-01T00:00:%02d+00:00' % second)) + '\n')
+    return path
+
+
+def test_makespan():
+    assert makespan([4, 3, 2, 1], 2) == 5
+    assert makespan([1, 2, 3, 4], 2) == 6
+    assert makespan([1, 2, 3], 0) == 6
+    assert makespan([], 3) == 0
+
+
+def test_journal_load(tmp_path: Path):
+    """
+    Runtimes run from "created" to "finished"; children resumed by a rerun
+    and inputs created more than once are not measured. Inputs are keyed
+    relative to the inputdir of the manifest next to the journal.
+    """
+    (tmp_path / 'manifest.json').write_text(json.dumps({'meta': {'inputdir': '/in'}}))
+    path = journal_write(tmp_path / 'journal.jsonl', [
+        ('/in/a', 'created', 0, {}),
+        ('/in/b', 'created', 1, {}),
+        ('/in/c', 'created', 2, {}),
+        ('/in/a', 'scheduled', 3, {}),
+        ('/in/a', 'finished', 10, {}),
+        ('/in/b', 'finished', 40, {'resumed': 'scheduled'}),
+        ('/in/c', 'finished', 5, {}),
+        ('/in/c', 'created', 6, {}),
+        ('/in/c', 'finished', 9, {}),
+    ])
+    model = CostModel()
+    assert model.journal_load(path) == 1
+    assert model.d_runtime == {'a': 10}
+    assert model.journal_load(tmp_path / 'missing.jsonl') == 0
+
+
+def test_calibrate(tmp_path: Path):
+    """
+    runtime = intercept + slope * cost is fit over the past inputs that
+    still exist; inputs that ran before take what they took.
+    """
+    inputs_write(tmp_path, {'a': 1000, 'b': 2000, 'c': 4000})
+    model = CostModel(fileBytes=0)
+    assert not model.calibrate(tmp_path)
+    model.d_runtime = {'a': 11.0, 'b': 21.0, 'gone': 1000.0}
+    assert model.calibrate(tmp_path)
+    assert model.slope == pytest.approx(0.01)
+    assert model.intercept == pytest.approx(1.0)
+    assert model.seconds('c', model.cost(str(tmp_path / 'c'))) == pytest.approx(41.0)
+    assert model.seconds('a', 123.0) == 11.0
+
+
+def test_longest_first_by_cost(tmp_path: Path):
+    """
+    Without runtimes, inputs are ordered by descending cost, ties in
+    discovery order; no makespan is estimated.
+    """
+    l_path = inputs_write(tmp_path, {'small': 10, 'large': 1000, 'medium': 100, 'also-small': 10})
+    scheduler = LongestFirst(tmp_path, CostModel(fileBytes=0), workers=2)
+    l_pair = [(p, p.name) for p in l_path]
+    assert [o for _, o in scheduler(l_pair)] == ['large', 'medium', 'small', 'also-small']
+    assert scheduler.d_report['orderedBy'] == 'cost'
+    assert scheduler.d_report['estimatedMakespan'] is None
+
+
+def test_longest_first_by_seconds(tmp_path: Path):
+    """
+    With a runtime for every input, inputs are ordered by it (even against
+    their cost), and the makespans of both orders are estimated.
+    """
+    l_path = inputs_write(tmp_path, {'a': 1000, 'b': 10, 'c': 100})
+    model = CostModel(fileBytes=0)
+    model.d_runtime = {'a': 1.0, 'b': 1.0, 'c': 3.0}
+    scheduler = LongestFirst(tmp_path, model, workers=2)
+    assert [o for _, o in scheduler((p, p.name) for p in l_path)] == ['c', 'a', 'b']
+    d_report = scheduler.d_report
+    assert d_report['orderedBy'] == 'seconds'
+    assert d_report['estimatedMakespan'] == 3.0
+    assert d_report['estimatedMakespanFIFO'] == 4.0
+
+
+def test_longest_first_priorities(tmp_path: Path):
+    """
+    Inputs matching a priority glob go first, by priority, whatever their
+    cost; the first matching glob applies.
+    """
+    l_path = inputs_write(tmp_path, {'big': 1000, 'urgent-1': 10, 'study-0042': 1, 'urgent-2': 100})
+    pathPriority = tmp_path / 'priority.json'
+    pathPriority.write_text(json.dumps({'urgent*': 10, 'study-0042': 5, '*': 1}))
+    scheduler = LongestFirst(tmp_path, CostModel(fileBytes=0), priorities=str(pathPriority))
+    assert [o for _, o in scheduler((p, p.name) for p in l_path)] == \
+           ['urgent-2', 'urgent-1', 'study-0042', 'big']
+    assert scheduler.d_report['prioritized'] == 4
@@ -0,0 +1,142 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import requests
+from requests.adapters import BaseAdapter
+
+from chrisclient import request as chrisrequest
+from control import session
+
+str_root = 'http://cube:8000/api/v1/'
+auth = ('chris', 'chris1234')
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Stands in for CUBE: 'auth-token/' hands out <token> (or fails without
+    one), and other resources accept that token (if <tokenValid>) or basic
+    auth. Every request is recorded with its Authorization header.
+    """
+
+    def __init__(self, token: str | None = 'tok'):
+        super().__init__()
+        self.token = token
+        self.tokenValid = True
+        self.l_sent = []
+        self.lock = threading.Lock()
+        self.poolmanager = SimpleNamespace(pools={})
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.l_sent.append((request.url, request.headers.get('Authorization', '')))
+        str_auth = request.headers.get('Authorization', '')
+        if request.url.endswith('auth-token/'):
+            return self.response(request, 200 if self.token else 400, {'token': self.token})
+        if str_auth.startswith('Basic ') or (self.tokenValid and str_auth == 'Token %s' % self.token):
+            return self.response(request, 200, {'url': request.url})
+        return self.response(request, 401, {'detail': 'Invalid token.'})
+
+    @staticmethod
+    def response(request, status: int, d_body: dict) -> requests.Response:
+        r = requests.Response()
+        r.status_code = status
+        r._content = json.dumps(d_body).encode()
+        r.request = request
+        r.url = request.url
+        return r
+
+    def close(self):
+        pass
+
+    def tokenFetches(self) -> int:
+        return sum(1 for url, _ in self.l_sent if url.endswith('auth-token/'))
+
+
+def pooled_fake(token: str | None = 'tok') -> tuple:
+    pooled = session.PooledRequests(poolSize=4)
+    adapter = FakeAdapter(token)
+    pooled.adapter = adapter
+    pooled.session.mount('http://', adapter)
+    return pooled, adapter
+
+
+def test_token_exchange():
+    """
+    Basic auth is swapped for a token, fetched once per (CUBE, user) and
+    shared by all threads.
+    """
+    pooled, adapter = pooled_fake()
+    l_thread = [threading.Thread(target=pooled.get, args=(str_root + 'plugins/%d/' % i,),
+                                 kwargs={'auth': auth}) for i in range(8)]
+    for thread in l_thread: thread.start()
+    for thread in l_thread: thread.join()
+    assert adapter.tokenFetches() == 1
+    assert all(str_auth == 'Token tok' for url, str_auth in adapter.l_sent
+               if not url.endswith('auth-token/'))
+    d_stats = pooled.stats()
+    assert d_stats['requests'] == 8
+    assert d_stats['tokenMisses'] == 1 and d_stats['tokenHits'] == 7
+
+    pooled.get('http://cube:8000/api/v1/pipelines/', auth=('other', 'secret'))
+    assert adapter.tokenFetches() == 2
+
+
+def test_rejected_token_falls_back_to_basic_auth():
+    """
+    A token CUBE no longer accepts is dropped and the request is retried
+    once with basic auth; the next request fetches a new token.
+    """
+    pooled, adapter = pooled_fake()
+    assert pooled.get(str_root + 'plugins/', auth=auth).status_code == 200
+    adapter.tokenValid = False
+    assert pooled.get(str_root + 'plugins/', auth=auth).status_code == 200
+    assert [a.split()[0] for u, a in adapter.l_sent if not u.endswith('auth-token/')] == \
+           ['Token', 'Token', 'Basic']
+    adapter.tokenValid = True
+    pooled.get(str_root + 'plugins/', auth=auth)
+    assert adapter.tokenFetches() == 2
+
+
+def test_failed_token_fetch_uses_basic_auth():
+    pooled, adapter = pooled_fake(token=None)
+    for _ in range(3):
+        assert pooled.get(str_root + 'plugins/', auth=auth).status_code == 200
+    assert adapter.tokenFetches() == 1
+    assert [a.split()[0] for u, a in adapter.l_sent if not u.endswith('auth-token/')] == ['Basic'] * 3
+    assert pooled.stats()['tokenFailures'] == 1
+
+
+def test_pool_stats():
+    """
+    Connections opened and reused are summed over the adapter's pools.
+    """
+    pooled, adapter = pooled_fake()
+    adapter.poolmanager.pools = {
+        'a': SimpleNamespace(num_connections=2, num_requests=10),
+        'b': SimpleNamespace(num_connections=1, num_requests=1),
+    }
+    d_stats = pooled.stats()
+    assert d_stats['poolSize'] == 4
+    assert d_stats['connections'] == 3 and d_stats['reused'] == 8
+
+
+def test_install_and_uninstall():
+    """
+    chrisclient is routed through one shared session until uninstalled,
+    which gives it back the module it used before.
+    """
+    original = chrisrequest.requests
+    try:
+        pooled = session.session_install(poolSize=2)
+        assert chrisrequest.requests is pooled
+        assert session.session_install() is pooled
+        assert session.stats()['poolSize'] == 2
+        session.session_uninstall()
+        assert chrisrequest.requests is original
+        assert session.pooled is None and session.stats() == {}
+        session.session_uninstall()
+        assert chrisrequest.requests is original
+    finally:
+        session.session_uninstall()
+        chrisrequest.requests = original
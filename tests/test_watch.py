@@ -0,0 +1,91 @@
+import json
+from concurrent.futures import Future
+from pathlib import Path
+
+from control import action, poller, session, watch
+from state import manifest
+
+
+class FakePoller:
+    """
+    Stands in for poller.StatusPoller: instances listed in <d_final> have
+    finished, those in <d_seen> are still running.
+    """
+
+    def __init__(self, d_final: dict, d_seen: dict):
+        self.d_final = d_final
+        self.d_seen = d_seen
+        self.l_watched = []
+
+    def watch(self, plinstID, feedID=None, str_title=''):
+        self.l_watched.append(int(plinstID))
+        future = Future()
+        if int(plinstID) in self.d_final:
+            future.set_result(self.d_final[int(plinstID)])
+        return future
+
+    def lastSeen(self, plinstID):
+        return self.d_seen.get(int(plinstID), {})
+
+    def unwatch(self, plinstID, future):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def manifest_write(path: Path) -> Path:
+    runManifest = manifest.Manifest(meta={'CUBEurl': 'http://cube/api/v1/', 'noblock': True})
+    runManifest.add(input='a', blockNodeID=11, feedID=1, status='scheduled')
+    runManifest.add(input='b', blockNodeID=12, feedID=1, status='scheduled')
+    runManifest.add(input='c', blockNodeID='13', feedID=2, status='scheduled')
+    runManifest.add(input='d', blockNodeID=None, status='notCreated')
+    runManifest.add(input='e', status='notCreated')
+    return runManifest.save(path)
+
+
+def test_children_watch_skips_unscheduled():
+    """
+    Children with no (or a None) blocking node are passed through without
+    a future.
+    """
+    fake = FakePoller({}, {})
+    l_watch = watch.children_watch(fake, [
+        {'input': 'a', 'blockNodeID': 11},
+        {'input': 'b', 'blockNodeID': None},
+        {'input': 'c'},
+        {'input': 'd', 'blockNodeID': -1},
+    ])
+    assert fake.l_watched == [11]
+    assert [future is None for _, future in l_watch] == [False, True, True, True]
+
+
+def test_main_writes_statuses_back(mocker, tmp_path: Path):
+    """
+    The final statuses (and the last seen status of a child still running
+    at the timeout) are written back into manifest.json, and reported.
+    """
+    path = manifest_write(tmp_path / 'manifest.json')
+    fake = FakePoller(
+        {11: {'id': 11, 'status': 'finishedSuccessfully'},
+         12: {'id': 12, 'status': 'finishedWithError'}},
+        {13: {'id': 13, 'status': 'started'}})
+    mocker.patch.object(session, 'session_install')
+    mocker.patch.object(session, 'session_uninstall')
+    mocker.patch.object(action, 'CUBEclient_get')
+    mocker.patch.object(poller, 'poller_get', return_value=fake)
+
+    assert watch.main([str(path), '--timeout', '0.01']) == 1
+
+    runManifest = manifest.Manifest.load(path)
+    assert runManifest.d_meta['noblock']
+    assert [(d['input'], d.get('blockNodeID'), d['status']) for d in runManifest.children()] == [
+        ('a', 11, 'finishedSuccessfully'),
+        ('b', 12, 'finishedWithError'),
+        ('c', 13, 'started'),
+        ('d', None, 'notCreated'),
+        ('e', None, 'notCreated'),
+    ]
+    d_report = json.loads((tmp_path / 'watch-report.json').read_text())
+    assert d_report['counts'] == {'finishedSuccessfully': 1, 'finishedWithError': 1,
+                                  'started (timeout)': 1, 'notCreated': 2}